@@ -11,6 +11,7 @@ from datetime import timedelta
 from discord.ext import commands
 from unidecode import unidecode
 
+from settings import queries
 from utilities import utils
 from utilities import checks
 from utilities import helpers
@@ -67,8 +68,7 @@ class Admin(commands.Cog):
                     await msg.edit(
                         content=f"{self.bot.emote_dict['failed']} The muted role is above your highest role."
                     )
-            query = """UPDATE servers SET muterole = $1 WHERE server_id = $2"""
-            await self.bot.cxn.execute(query, role.id, ctx.guild.id)
+            await queries.set_muterole(role.id, ctx.guild.id)
         except Exception as e:
             return await msg.edit(content=e)
         channels = []
@@ -814,12 +814,7 @@ class Admin(commands.Cog):
             await helpers.error_info(ctx, failed)
 
     async def get_warncount(self, guild):
-        query = """
-                SELECT (warnings, user_id)
-                FROM warn WHERE
-                server_id = $1;
-                """
-        res = await self.bot.cxn.fetch(query, guild.id)
+        res = await queries.server_warn_counts(guild.id)
         results = {}
         for x in res:
             results[x[0][1]] = x[0][0]
@@ -4,6 +4,7 @@ import discord
 from better_profanity import profanity
 from discord.ext import commands, menus
 
+from settings import guilds, queries
 from utilities import checks
 from utilities import converters
 from utilities import decorators
@@ -75,18 +76,10 @@ class Automod(commands.Cog):
                 and not target.guild_permissions.administrator
             ):
                 try:
-                    warnings = (
-                        await self.bot.cxn.fetchrow(
-                            "SELECT warnings FROM warn WHERE user_id = $1 AND server_id = $2",
-                            target.id,
-                            ctx.guild.id,
-                        )
-                        or (None)
-                    )
+                    warnings = await queries.warnings(target.id, ctx.guild.id) or (None)
                     if warnings is None:
                         warnings = 0
-                        await self.bot.cxn.execute(
-                            "INSERT INTO warn VALUES ($1, $2, $3)",
+                        await queries.insert_warning(
                             target.id,
                             ctx.guild.id,
                             int(warnings) + 1,
@@ -95,11 +88,7 @@ class Automod(commands.Cog):
                     else:
                         warnings = int(warnings[0])
                         try:
-                            await self.bot.cxn.execute(
-                                "UPDATE warn SET warnings = warnings + 1 WHERE server_id = $1 AND user_id = $2",
-                                ctx.guild.id,
-                                target.id,
-                            )
+                            await queries.add_warning(ctx.guild.id, target.id)
                             warned.append(f"{target.name}#{target.discriminator}")
                         except Exception:
                             raise
@@ -136,14 +125,7 @@ class Automod(commands.Cog):
             target = ctx.author
 
         try:
-            warnings = (
-                await self.bot.cxn.fetchrow(
-                    "SELECT warnings FROM warn WHERE user_id = $1 AND server_id = $2",
-                    target.id,
-                    ctx.guild.id,
-                )
-                or None
-            )
+            warnings = await queries.warnings(target.id, ctx.guild.id) or None
             if warnings is None:
                 return await ctx.send_or_reply(
                     f"{self.emote_dict['success']} User `{target}` has no warnings."
@@ -179,24 +161,13 @@ class Automod(commands.Cog):
                 content=f"Usage: `{ctx.prefix}deletewarn <target>`",
             )
         try:
-            warnings = (
-                await self.bot.cxn.fetchrow(
-                    "SELECT warnings FROM warn WHERE user_id = $1 AND server_id = $2",
-                    target.id,
-                    ctx.guild.id,
-                )
-                or None
-            )
+            warnings = await queries.warnings(target.id, ctx.guild.id) or None
             if warnings is None:
                 return await ctx.send_or_reply(
                     f"{self.emote_dict['success']} User `{target}` has no warnings."
                 )
             warnings = int(warnings[0])
-            await self.bot.cxn.execute(
-                "DELETE FROM warn WHERE user_id = $1 and server_id = $2",
-                target.id,
-                ctx.guild.id,
-            )
+            await queries.clear_warnings(target.id, ctx.guild.id)
             await ctx.send_or_reply(
                 content=f"{self.emote_dict['success']} Cleared all warnings for `{target}` in this server.",
             )
@@ -227,34 +198,19 @@ class Automod(commands.Cog):
                 content=f"Usage: `{ctx.prefix}revokewarn <target>`",
             )
         try:
-            warnings = (
-                await self.bot.cxn.fetchrow(
-                    "SELECT warnings FROM warn WHERE user_id = $1 AND server_id = $2",
-                    target.id,
-                    ctx.guild.id,
-                )
-                or None
-            )
+            warnings = await queries.warnings(target.id, ctx.guild.id) or None
             if warnings is None:
                 return await ctx.send_or_reply(
                     f"{self.emote_dict['success']} User `{target}` has no warnings to revoke."
                 )
             warnings = int(warnings[0])
             if int(warnings) == 1:
-                await self.bot.cxn.execute(
-                    "DELETE FROM warn WHERE user_id = $1 and server_id = $2",
-                    target.id,
-                    ctx.guild.id,
-                )
+                await queries.clear_warnings(target.id, ctx.guild.id)
                 await ctx.send_or_reply(
                     f"{self.emote_dict['success']} Cleared all warnings for `{target}` in this server."
                 )
             else:
-                await self.bot.cxn.execute(
-                    "UPDATE warn SET warnings = warnings - 1 WHERE server_id = $1 AND user_id = $2",
-                    ctx.guild.id,
-                    target.id,
-                )
+                await queries.revoke_warning(ctx.guild.id, target.id)
                 await ctx.send_or_reply(
                     f"{self.emote_dict['success']} Revoked a warning for `{target}` in this server."
                 )
@@ -277,10 +233,8 @@ class Automod(commands.Cog):
         Output: Embed of all warned members in the server
         Permission: Manage Messages
         """
-        query = """SELECT COUNT(*) FROM warn WHERE server_id = $1"""
-        count = await self.bot.cxn.fetchrow(query, ctx.guild.id)
-        query = """SELECT user_id, warnings FROM warn WHERE server_id = $1 ORDER BY warnings DESC"""
-        records = await self.bot.cxn.fetch(query, ctx.guild.id) or None
+        count = await queries.server_warning_count(ctx.guild.id)
+        records = await queries.server_warnings(ctx.guild.id) or None
         if records is None:
             return await ctx.send_or_reply(
                 content=f"{self.emote_dict['warn']} No current warnings exist on this server.",
@@ -319,8 +273,7 @@ class Automod(commands.Cog):
             Users with the Manage Messages permission
             are immune to the antiinviter.
         """
-        query = """SELECT antiinvite FROM servers WHERE server_id = $1"""
-        current = await self.bot.cxn.fetchval(query, ctx.guild.id)
+        current = await queries.server_antiinvite(ctx.guild.id)
         if current is True:
             removeinvitelinks = True
         else:
@@ -346,13 +299,8 @@ class Automod(commands.Cog):
             msg = "That is not a valid setting."
             yes_no = current
         if yes_no != current and yes_no is not None:
-            self.bot.server_settings[ctx.guild.id]["antiinvite"] = removeinvitelinks
-            query = """
-                    UPDATE servers
-                    SET antiinvite = $1
-                    WHERE server_id = $2
-                    """
-            await self.bot.cxn.execute(query, removeinvitelinks, ctx.guild.id)
+            self.bot.server_settings[ctx.guild.id].antiinvite = removeinvitelinks
+            await queries.set_antiinvite(removeinvitelinks, ctx.guild.id)
         await ctx.send_or_reply(msg)
 
     @decorators.group(
@@ -397,17 +345,9 @@ class Automod(commands.Cog):
         """
         if roles is None:
             return await ctx.usage("<roles>")
-        for role in roles:
-            self.bot.server_settings[ctx.guild.id]["autoroles"].append(role.id)
-        query = """
-                UPDATE servers
-                SET autoroles = $1
-                WHERE server_id = $2;
-                """
-        autoroles = ",".join(
-            [str(x) for x in self.bot.server_settings[ctx.guild.id]["autoroles"]]
-        )
-        await self.bot.cxn.execute(query, autoroles, ctx.guild.id)
+        config = self.bot.server_settings[ctx.guild.id]
+        config.autoroles = config.autoroles | {role.id for role in roles}
+        await queries.set_autoroles(guilds.join(config.autoroles), ctx.guild.id)
         await ctx.send_or_reply(
             content=f"{self.bot.emote_dict['success']} Updated autorole settings.",
         )
@@ -430,19 +370,9 @@ class Automod(commands.Cog):
         """
         if roles is None:
             return await ctx.usage("<roles>")
-        autoroles = self.bot.server_settings[ctx.guild.id]["autoroles"]
-        for role in roles:
-            index = autoroles.index(str(role.id))
-            autoroles.pop(index)
-        query = """
-                UPDATE servers
-                SET autoroles = $1
-                WHERE server_id = $2;
-                """
-        autoroles = ",".join(
-            [str(x) for x in self.bot.server_settings[ctx.guild.id]["autoroles"]]
-        )
-        await self.bot.cxn.execute(query, autoroles, ctx.guild.id)
+        config = self.bot.server_settings[ctx.guild.id]
+        config.autoroles = config.autoroles - {role.id for role in roles}
+        await queries.set_autoroles(guilds.join(config.autoroles), ctx.guild.id)
         await ctx.send_or_reply(
             content=f"{self.bot.emote_dict['success']} Updated autorole settings.",
         )
@@ -461,18 +391,13 @@ class Automod(commands.Cog):
         Notes:
             Will ask for confirmation.
         """
-        if not self.bot.server_settings[ctx.guild.id]["autoroles"]:
+        if not self.bot.server_settings[ctx.guild.id].autoroles:
             return await ctx.fail("This server has no current autoroles.")
         content = f"{self.bot.emote_dict['exclamation']} **This action will remove all current autoroles. Do you wish to continue?**"
         p = await pagination.Confirmation(msg=content).prompt(ctx)
         if p:
-            self.bot.server_settings[ctx.guild.id]["autoroles"] = []
-            query = """
-                    UPDATE servers
-                    SET autoroles = NULL
-                    WHERE server_id = $1;
-                    """
-            await self.bot.cxn.execute(query, ctx.guild.id)
+            self.bot.server_settings[ctx.guild.id].autoroles = frozenset()
+            await queries.set_autoroles(None, ctx.guild.id)
             await ctx.send_or_reply(
                 content=f"{self.bot.emote_dict['success']} Cleared all autoroles.",
             )
@@ -493,15 +418,15 @@ class Automod(commands.Cog):
             -autorole display
             -autoassign show
         """
-        autoroles = self.bot.server_settings[ctx.guild.id]["autoroles"]
+        autoroles = self.bot.server_settings[ctx.guild.id].autoroles
 
-        if autoroles == []:
+        if not autoroles:
             return await ctx.send_or_reply(
                 content=f"No autoroles yet, use `{ctx.prefix}autorole add <roles>`",
             )
 
         p = pagination.SimplePages(
-            entries=[f"`{ctx.guild.get_role(int(x)).name}`" for x in autoroles],
+            entries=[f"`{ctx.guild.get_role(x).name}`" for x in autoroles],
             per_page=20,
         )
         p.embed.title = "Autoroles in {} ({:,} total)".format(
@@ -527,7 +452,7 @@ class Automod(commands.Cog):
             This setting is enabled by default. The bot will attempt to
             add the users their old roles unless it is missing permissions.
         """
-        current = self.bot.server_settings[ctx.guild.id]["reassign"]
+        current = self.bot.server_settings[ctx.guild.id].reassign
         if current is False:
             reassign = False
         else:
@@ -557,12 +482,8 @@ class Automod(commands.Cog):
             msg = f"{self.bot.emote_dict['warn']} That is not a valid setting."
             yes_no = current
         if yes_no != current and yes_no is not None:
-            await self.bot.cxn.execute(
-                "UPDATE servers SET reassign = $1 WHERE server_id = $2",
-                reassign,
-                ctx.guild.id,
-            )
-            self.bot.server_settings[ctx.guild.id]["reassign"] = reassign
+            await queries.set_reassign(reassign, ctx.guild.id)
+            self.bot.server_settings[ctx.guild.id].reassign = reassign
         await ctx.send_or_reply(msg)
 
     @decorators.group(
@@ -617,21 +538,21 @@ class Automod(commands.Cog):
 
         words_to_filter = words_to_filter.split(",")
 
-        current_filter = self.bot.server_settings[ctx.guild.id]["profanities"]
+        config = self.bot.server_settings[ctx.guild.id]
 
         added = []
         existing = []
         for word in words_to_filter:
-            if word.strip().lower() not in current_filter:
-                current_filter.append(word.strip().lower())
-                added.append(word.strip().lower())
+            word = word.strip().lower()
+            if word not in config.profanities and word not in added:
+                added.append(word)
             else:
-                existing.append(word.strip().lower())
+                existing.append(word)
 
-        insertion = ",".join(current_filter)
+        config.profanities = config.profanities | set(added)
+        insertion = guilds.join(config.profanities)
 
-        query = """UPDATE servers SET profanities = $1 WHERE server_id = $2;"""
-        await self.bot.cxn.execute(query, insertion, ctx.guild.id)
+        await queries.set_profanities(insertion, ctx.guild.id)
 
         if existing:
             await ctx.send_or_reply(
@@ -669,8 +590,8 @@ class Automod(commands.Cog):
 
         words_to_remove = words.lower().split(",")
 
-        word_list = self.bot.server_settings[ctx.guild.id]["profanities"]
-        if word_list == []:
+        config = self.bot.server_settings[ctx.guild.id]
+        if not config.profanities:
             return await ctx.send_or_reply(
                 content=f"{self.bot.emote_dict['warn']} This server has no filtered words.",
             )
@@ -678,22 +599,16 @@ class Automod(commands.Cog):
         removed = []
         not_found = []
         for word in words_to_remove:
-            if word.strip().lower() not in word_list:
+            if word.strip().lower() not in config.profanities:
                 not_found.append(word)
                 continue
             else:
-                word_index = word_list.index(word.strip().lower())
-                word_list.pop(word_index)
                 removed.append(word.strip().lower())
 
-        insertion = ",".join(word_list)
+        config.profanities = config.profanities - set(removed)
+        insertion = guilds.join(config.profanities)
 
-        query = """
-                UPDATE servers
-                SET profanities = $1
-                WHERE server_id = $2;
-                """
-        await self.bot.cxn.execute(query, insertion, ctx.guild.id)
+        await queries.set_profanities(insertion, ctx.guild.id)
 
         if not_found:
             await ctx.send_or_reply(
@@ -717,9 +632,9 @@ class Automod(commands.Cog):
             Starts a pagination session to
             show all currently filtered words.
         """
-        words = self.bot.server_settings[ctx.guild.id]["profanities"]
+        words = sorted(self.bot.server_settings[ctx.guild.id].profanities)
 
-        if words == []:
+        if not words:
             return await ctx.send_or_reply(
                 content=f"No filtered words yet, use `{ctx.prefix}filter add <word>` to filter words",
             )
@@ -743,13 +658,8 @@ class Automod(commands.Cog):
             Confirmation that the filtered
             word list has been cleared.
         """
-        query = """
-                UPDATE servers
-                SET profanities = NULL
-                WHERE server_id = $1;
-                """
-        await self.bot.cxn.execute(query, ctx.guild.id)
-        self.bot.server_settings[ctx.guild.id]["profanities"] = []
+        await queries.set_profanities(None, ctx.guild.id)
+        self.bot.server_settings[ctx.guild.id].profanities = frozenset()
 
         await ctx.send_or_reply(
             content=f"{self.bot.emote_dict['success']} Removed all filtered words.",
@@ -768,14 +678,9 @@ class Automod(commands.Cog):
             return
 
         guild = member.guild
-        reassign = self.bot.server_settings[member.guild.id]["reassign"]
+        reassign = self.bot.server_settings[member.guild.id].reassign
         if reassign:
-            query = """SELECT roles
-                    FROM userroles
-                    WHERE user_id = $1
-                    and server_id = $2;
-                    """
-            old_roles = await self.bot.cxn.fetchval(query, member.id, guild.id)
+            old_roles = await queries.member_roles(member.id, guild.id)
             if old_roles:
                 roles = str(old_roles).split(",")
                 role_objects = [
@@ -798,7 +703,7 @@ class Automod(commands.Cog):
                             except Exception:
                                 continue
 
-        autoroles = self.bot.server_settings[member.guild.id]["autoroles"]
+        autoroles = self.bot.server_settings[member.guild.id].autoroles
         if autoroles:
             role_objects = [
                 guild.get_role(int(role_id))
@@ -829,7 +734,7 @@ class Automod(commands.Cog):
         if message.author.guild_permissions.manage_messages:
             return  # We are immune!
         if self.bot.dregex.search(message.content):  # Check for invite linkes
-            removeinvitelinks = self.bot.server_settings[message.guild.id]["antiinvite"]
+            removeinvitelinks = self.bot.server_settings[message.guild.id].antiinvite
             if removeinvitelinks:  # Do we care?
                 try:
                     await message.delete()
@@ -838,7 +743,7 @@ class Automod(commands.Cog):
                     )
                 except Exception:  # We tried...
                     pass
-        bad_words = self.bot.server_settings[message.guild.id]["profanities"]
+        bad_words = self.bot.server_settings[message.guild.id].profanities
         if bad_words:
             vulgar = False
             profanity.load_censor_words(bad_words)
@@ -866,7 +771,7 @@ class Automod(commands.Cog):
         if after.author.guild_permissions.manage_messages:
             return  # We are immune!
         if self.bot.dregex.search(after.content):
-            removeinvitelinks = self.bot.server_settings[after.guild.id]["antiinvite"]
+            removeinvitelinks = self.bot.server_settings[after.guild.id].antiinvite
             if removeinvitelinks:
                 try:
                     await after.delete()
@@ -874,7 +779,7 @@ class Automod(commands.Cog):
                 except Exception:
                     pass
 
-        bad_words = self.bot.server_settings[after.guild.id]["profanities"]
+        bad_words = self.bot.server_settings[after.guild.id].profanities
         if bad_words:
             vulgar = False
             profanity.load_censor_words(bad_words)
@@ -1,25 +1,51 @@
+import asyncio
 import datetime
-import io
+import os
 import re
-import json
 import time
-import asyncio
-import discord
 import logging
 import traceback
 
-from collections import Counter, defaultdict
+from collections import Counter
 from datetime import timezone
 from discord.ext import commands, tasks
 
+from settings import cleanup, partitions, queries, rollups, sinks
 from utilities import utils
 from utilities import decorators
+from utilities.avatars import AvatarStore, AvatarUploader
+from utilities.buffers import DoubleBuffer, FlushPolicy, FlushScheduler
+from utilities.invites import InviteTracker
+from utilities.presence import PresenceTracker
+from utilities.spool import Spool
 
 command_logger = logging.getLogger("Snowbot")
 
 EMOJI_REGEX = re.compile(r"<a?:.+?:([0-9]{15,21})>")
 EMOJI_NAME_REGEX = re.compile(r"[0-9a-zA-Z\_]{2,32}")
 
+SPOOL_FOLDER = "./data/spool"
+RECONCILE_MINUTES = 30  # How long a full invite reconciliation sweep takes
+EDIT_FETCH_LIMIT = 1  # Edit author fetches allowed per channel
+EDIT_FETCH_WINDOW = 30.0  # every this many seconds
+
+# Default flush triggers per buffer, overridable with
+# the "flush_policies" key in ./config.json
+FLUSH_POLICIES = {
+    "messages": FlushPolicy(max_rows=2000, max_latency=0.2),
+    "snipes": FlushPolicy(max_rows=2000, max_latency=0.2),
+    "edited": FlushPolicy(max_rows=2000, max_latency=0.2),
+    "statuses": FlushPolicy(max_rows=5000, max_latency=0.5),
+    "commands": FlushPolicy(max_rows=500, max_latency=2.0),
+    "emojis": FlushPolicy(max_rows=1000, max_latency=2.0),
+    "tracker": FlushPolicy(max_rows=5000, max_latency=2.0),
+    "avatars": FlushPolicy(max_rows=1000, max_latency=2.0),
+    "usernames": FlushPolicy(max_rows=1000, max_latency=2.0),
+    "nicknames": FlushPolicy(max_rows=1000, max_latency=2.0),
+    "roles": FlushPolicy(max_rows=1000, max_latency=2.0, overflow="drop"),
+    "invites": FlushPolicy(max_rows=500, max_latency=2.0),
+}
+
 
 def setup(bot):
     bot.add_cog(Batch(bot))
@@ -33,360 +59,295 @@ class Batch(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         # Data holders
-        self.avatar_batch = []
-        self.command_batch = []
-        self.edited_batch = []
-        self.emoji_batch = defaultdict(Counter)
-        self.invite_batch = []
-        self.message_batch = []
-        self.nicknames_batch = []
-        self.roles_batch = defaultdict(dict)
-        self.snipe_batch = []
-        self.status_batch = defaultdict(dict)
-        self.tracker_batch = {}
-        self.usernames_batch = []
-
-        self.batch_lock = asyncio.Lock(loop=bot.loop)
-        self.queue = asyncio.Queue(loop=bot.loop)
-
-        self.bulk_inserter.start()
+        self.avatar_batch = self.buffer("avatars")
+        self.command_batch = self.buffer("commands")
+        self.edited_batch = self.buffer("edited", "set")
+        self.emoji_batch = self.buffer("emojis", "counter")
+        self.invite_batch = self.buffer("invites")
+        self.message_batch = self.buffer("messages")
+        self.nicknames_batch = self.buffer("nicknames")
+        self.roles_batch = self.buffer("roles", "dict")
+        self.snipe_batch = self.buffer("snipes", "set")
+        self.status_batch = self.buffer("statuses")
+        self.tracker_batch = self.buffer("tracker", "dict")
+        self.usernames_batch = self.buffer("usernames")
+
+        self.scheduler = FlushScheduler(
+            on_flush=self.flushed, on_error=self.flush_error
+        )
+        self.register(self.message_batch, self.insert_messages)
+        self.register(self.snipe_batch, self.mark_deleted, after=self.message_batch)
+        self.register(self.edited_batch, self.mark_edited, after=self.message_batch)
+        self.register(self.status_batch, self.insert_statuses)
+        self.register(self.command_batch, self.insert_commands)
+        self.register(self.emoji_batch, self.insert_emojis)
+        self.register(self.tracker_batch, self.insert_tracker)
+        self.register(self.avatar_batch, self.insert_avatars)
+        self.register(self.usernames_batch, self.insert_usernames)
+        self.register(self.nicknames_batch, self.insert_nicknames)
+        self.register(self.roles_batch, self.insert_roles)
+        self.register(self.invite_batch, self.insert_invites)
+
+        self.sink = sinks.get_sink(bot.ingest, bot.constants.batch_sink)
+
+        self.invites = InviteTracker(bot, self.invite_used)
+        self.edit_fetches = {}  # channel_id: (window start, fetches)
+        self.edit_paths = Counter()  # How edit authors were resolved
+        self.avatar_store = AvatarStore()
+        self.avatars = AvatarUploader(
+            self.upload_avatars, self.avatar_uploaded, on_error=self.upload_error
+        )
+
+        self.presence = PresenceTracker()
+
+        # A reloaded cog replays the spools of the one it replaces,
+        # so it only starts flushing once those writes are done.
+        self.previous = getattr(bot, "batch_closing", None)
+        self.starting = bot.loop.create_task(self.start_flushing())
+        self.spool_syncer.start()
         self.dispatch_avatars.start()
-        self.invite_tracker.start()
-        self.message_inserter.start()
-        self.status_inserter.start()
+        self.invite_reconciler.start()
+        self.presence_drainer.start()
+        self.partition_manager.start()
+        self.partition_backfill.start()
+        self.rollup_backfill.start()
+        self.teardown.start()
 
     def cog_unload(self):
-        self.background_task.stop()
-        self.bulk_inserter.stop()
+        self.starting.cancel()
+        self.spool_syncer.stop()
         self.dispatch_avatars.stop()
-        self.message_inserter.stop()
-        self.status_inserter.stop()
-        self.invite_tracker.stop()
+        self.avatars.cancel()
+        self.invite_reconciler.stop()
+        self.invites.cancel()
+        self.presence_drainer.stop()
+        self.partition_manager.stop()
+        self.partition_backfill.stop()
+        self.rollup_backfill.stop()
+        self.teardown.stop()
+        self.drain_presence()  # Spool whatever has been accumulated
+        for buffer in self.buffers:  # Unflushed records stay in the spool
+            buffer.spool.close()
+        self.bot.batch_closing = self.bot.loop.create_task(self.close())
+
+    async def start_flushing(self):
+        if self.previous is not None:
+            await self.previous
+        self.scheduler.start(self.bot.loop)
+
+    async def close(self):
+        # Flushes under way commit or defer their segments before
+        # the next cog lists them as backlog, then everything is fsynced.
+        if self.previous is not None:
+            await self.previous
+        await self.scheduler.stop()
+        try:
+            await self.sync_spools()
+        except Exception as e:
+            self.bot.dispatch("error", "loop_error", tb=utils.traceback_maker(e))
+
+    def register(self, buffer, write, *, after=None):
+        """
+        Schedule write(batch, con) for buffer inside an ingest
+        transaction that claims the spool segments of the batch.
+        Segments already claimed were committed by a run that
+        crashed before unlinking them, so they're skipped.
+        """
+
+        async def flush(batch, segments):
+            async with self.bot.ingest.acquire() as con:
+                async with con.transaction():
+                    if segments:
+                        claimed = await queries.claim_segments(
+                            buffer.spool.key, segments, min(segments), con=con
+                        )
+                        if not claimed:  # Replayed after its commit
+                            return
+                    await write(batch, con)
+
+        self.scheduler.register(buffer, flush, after=after)
+
+    def buffer(self, name, kind="list"):
+        spool = Spool(os.path.join(SPOOL_FOLDER, name))
+        overrides = self.bot.constants.flush_policies.get(name, {})
+        policy = FLUSH_POLICIES[name].replace(**overrides)
+        return DoubleBuffer(name, kind, spool, policy)
+
+    @property
+    def buffers(self):
+        return [
+            value for value in vars(self).values() if isinstance(value, DoubleBuffer)
+        ]
+
+    def flushed(self, buffer):
+        self.bot.batch_inserts += 1
+
+    def flush_error(self, buffer, exc):
+        self.bot.dispatch("error", "batch_error", tb=utils.traceback_maker(exc))
+
+    async def sync_spools(self):
+        await asyncio.gather(*(buffer.spool.sync() for buffer in self.buffers))
+
+    @tasks.loop(seconds=1.0)
+    async def spool_syncer(self):
+        # fsyncs the spools on a worker thread, appends never wait on the disk.
+        try:
+            await self.sync_spools()
+        except Exception as e:
+            self.bot.dispatch("error", "loop_error", tb=utils.traceback_maker(e))
+
+    def drain_presence(self):
+        for row in self.presence.drain():
+            self.status_batch.add(row)
+
+    @tasks.loop(seconds=10.0)
+    async def presence_drainer(self):
+        self.drain_presence()
 
     @tasks.loop(minutes=1.0)
-    async def invite_tracker(self):
-        self.bot.invites = {
-            guild.id: await guild.invites()
-            for guild in self.bot.guilds
-            if guild.me.guild_permissions.manage_guild
-        }
+    async def invite_reconciler(self):
+        # Spread one sweep over every guild across RECONCILE_MINUTES.
+        count = -(-len(self.bot.guilds) // RECONCILE_MINUTES)
+        try:
+            await self.invites.reconcile(count)
+        except Exception as e:
+            self.bot.dispatch("error", "loop_error", tb=utils.traceback_maker(e))
+
+    @tasks.loop(hours=6.0)
+    async def partition_manager(self):
+        try:
+            await partitions.maintain(
+                retention=self.bot.constants.message_retention,
+                action=self.bot.constants.retention_action,
+            )
+        except Exception as e:
+            self.bot.dispatch("error", "loop_error", tb=utils.traceback_maker(e))
+
+    @tasks.loop(seconds=1.0)
+    async def partition_backfill(self):
+        # Moves pre-partitioning messages over one chunk at a time.
+        try:
+            moved = await partitions.backfill()
+        except Exception as e:
+            self.bot.dispatch("error", "loop_error", tb=utils.traceback_maker(e))
+            return
+        if not moved:
+            self.partition_backfill.stop()
+
+    @tasks.loop(seconds=1.0)
+    async def rollup_backfill(self):
+        # Counts stored history into the rollups one chunk at a time.
+        try:
+            if await partitions.has_legacy():
+                return  # Legacy rows are counted once they are moved.
+            counted = await rollups.backfill("messages")
+            counted += await rollups.backfill("words", chunk=5000)
+            counted += await rollups.backfill("commands")
+        except Exception as e:
+            self.bot.dispatch("error", "loop_error", tb=utils.traceback_maker(e))
+            return
+        if not counted:
+            self.rollup_backfill.stop()
+
+    @tasks.loop(seconds=1.0)
+    async def teardown(self):
+        # Deletes the rows of servers the bot left one chunk at a time.
+        try:
+            while await cleanup.teardown():
+                await asyncio.sleep(0.1)
+        except Exception as e:
+            self.bot.dispatch("error", "loop_error", tb=utils.traceback_maker(e))
+
+    def invite_used(self, invitee, inviter, server_id):
+        self.invite_batch.add(
+            {"invitee": invitee, "inviter": inviter, "server_id": server_id}
+        )
 
     @tasks.loop(seconds=0.0)
     async def dispatch_avatars(self):
-        while True:
-            files = [await self.queue.get() for _ in range(10)]
-            try:
-                upload_batch = await self.bot.avatar_webhook.send(
-                    files=files, wait=True
-                )
-                for x in upload_batch.attachments:
-                    self.avatar_batch.append(
-                        {
-                            "user_id": int(x.filename.split(".")[0]),
-                            "avatar_id": x.id,
-                        }
-                    )
-            except discord.HTTPException as e:
-                # Here the combined files likely went over the 8mb file limit
-                # Lets divide them up into 2 parts and send them separately.
-                upload_batch_1 = await self.bot.avatar_webhook.send(
-                    files=files[:5], wait=True
-                )
-                upload_batch_2 = await self.bot.avatar_webhook.send(
-                    files=files[5:], wait=True
-                )
-                new_upload_batch = (
-                    upload_batch_1.attachments + upload_batch_2.attachments
-                )
-                for x in new_upload_batch:
-                    self.avatar_batch.append(
-                        {
-                            "user_id": int(x.filename.split(".")[0]),
-                            "avatar_id": x.id,
-                        }
-                    )
-                try:
-                    await self.bot.logging_webhook.send(
-                        f"{self.emote_dict['success']} **Information** `{datetime.utcnow()}`\n"
-                        f"```prolog\nQueue: Payload data limit resolved.```",
-                        username=f"{self.user.name} Logger",
-                        avatar_url=self.bot.constants.avatars["green"],
-                    )
-                except Exception:
-                    pass
-            except Exception as e:
-                self.bot.dispatch("error", "queue_error", tb=utils.traceback_maker(e))
-
-    @tasks.loop(seconds=0.5)
-    async def status_inserter(self):
-        if self.status_batch:  # Insert all status changes
-            async with self.batch_lock:
-                if self.status_batch["online"]:
-                    query = """
-                            INSERT INTO userstatus (user_id)
-                            SELECT x.user_id
-                            FROM JSONB_TO_RECORDSET($1::JSONB)
-                            AS x(user_id BIGINT, last_changed DOUBLE PRECISION)
-                            ON CONFLICT (user_id)
-                            DO UPDATE SET last_changed = EXCLUDED.last_changed,
-                            online = userstatus.online + (EXCLUDED.last_changed - userstatus.last_changed);
-                            """
-                    data = json.dumps(
-                        [
-                            {"user_id": user_id, "last_changed": timestamp}
-                            for user_id, timestamp in self.status_batch[
-                                "online"
-                            ].items()
-                        ]
-                    )
-                    await self.bot.cxn.execute(query, data)
-                    self.status_batch["online"].clear()
-                if self.status_batch["idle"]:
-                    query = """
-                            INSERT INTO userstatus (user_id)
-                            SELECT x.user_id
-                            FROM JSONB_TO_RECORDSET($1::JSONB)
-                            AS x(user_id BIGINT, last_changed DOUBLE PRECISION)
-                            ON CONFLICT (user_id)
-                            DO UPDATE SET last_changed = EXCLUDED.last_changed,
-                            idle = userstatus.idle + (EXCLUDED.last_changed - userstatus.last_changed);
-                            """
-                    data = json.dumps(
-                        [
-                            {"user_id": user_id, "last_changed": timestamp}
-                            for user_id, timestamp in self.status_batch["idle"].items()
-                        ]
-                    )
-                    await self.bot.cxn.execute(query, data)
-                    self.status_batch["idle"].clear()
-                if self.status_batch["dnd"]:
-                    query = """
-                            INSERT INTO userstatus (user_id)
-                            SELECT x.user_id
-                            FROM JSONB_TO_RECORDSET($1::JSONB)
-                            AS x(user_id BIGINT, last_changed DOUBLE PRECISION)
-                            ON CONFLICT (user_id)
-                            DO UPDATE SET last_changed = EXCLUDED.last_changed,
-                            dnd = userstatus.dnd + (EXCLUDED.last_changed - userstatus.last_changed)
-                            """
-                    data = json.dumps(
-                        [
-                            {"user_id": user_id, "last_changed": timestamp}
-                            for user_id, timestamp in self.status_batch["dnd"].items()
-                        ]
-                    )
-                    await self.bot.cxn.execute(query, data)
-                    self.status_batch["dnd"].clear()
-                if self.status_batch["offline"]:
-                    query = """
-                            INSERT INTO userstatus (user_id)
-                            SELECT x.user_id
-                            FROM JSONB_TO_RECORDSET($1::JSONB)
-                            AS x(user_id BIGINT, last_changed DOUBLE PRECISION)
-                            ON CONFLICT (user_id)
-                            DO UPDATE SET last_changed = EXCLUDED.last_changed;
-                            """
-                    data = json.dumps(
-                        [
-                            {"user_id": user_id, "last_changed": timestamp}
-                            for user_id, timestamp in self.status_batch[
-                                "offline"
-                            ].items()
-                        ]
-                    )
-                    await self.bot.cxn.execute(query, data)
-                    self.status_batch["offline"].clear()
-
-    @status_inserter.error
-    async def loop_error(self, exc):
-        self.bot.dispatch("error", "loop_error", tb=utils.traceback_maker(exc))
-
-    @tasks.loop(seconds=0.2)
-    async def message_inserter(self):
-        """
-        Main bulk message inserter
-        """
+        try:
+            await self.avatars.dispatch()
+        except Exception as e:
+            self.bot.dispatch("error", "queue_error", tb=utils.traceback_maker(e))
+
+    async def upload_avatars(self, files):
+        return await self.bot.avatar_webhook.send(files=files, wait=True)
+
+    def avatar_uploaded(self, user_id, attachment_id, avatar_hash):
+        self.avatar_batch.add(
+            {"user_id": user_id, "avatar_id": attachment_id, "avatar_hash": avatar_hash}
+        )
+
+    def upload_error(self, exc):
+        self.bot.dispatch("error", "queue_error", tb=utils.traceback_maker(exc))
+
+    async def insert_statuses(self, batch, con):  # Insert status durations
+        await queries.insert_statuses(*zip(*batch), con=con)
+
+    async def insert_messages(self, batch, con):  # Insert every message into the db
+        await self.sink.insert(sinks.MESSAGES, batch, con)
+        await rollups.record(con, batch)  # Same transaction, counted once
+
+    async def mark_deleted(self, batch, con):  # Snipe command setup
+        # Updates already stored messages.
+        await partitions.mark_legacy(con, "deleted", list(batch))
+        await queries.mark_deleted(list(batch), con=con)
+
+    async def mark_edited(self, batch, con):  # Edit snipe command setup
+        # Updates already stored messages.
+        await partitions.mark_legacy(con, "edited", list(batch))
+        await queries.mark_edited(list(batch), con=con)
+
+    async def insert_commands(self, batch, con):  # Insert all the commands executed.
+        await self.sink.insert(sinks.COMMANDS, batch, con)
+        await rollups.record_commands(con, batch)  # Same transaction, counted once
+
+        # Command logger to ./data/logs/commands.log
+        destination = None
+        for x in batch:
+            if x["server_id"] is None:
+                destination = "Private Message"
+            else:
+                destination = f"#{self.bot.get_channel(x['channel_id'])} [{x['channel_id']}] ({self.bot.get_guild(x['server_id'])}) [{x['server_id']}]"
+            command_logger.info(
+                f"{self.bot.get_user(x['author_id'])} in {destination}: {x['content']}"
+            )
 
-        if self.message_batch:  # Insert every message into the db
-            query = """
-                    INSERT INTO messages (unix, timestamp, content,
-                    message_id, author_id, channel_id, server_id)
-                    SELECT x.unix, x.timestamp, x.content,
-                    x.message_id, x.author_id, x.channel_id, x.server_id
-                    FROM JSONB_TO_RECORDSET($1::JSONB)
-                    AS x(unix REAL, timestamp TIMESTAMP, content TEXT,
-                    message_id BIGINT, author_id BIGINT,
-                    channel_id BIGINT, server_id BIGINT)
-                    """
-            async with self.batch_lock:
-                data = json.dumps(self.message_batch)
-                await self.bot.cxn.execute(query, data)
-                self.message_batch.clear()
-
-        if self.snipe_batch:  # Snipe command setup
-            query = """
-                    UPDATE messages
-                    SET deleted = True
-                    WHERE message_id = $1;
-                    """  # Updates already stored messages.
-            async with self.batch_lock:
-                await self.bot.cxn.executemany(query, ((x,) for x in self.snipe_batch))
-                self.snipe_batch.clear()
-
-        if self.edited_batch:  # Edit snipe command setup
-            query = """
-                    UPDATE messages
-                    SET edited = True
-                    WHERE message_id = $1;
-                    """  # Updates already stored messages.
-            async with self.batch_lock:
-                await self.bot.cxn.executemany(query, ((x,) for x in self.edited_batch))
-                self.edited_batch.clear()
-
-    @message_inserter.error
-    async def loop_error(self, exc):
-        self.bot.dispatch("error", "loop_error", tb=utils.traceback_maker(exc))
-
-    @tasks.loop(seconds=2.0)
-    async def bulk_inserter(self):
-        self.bot.batch_inserts += 1
-        if self.command_batch:  # Insert all the commands executed.
-            query = """
-                    INSERT INTO commands (server_id, channel_id,
-                    author_id, timestamp, prefix, command, failed)
-                    SELECT x.server, x.channel, x.author,
-                    x.timestamp, x.prefix, x.command, x.failed
-                    FROM JSONB_TO_RECORDSET($1::JSONB)
-                    AS x(server BIGINT, channel BIGINT,
-                    author BIGINT, timestamp TIMESTAMP,
-                    prefix TEXT, command TEXT, failed BOOLEAN);
-                    """
-            async with self.batch_lock:
-                data = json.dumps(self.command_batch)
-                await self.bot.cxn.execute(query, data)
-
-                # Command logger to ./data/logs/commands.log
-                destination = None
-                for x in self.command_batch:
-                    if x["server"] is None:
-                        destination = "Private Message"
-                    else:
-                        destination = f"#{self.bot.get_channel(x['channel'])} [{x['channel']}] ({self.bot.get_guild(x['server'])}) [{x['server']}]"
-                    command_logger.info(
-                        f"{self.bot.get_user(x['author'])} in {destination}: {x['content']}"
-                    )
-                self.command_batch.clear()
-
-        # Emoji usage tracking
-        if self.emoji_batch:
-            query = """
-                    INSERT INTO emojistats (server_id, emoji_id, total)
-                    SELECT x.server_id, x.emoji_id, x.added
-                    FROM JSONB_TO_RECORDSET($1::JSONB)
-                    AS x(server_id BIGINT, emoji_id BIGINT, added INT)
-                    ON CONFLICT (server_id, emoji_id) DO UPDATE
-                    SET total = emojistats.total + EXCLUDED.total;
-                    """
-            async with self.batch_lock:
-                data = json.dumps(
-                    [
-                        {"server_id": server_id, "emoji_id": emoji_id, "added": count}
-                        for server_id, data in self.emoji_batch.items()
-                        for emoji_id, count in data.items()
-                    ]
-                )
-                await self.bot.cxn.execute(query, data)
-                self.emoji_batch.clear()
-
-        if self.tracker_batch:  # Track user last seen times
-            query = """
-                    INSERT INTO tracker (user_id, unix, action)
-                    VALUES ($1, $2, $3)
-                    ON CONFLICT (user_id)
-                    DO UPDATE SET unix = $2, action = $3
-                    WHERE tracker.user_id = $1;
-                    """
-            async with self.batch_lock:
-                await self.bot.cxn.executemany(
-                    query,
-                    (
-                        (entry[0], entry[1][0], entry[1][1])
-                        for entry in self.tracker_batch.items()
-                    ),
-                )
-                self.tracker_batch.clear()
-
-        if self.avatar_batch:  # Save user avatars
-            query = """
-                    INSERT INTO useravatars (user_id, avatar_id)
-                    SELECT x.user_id, x.avatar_id
-                    FROM JSONB_TO_RECORDSET($1::JSONB)
-                    AS x(user_id BIGINT, avatar_id BIGINT)
-                    """
-            async with self.batch_lock:
-                data = json.dumps(self.avatar_batch)
-                await self.bot.cxn.execute(query, data)
-                self.avatar_batch.clear()
-
-        if self.usernames_batch:  # Save usernames
-            query = """
-                    INSERT INTO usernames (user_id, username)
-                    SELECT x.user_id, x.name
-                    FROM JSONB_TO_RECORDSET($1::JSONB)
-                    AS x(user_id BIGINT, name TEXT)
-                    """
-            async with self.batch_lock:
-                data = json.dumps(self.usernames_batch)
-                await self.bot.cxn.execute(query, data)
-                self.usernames_batch.clear()
-
-        if self.nicknames_batch:  # Save user nicknames
-            query = """
-                    INSERT INTO usernicks (user_id, server_id, nickname)
-                    SELECT x.user_id, x.server_id, x.nickname
-                    FROM JSONB_TO_RECORDSET($1::JSONB)
-                    AS x(user_id BIGINT, server_id BIGINT, nickname TEXT)
-                    """
-            async with self.batch_lock:
-                data = json.dumps(self.nicknames_batch)
-                await self.bot.cxn.execute(query, data)
-                self.nicknames_batch.clear()
-
-        if self.roles_batch:  # Insert roles to reassign later.
-            query = """
-                    INSERT INTO userroles (user_id, server_id, roles)
-                    SELECT x.user_id, x.server_id, x.roles
-                    FROM JSONB_TO_RECORDSET($1::JSONB)
-                    AS x(user_id BIGINT, server_id BIGINT, roles TEXT)
-                    ON CONFLICT (user_id, server_id)
-                    DO UPDATE SET roles = EXCLUDED.roles
-                    """
-            async with self.batch_lock:
-                data = json.dumps(
-                    [
-                        {"server_id": server_id, "user_id": user_id, "roles": roles}
-                        for server_id, data in self.roles_batch.items()
-                        for user_id, roles in data.items()
-                    ]
-                )
-                await self.bot.cxn.execute(query, data)
-                self.roles_batch.clear()
-
-        if self.invite_batch:  # Insert invite data for basic tracking
-            query = """
-                    INSERT INTO invites (invitee, inviter, server_id)
-                    SELECT x.invitee, x.inviter, x.server_id
-                    FROM JSONB_TO_RECORDSET($1::JSONB)
-                    AS x(invitee BIGINT, inviter BIGINT, server_id BIGINT)
-                    """
-            async with self.batch_lock:
-                data = json.dumps(self.invite_batch)
-                await self.bot.cxn.execute(query, data)
-                self.invite_batch.clear()
-
-    @bulk_inserter.error
-    async def loop_error(self, exc):
-        self.bot.dispatch("error", "loop_error", tb=utils.traceback_maker(exc))
+    async def insert_emojis(self, batch, con):  # Emoji usage tracking
+        await self.sink.upsert(
+            sinks.EMOJISTATS,
+            [
+                {"server_id": server_id, "emoji_id": emoji_id, "total": count}
+                for (server_id, emoji_id), count in batch.items()
+            ],
+            con,
+        )
+
+    async def insert_tracker(self, batch, con):  # Track user last seen times
+        unixes, actions = zip(*batch.values())
+        await queries.insert_tracker(list(batch), unixes, actions, con=con)
+
+    async def insert_avatars(self, batch, con):  # Save user avatars
+        await self.sink.insert(sinks.USERAVATARS, batch, con)
+
+    async def insert_usernames(self, batch, con):  # Save usernames
+        await self.sink.insert(sinks.USERNAMES, batch, con)
+
+    async def insert_nicknames(self, batch, con):  # Save user nicknames
+        await self.sink.insert(sinks.USERNICKS, batch, con)
+
+    async def insert_roles(self, batch, con):  # Insert roles to reassign later.
+        await self.sink.upsert(
+            sinks.USERROLES,
+            [
+                {"server_id": server_id, "user_id": user_id, "roles": roles}
+                for (server_id, user_id), roles in batch.items()
+            ],
+            con,
+        )
+
+    async def insert_invites(self, batch, con):  # Insert invite data for basic tracking
+        await self.sink.insert(sinks.INVITES, batch, con)
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
@@ -397,38 +358,31 @@ class Batch(commands.Cog):
             server_id = ctx.guild.id
         else:
             server_id = None
-        async with self.batch_lock:
-            self.command_batch.append(
-                {
-                    "server": server_id,
-                    "channel": ctx.channel.id,
-                    "author": ctx.author.id,
-                    "timestamp": str(ctx.message.created_at.utcnow()),
-                    "prefix": ctx.prefix,
-                    "command": ctx.command.qualified_name,
-                    "failed": ctx.command_failed,
-                    "content": ctx.message.clean_content.replace("\u0000", ""),
-                }
-            )
+        self.command_batch.add(
+            {
+                "server_id": server_id,
+                "channel_id": ctx.channel.id,
+                "author_id": ctx.author.id,
+                "timestamp": datetime.datetime.utcnow(),
+                "prefix": ctx.prefix,
+                "command": ctx.command.qualified_name,
+                "failed": ctx.command_failed,
+                "content": ctx.message.clean_content.replace("\u0000", ""),
+            }
+        )
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
     async def on_raw_message_delete(self, payload):
-        async with self.batch_lock:
-            self.snipe_batch.append(payload.message_id)
-
-    # Helper functions to detect changes
-    @staticmethod
-    async def status_changed(before, after):
-        if before.status != after.status:
-            return True
+        self.snipe_batch.add(payload.message_id)
 
-        try:
-            if before.activity != after.activity:
-                return True
-        except KeyError:
-            pass
+    @commands.Cog.listener()
+    @decorators.wait_until_ready()
+    async def on_raw_bulk_message_delete(self, payload):
+        for message_id in payload.message_ids:
+            self.snipe_batch.add(message_id)
 
+    # Helper functions to detect changes
     @staticmethod
     async def avatar_changed(before, after):
         if before.avatar_url != after.avatar_url:
@@ -456,23 +410,24 @@ class Batch(commands.Cog):
     @decorators.event_check(lambda s, b, a: not a.bot)
     async def on_member_update(self, before, after):
 
-        if before.status != after.status:
-            async with self.batch_lock:
-                self.status_batch[str(before.status)][after.id] = time.time()
-
-        if await self.status_changed(before, after):
-            async with self.batch_lock:
-                self.tracker_batch[before.id] = (time.time(), "updating their status")
+        # Fired once per shared guild, the tracker drops the copies.
+        presence_changed = self.presence.update(
+            after.id,
+            (str(before.status), before.activity),
+            (str(after.status), after.activity),
+            time.time(),
+        )
+        if presence_changed:
+            self.tracker_batch.add((before.id, (time.time(), "updating their status")))
 
         if await self.nickname_changed(before, after):
-            async with self.batch_lock:
-                self.nicknames_batch.append(
-                    {
-                        "user_id": after.id,
-                        "server_id": after.guild.id,
-                        "nickname": before.display_name.replace("\u0000", ""),
-                    }
-                )
+            self.nicknames_batch.add(
+                {
+                    "user_id": after.id,
+                    "server_id": after.guild.id,
+                    "nickname": before.display_name.replace("\u0000", ""),
+                }
+            )
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
@@ -483,76 +438,121 @@ class Batch(commands.Cog):
         username, and discriminator changes.
         """
         if await self.avatar_changed(before, after):
-            async with self.batch_lock:
-                self.tracker_batch[before.id] = (time.time(), "updating their avatar")
-            if self.bot.avatar_webhook:  # Check if we have the webhook set up.
-                try:
-                    avatar_url = str(after.avatar_url_as(format="png", size=1024))
-                    resp = await self.bot.get((avatar_url), res_method="read")
-                    data = io.BytesIO(resp)
-                    dfile = discord.File(data, filename=f"{after.id}.png")
-                    self.queue.put_nowait(dfile)
-                except Exception as e:
-                    await self.bot.logging_webhook.send(f"Error in avatar_batcher: {e}")
-                    await self.bot.logging_webhook.send(
-                        "```prolog\n" + str(traceback.format_exc()) + "```"
-                    )
+            self.tracker_batch.add((before.id, (time.time(), "updating their avatar")))
+            try:
+                avatar_url = str(after.avatar_url_as(format="png", size=1024))
+                resp = await self.bot.get((avatar_url), res_method="read")
+                avatar_hash = await self.bot.loop.run_in_executor(
+                    None, self.avatar_store.put, resp
+                )
+                if self.bot.avatar_webhook:  # Check if we have the webhook set up.
+                    self.avatars.submit(after.id, resp)
+                else:
+                    self.avatar_uploaded(after.id, None, avatar_hash)
+            except Exception as e:
+                await self.bot.logging_webhook.send(f"Error in avatar_batcher: {e}")
+                await self.bot.logging_webhook.send(
+                    "```prolog\n" + str(traceback.format_exc()) + "```"
+                )
 
         if await self.username_changed(before, after):
-            async with self.batch_lock:
-                self.usernames_batch.append(
-                    {
-                        "user_id": before.id,
-                        "name": str(before).replace("\u0000", ""),
-                    }
-                )
-                self.tracker_batch[before.id] = (time.time(), "updating their username")
+            self.usernames_batch.add(
+                {
+                    "user_id": before.id,
+                    "username": str(before).replace("\u0000", ""),
+                }
+            )
+            self.tracker_batch.add(
+                (before.id, (time.time(), "updating their username"))
+            )
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
     @decorators.event_check(lambda s, m: m.guild and not m.author.bot)
     async def on_message(self, message):
-        async with self.batch_lock:
-            self.message_batch.append(
-                {
-                    "unix": message.created_at.replace(tzinfo=timezone.utc).timestamp(),
-                    "timestamp": str(message.created_at.utcnow()),
-                    "content": message.clean_content.replace("\u0000", ""),
-                    "message_id": message.id,
-                    "author_id": message.author.id,
-                    "channel_id": message.channel.id,
-                    "server_id": message.guild.id,
-                }
-            )
-            self.tracker_batch[message.author.id] = (time.time(), "sending a message")
+        self.message_batch.add(
+            {
+                "unix": message.created_at.replace(tzinfo=timezone.utc).timestamp(),
+                "timestamp": datetime.datetime.utcnow(),
+                "content": message.clean_content.replace("\u0000", ""),
+                "message_id": message.id,
+                "author_id": message.author.id,
+                "channel_id": message.channel.id,
+                "server_id": message.guild.id,
+            }
+        )
+        self.tracker_batch.add((message.author.id, (time.time(), "sending a message")))
 
         matches = EMOJI_REGEX.findall(message.content)
-        if matches:
-            async with self.batch_lock:
-                self.emoji_batch[message.guild.id].update(map(int, matches))
+        for emoji_id, count in Counter(map(int, matches)).items():
+            self.emoji_batch.add(((message.guild.id, emoji_id), count))
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
     @decorators.event_check(lambda s, c, u, w: not u.bot)
     async def on_typing(self, channel, user, when):
-        async with self.batch_lock:
-            self.tracker_batch[user.id] = (time.time(), "typing")
+        self.tracker_batch.add((user.id, (time.time(), "typing")))
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
     async def on_raw_message_edit(self, payload):
-        self.edited_batch.append(payload.message_id)
-        channel_obj = self.bot.get_channel(payload.channel_id)
+        self.edited_batch.add(payload.message_id)
+        author = await self.edit_author(payload)
+        if author is None:
+            return
+        author_id, bot = author
+        if bot:
+            return
+        self.tracker_batch.add((author_id, (time.time(), "editing a message")))
+
+    async def edit_author(self, payload):
+        """
+        Find the (author_id, bot) of an edited message.
+        Tries the gateway payload, the message cache, the
+        messages table and only then the API, which is
+        rate limited per channel.
+        """
+        author = payload.data.get("author")
+        if author:
+            self.edit_paths["payload"] += 1
+            return int(author["id"]), author.get("bot", False)
+
+        if payload.cached_message:
+            self.edit_paths["cache"] += 1
+            message = payload.cached_message
+            return message.author.id, message.author.bot
+
+        author_id = await queries.edit_author(payload.message_id)
+        if author_id is not None:  # Only messages from users are stored
+            self.edit_paths["database"] += 1
+            return author_id, False
+
+        channel = self.bot.get_channel(payload.channel_id)
+        if channel is None or not self.can_fetch_edit(channel.id):
+            self.edit_paths["skipped"] += 1
+            return
         try:
-            message = await channel_obj.fetch_message(payload.message_id)
-        except (RuntimeError, RuntimeWarning):
-            pass
+            message = await channel.fetch_message(payload.message_id)
         except Exception:
+            self.edit_paths["failed"] += 1
             return
-        if message.author.bot:
-            return
-        async with self.batch_lock:
-            self.tracker_batch[message.author.id] = (time.time(), "editing a message")
+        self.edit_paths["fetch"] += 1
+        return message.author.id, message.author.bot
+
+    def can_fetch_edit(self, channel_id):
+        now = time.monotonic()
+        # Windows are inserted as they start, so the expired ones
+        # are always at the front and are dropped from there.
+        while self.edit_fetches:
+            channel = next(iter(self.edit_fetches))
+            if now - self.edit_fetches[channel][0] < EDIT_FETCH_WINDOW:
+                break
+            del self.edit_fetches[channel]
+        start, fetches = self.edit_fetches.get(channel_id, (now, 0))
+        if fetches >= EDIT_FETCH_LIMIT:
+            return False
+        self.edit_fetches[channel_id] = (start, fetches + 1)
+        return True
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
@@ -563,84 +563,48 @@ class Batch(commands.Cog):
             return
         if user.bot:
             return
-        async with self.batch_lock:
-            self.tracker_batch[payload.user_id] = (time.time(), "reacting to a message")
+        self.tracker_batch.add(
+            (payload.user_id, (time.time(), "reacting to a message"))
+        )
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
     @decorators.event_check(lambda s, m, b, a: not m.bot)
     async def on_voice_state_update(self, member, before, after):
-        async with self.batch_lock:
-            self.tracker_batch[member.id] = (time.time(), "changing their voice state")
+        self.tracker_batch.add((member.id, (time.time(), "changing their voice state")))
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
     @decorators.event_check(lambda s, i: i.inviter and not i.inviter.bot)
     async def on_invite_create(self, invite):
-        async with self.batch_lock:
-            self.tracker_batch[invite.inviter.id] = (time.time(), "creating an invite")
-        if not invite.guild.me.guild_permissions.manage_guild:
-            return
-        self.bot.invites[invite.guild.id] = await invite.guild.invites()
+        self.tracker_batch.add((invite.inviter.id, (time.time(), "creating an invite")))
+        if self.invites.trackable(invite.guild):
+            self.invites.created(invite)
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
     async def on_invite_delete(self, invite):
-        if not invite.guild.me.guild_permissions.manage_guild:
-            return
-        self.bot.invites[invite.guild.id] = await invite.guild.invites()
+        if self.invites.trackable(invite.guild):
+            self.invites.deleted(invite)
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
     @decorators.event_check(lambda s, m: not m.bot)
     async def on_member_join(self, member):
-        async with self.batch_lock:
-            self.tracker_batch[member.id] = (time.time(), "joining a server")
-
-        await asyncio.sleep(2)  # API rest.
-
-        try:
-            if not member.guild.me.guild_permissions.manage_guild:
-                return
-        except AttributeError:  # Sometimes if we're getting kicked as they join...
-            return
-        async with self.batch_lock:
-            old_invites = self.bot.invites[member.guild.id]
-            new_invites = await member.guild.invites()
-            for invite in old_invites:
-                if not invite:
-                    self.bot.logging_webhook.send(f"**Invite is NoneType**")
-                    continue
-                if not self.get_invite(new_invites, invite.code):
-                    self.bot.logging_webhook.send(f"**Invite code was not matched**")
-                    continue
-                if invite.uses < self.get_invite(new_invites, invite.code).uses:
-                    self.invite_batch.append(
-                        {
-                            "invitee": member.id,
-                            "inviter": invite.inviter.id,
-                            "server_id": member.guild.id,
-                        }
-                    )
-            self.bot.invites[member.guild.id] = new_invites
-
-    def get_invite(self, invite_list, code):
-        for invite in invite_list:
-            if invite.code == code:
-                return invite
+        self.tracker_batch.add((member.id, (time.time(), "joining a server")))
+        self.invites.joined(member)
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
     @decorators.event_check(lambda s, m: not m.bot)
     async def on_member_remove(self, member):
-        async with self.batch_lock:
-            self.tracker_batch[member.id] = (time.time(), "leaving a server")
-            roles = ",".join([str(x.id) for x in member.roles if x.name != "@everyone"])
-            self.roles_batch[member.guild.id].update({member.id: roles})
+        self.tracker_batch.add((member.id, (time.time(), "leaving a server")))
+        roles = ",".join([str(x.id) for x in member.roles if x.name != "@everyone"])
+        self.roles_batch.add(((member.guild.id, member.id), roles))
 
-        if not member.guild.me.guild_permissions.manage_guild:
-            return
-        self.bot.invites[member.guild.id] = await member.guild.invites()
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.invites.removed(guild.id)
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
@@ -654,30 +618,12 @@ class Batch(commands.Cog):
 
     async def last_observed(self, member):
         """Lookup last_observed data."""
-        query = """
-                SELECT DISTINCT ON (unix) unix, action
-                FROM tracker
-                WHERE user_id = $1
-                ORDER BY unix DESC;
-                """
-        last_seen = await self.bot.cxn.fetchrow(query, member.id) or None
-
-        query = """
-                SELECT MAX(unix)
-                FROM messages
-                WHERE author_id = $1;
-                """
-        last_spoke = await self.bot.cxn.fetchval(query, member.id) or None
+        last_seen = await queries.last_seen(member.id) or None
+        last_spoke = await queries.last_spoke(member.id) or None
         server_last_spoke = None
         if hasattr(member, "guild"):
-            query = """
-                    SELECT MAX(unix)
-                    FROM messages
-                    WHERE author_id = $1
-                    AND server_id = $2;
-                    """
-            server_last_spoke = await self.bot.cxn.fetchval(
-                query, member.id, member.guild.id
+            server_last_spoke = await queries.server_last_spoke(
+                member.id, member.guild.id
             )
 
         if last_seen:
@@ -711,15 +657,7 @@ class Batch(commands.Cog):
         Lookup all saved user avatars
         """
         avatars = []
-        query = """
-                SELECT ARRAY(
-                    SELECT avatar_id
-                    FROM useravatars
-                    WHERE user_id = $1
-                    ORDER BY insertion DESC
-                ) as avatar_list;
-                """
-        results = await self.bot.cxn.fetchval(query, user.id)
+        results = await queries.user_avatars(user.id)
         avatars.extend(results)
         if avatars:
             avatars = [
@@ -728,20 +666,41 @@ class Batch(commands.Cog):
             ]
         return avatars
 
+    async def get_avatar_thumbnails(self, user, limit=16):
+        """
+        Lookup the hashes of a user's most recent avatars
+        Avatars saved before the local store existed are
+        downloaded from the avatar channel once and stored.
+        """
+        records = await queries.avatar_thumbnails(user.id, limit)
+        hashes = []
+        for avatar_id, avatar_hash in records:
+            if avatar_hash is None or avatar_hash not in self.avatar_store:
+                avatar_hash = await self.backfill_avatar(user, avatar_id)
+            if avatar_hash:
+                hashes.append(avatar_hash)
+        return hashes
+
+    async def backfill_avatar(self, user, avatar_id):
+        if avatar_id is None or not self.bot.avatar_webhook:
+            return
+        avatar_url = f"https://cdn.discordapp.com/attachments/{self.bot.avatar_webhook.channel.id}/{avatar_id}/{user.id}.png"
+        try:
+            resp = await self.bot.get(avatar_url, res_method="read")
+            avatar_hash = await self.bot.loop.run_in_executor(
+                None, self.avatar_store.put, resp
+            )
+        except Exception:
+            return
+        await queries.set_avatar_hash(avatar_hash, avatar_id)
+        return avatar_hash
+
     async def get_names(self, user):
         """
         Lookup all saved usernames
         """
         usernames = [str(user)]  # Tack on their current username
-        query = """
-                SELECT ARRAY(
-                    SELECT username
-                    FROM usernames
-                    WHERE user_id = $1
-                    ORDER BY insertion DESC
-                ) as name_list;
-                """
-        results = await self.bot.cxn.fetchval(query, user.id)
+        results = await queries.user_names(user.id)
         if results:
             usernames.extend(results)
         return usernames
@@ -753,16 +712,7 @@ class Batch(commands.Cog):
         if not hasattr(user, "guild"):
             return []  # Not a 'member' object
         nicknames = [user.display_name]  # Tack on their current nickname
-        query = """
-                SELECT ARRAY(
-                    SELECT nickname
-                    FROM usernicks
-                    WHERE user_id = $1
-                    AND server_id = $2
-                    ORDER BY insertion DESC
-                ) as nick_list;
-                """
-        results = await self.bot.cxn.fetchval(query, user.id, user.guild.id)
+        results = await queries.user_nicks(user.id, user.guild.id)
         if results:
             nicknames.extend(results)
         return nicknames
@@ -11,9 +11,9 @@ import objgraph
 import functools
 
 import discord
-from collections import defaultdict
 from discord.ext import commands, menus
 
+from settings import queries
 from utilities import checks
 from utilities import helpers
 from utilities import converters
@@ -1083,7 +1083,7 @@ class Botadmin(commands.Cog):
         await ctx.send_or_reply("```fix\n" + stdout.getvalue() + "```")
 
     async def tabulate_query(self, ctx, query, *args):
-        records = await self.bot.cxn.fetch(query, *args)
+        records = await query(*args)
 
         if len(records) == 0:
             return await ctx.send_or_reply(content="No results found.")
@@ -1121,19 +1121,7 @@ class Botadmin(commands.Cog):
             command, server,
             user, log, cog
         """
-        query = """SELECT
-                        CASE failed
-                            WHEN TRUE THEN command || ' [!]'
-                            ELSE command
-                        END AS "command",
-                        to_char(timestamp, 'Mon DD HH12:MI:SS AM') AS "invoked",
-                        author_id,
-                        server_id
-                   FROM commands
-                   ORDER BY timestamp DESC
-                   LIMIT 15;
-                """
-        await self.tabulate_query(ctx, query)
+        await self.tabulate_query(ctx, queries.command_history)
 
     @command_history.command(name="command", aliases=["for"])
     @commands.is_owner()
@@ -1142,76 +1130,32 @@ class Botadmin(commands.Cog):
     ):
         """Command history for a command."""
 
-        query = """SELECT *, t.success + t.failed AS "total"
-                   FROM (
-                       SELECT server_id,
-                              SUM(CASE WHEN failed THEN 0 ELSE 1 END) AS "success",
-                              SUM(CASE WHEN failed THEN 1 ELSE 0 END) AS "failed"
-                       FROM commands
-                       WHERE command=$1
-                       AND timestamp > (CURRENT_TIMESTAMP - $2::interval)
-                       GROUP BY server_id
-                   ) AS t
-                   ORDER BY "total" DESC
-                   LIMIT 30;
-                """
-
-        await self.tabulate_query(ctx, query, command, datetime.timedelta(days=days))
+        await self.tabulate_query(
+            ctx, queries.command_history_for, command, datetime.timedelta(days=days)
+        )
 
     @command_history.command(name="guild", aliases=["server"])
     @commands.is_owner()
     async def command_history_guild(self, ctx, server_id: int):
         """Command history for a guild."""
 
-        query = """SELECT
-                        CASE failed
-                            WHEN TRUE THEN command || ' [!]'
-                            ELSE command
-                        END AS "command",
-                        channel_id,
-                        author_id,
-                        timestamp
-                   FROM commands
-                   WHERE server_id=$1
-                   ORDER BY timestamp DESC
-                   LIMIT 15;
-                """
-        await self.tabulate_query(ctx, query, server_id)
+        await self.tabulate_query(ctx, queries.command_history_guild, server_id)
 
     @command_history.command(name="user", aliases=["member"])
     @commands.is_owner()
     async def command_history_user(self, ctx, user_id: int):
         """Command history for a user."""
 
-        query = """SELECT
-                        CASE failed
-                            WHEN TRUE THEN command || ' [!]'
-                            ELSE command
-                        END AS "command",
-                        server_id,
-                        timestamp
-                   FROM commands
-                   WHERE author_id=$1
-                   ORDER BY timestamp DESC
-                   LIMIT 20;
-                """
-        await self.tabulate_query(ctx, query, user_id)
+        await self.tabulate_query(ctx, queries.command_history_user, user_id)
 
     @command_history.command(name="log")
     @commands.is_owner()
     async def command_history_log(self, ctx, days=7):
         """Command history log for the last N days."""
 
-        query = """SELECT command, COUNT(*)
-                   FROM commands
-                   WHERE timestamp > (CURRENT_TIMESTAMP - $1::interval)
-                   GROUP BY command
-                   ORDER BY 2 DESC
-                """
-
         all_commands = {c.qualified_name: 0 for c in self.bot.walk_commands()}
 
-        records = await self.bot.cxn.fetch(query, datetime.timedelta(days=days))
+        records = await queries.command_history_log(datetime.timedelta(days=days))
         for name, uses in records:
             if name in all_commands:
                 all_commands[name] = uses
@@ -1256,65 +1200,19 @@ class Botadmin(commands.Cog):
             if cog is None:
                 return await ctx.send_or_reply(content=f"Unknown cog: {cog}")
 
-            query = """SELECT *, t.success + t.failed AS "total"
-                       FROM (
-                           SELECT command,
-                                  SUM(CASE WHEN failed THEN 0 ELSE 1 END) AS "success",
-                                  SUM(CASE WHEN failed THEN 1 ELSE 0 END) AS "failed"
-                           FROM commands
-                           WHERE command = any($1::text[])
-                           AND timestamp > (CURRENT_TIMESTAMP - $2::interval)
-                           GROUP BY command
-                       ) AS t
-                       ORDER BY "total" DESC
-                       LIMIT 30;
-                    """
             return await self.tabulate_query(
-                ctx, query, [c.qualified_name for c in cog.walk_commands()], interval
+                ctx,
+                queries.command_history_cog,
+                [c.qualified_name for c in cog.walk_commands()],
+                interval,
             )
 
-        # A more manual query with a manual grouper.
-        query = """SELECT *, t.success + t.failed AS "total"
-                   FROM (
-                       SELECT command,
-                              SUM(CASE WHEN failed THEN 0 ELSE 1 END) AS "success",
-                              SUM(CASE WHEN failed THEN 1 ELSE 0 END) AS "failed"
-                       FROM commands
-                       WHERE timestamp > (CURRENT_TIMESTAMP - $1::interval)
-                       GROUP BY command
-                   ) AS t;
-                """
-
-        class Count:
-            __slots__ = ("success", "failed", "total")
-
-            def __init__(self):
-                self.success = 0
-                self.failed = 0
-                self.total = 0
-
-            def add(self, record):
-                self.success += record["success"]
-                self.failed += record["failed"]
-                self.total += record["total"]
-
-        data = defaultdict(Count)
-        records = await self.bot.cxn.fetch(query, interval)
-        for record in records:
-            command = self.bot.get_command(record["command"])
-            if command is None or command.cog is None:
-                data["No Cog"].add(record)
-            else:
-                data[command.cog.qualified_name].add(record)
-
-        table = formatting.TabularData()
-        table.set_columns(["Cog", "Success", "Failed", "Total"])
-        data = sorted(
-            [(cog, e.success, e.failed, e.total) for cog, e in data.items()],
-            key=lambda t: t[-1],
-            reverse=True,
+        # Commands are grouped by the cog they belong to in postgres.
+        names, cogs = [], []
+        for command in self.bot.walk_commands():
+            if command.cog is not None:
+                names.append(command.qualified_name)
+                cogs.append(command.cog.qualified_name)
+        await self.tabulate_query(
+            ctx, queries.command_history_cogs, names, cogs, interval
         )
-
-        table.add_rows(data)
-        render = table.render()
-        await ctx.safe_send(f"```\n{render}\n```")
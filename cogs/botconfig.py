@@ -7,6 +7,7 @@ import discord
 from datetime import datetime
 from discord.ext import commands, menus
 
+from settings import queries
 from utilities import utils
 from utilities import checks
 from utilities import converters
@@ -144,34 +145,19 @@ class Botconfig(commands.Cog):
             msg = "Presence has been reset."
         else:
             msg = f"Presence now set to `{presence}`"
-        query = """
-                UPDATE config
-                SET presence = $1
-                WHERE client_id = $2;
-                """
-        await self.bot.cxn.execute(query, presence, self.bot.user.id)
+        await queries.set_presence(presence, self.bot.user.id)
         await self.bot.set_status()
         await ctx.success(msg)
 
     @change.command(brief="Set the bot's status type.")
     async def status(self, ctx, status: converters.BotStatus):
-        query = """
-                UPDATE config
-                SET status = $1
-                WHERE client_id = $2
-                """
-        await self.bot.cxn.execute(query, status, self.bot.user.id)
+        await queries.set_status(status, self.bot.user.id)
         await self.bot.set_status()
         await ctx.success(f"Status now set as `{status}`")
 
     @change.command(brief="Set the bot's activity type.", aliases=["action"])
     async def activity(self, ctx, activity: converters.BotActivity):
-        query = """
-                UPDATE config
-                SET activity = $1
-                WHERE client_id = $2
-                """
-        await self.bot.cxn.execute(query, activity, self.bot.user.id)
+        await queries.set_activity(activity, self.bot.user.id)
         await self.bot.set_status()
         await ctx.success(f"Status now set as `{activity}`")
 
@@ -570,14 +556,9 @@ class Botconfig(commands.Cog):
         """
         Usage: {0}ownerlock
         """
-        query = """
-                UPDATE config
-                SET ownerlocked = $1
-                WHERE client_id = $2;
-                """
         if self.is_ownerlocked is True:
             self.is_ownerlocked = False
-            await self.bot.cxn.execute(query, False, self.bot.user.id)
+            await queries.set_ownerlocked(False, self.bot.user.id)
             return await ctx.success(f"**Ownerlock Disabled.**")
         else:
             c = await ctx.confirm(
@@ -585,7 +566,7 @@ class Botconfig(commands.Cog):
             )
             if c:
                 self.is_ownerlocked = True
-                await self.bot.cxn.execute(query, True, self.bot.user.id)
+                await queries.set_ownerlocked(True, self.bot.user.id)
                 await ctx.success(f"**Ownerlock Enabled.**")
                 return
 
@@ -7,6 +7,7 @@ import itertools
 from collections import defaultdict
 from discord.ext import commands
 
+from settings import queries
 from utilities import checks
 from utilities import helpers
 from utilities import converters
@@ -25,36 +26,28 @@ class Config(commands.Cog):
 
     def __init__(self, bot):
         # Initialize from the DB
-        bot.loop.create_task(self.load_plonks())
         bot.loop.create_task(self.load_command_config())
 
         self.bot = bot
-        self.ignored = defaultdict(list)  # List of ignored entities
         self.command_config = defaultdict(list)  # list of ignored commands
 
     async def load_command_config(self):
-        query = """
-                SELECT entity_id, ARRAY_AGG(command) AS commands
-                FROM command_config GROUP BY entity_id;
-                """
-        records = await self.bot.cxn.fetch(query)
-        if records:
-            [
-                self.command_config[record["entity_id"]].extend(record["commands"])
-                for record in records
-            ]
-
-    async def load_plonks(self):
-        query = """
-                SELECT server_id, ARRAY_AGG(entity_id) AS entities
-                FROM plonks GROUP BY server_id;
-                """
-        records = await self.bot.cxn.fetch(query)
-        if records:
-            [
-                self.ignored[record["server_id"]].extend(record["entities"])
-                for record in records
-            ]
+        records = await queries.load_command_config()
+        command_config = defaultdict(list)
+        for record in records:
+            command_config[record["entity_id"]].extend(record["commands"])
+        self.command_config = command_config  # Swapped so a reload never duplicates
+
+    @commands.Cog.listener()
+    async def on_config_update(self, server_id, section):
+        # Another process changed the settings, a section of None is everything.
+        if section in (None, "command_config"):
+            await self.load_command_config()
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        for entity_id in [guild.id, *(channel.id for channel in guild.channels)]:
+            self.command_config.pop(entity_id, None)
 
     async def bot_check_once(self, ctx):
         # Reasons for bypassing
@@ -69,15 +62,14 @@ class Config(commands.Cog):
                 return True  # Manage guild is immune.
 
         # Now check channels, roles, and users.
-        if ctx.channel.id in self.ignored[ctx.guild.id]:
+        ignored = self.bot.server_settings[ctx.guild.id].ignored
+        if ctx.channel.id in ignored:
             return False  # Channel is ignored.
 
-        if ctx.author.id in self.ignored[ctx.guild.id]:
+        if ctx.author.id in ignored:
             return False  # User is ignored.
 
-        if any(
-            (role_id in self.ignored[ctx.guild.id] for role_id in ctx.author._roles)
-        ):
+        if not ignored.isdisjoint(ctx.author._roles):
             return False  # Role is ignored.
 
         return True  # Ok just in case we get here...
@@ -115,15 +107,11 @@ class Config(commands.Cog):
     async def ignore_entities(self, ctx, entities):
         failed = []
         success = []
-        query = """
-                INSERT INTO plonks (server_id, entity_id)
-                VALUES ($1, $2)
-                """
         async with self.bot.cxn.acquire() as conn:
             async with conn.transaction():
                 for entity in entities:
                     try:
-                        await self.bot.cxn.execute(query, ctx.guild.id, entity.id)
+                        await queries.insert_plonk(ctx.guild.id, entity.id)
                     except asyncpg.exceptions.UniqueViolationError:
                         failed.append((str(entity), "Entity is already being ignored"))
                         continue
@@ -132,7 +120,8 @@ class Config(commands.Cog):
                         continue
                     else:
                         success.append(str(entity))
-                        self.ignored[ctx.guild.id].append(entity.id)
+                        config = self.bot.server_settings[ctx.guild.id]
+                        config.ignored = config.ignored | {entity.id}
         if success:
             await ctx.success(
                 f"Ignored entit{'y' if len(success) == 1 else 'ies'} `{', '.join(success)}`"
@@ -200,12 +189,7 @@ class Config(commands.Cog):
             roles, and channels in the server
         """
         await ctx.trigger_typing()
-        query = """
-                SELECT entity_id
-                FROM plonks
-                WHERE server_id = $1;
-                """
-        records = await self.bot.cxn.fetch(query, ctx.guild.id)
+        records = await queries.server_plonks(ctx.guild.id)
         if not records:
             return await ctx.success("No entities are being ignored.")
 
@@ -282,9 +266,8 @@ class Config(commands.Cog):
             ignored list of objects.
         """
         await ctx.trigger_typing()
-        query = "DELETE FROM plonks WHERE server_id = $1;"
-        await self.bot.cxn.execute(query, ctx.guild.id)
-        self.ignored[ctx.guild.id].clear()
+        await queries.clear_plonks(ctx.guild.id)
+        self.bot.server_settings[ctx.guild.id].ignored = frozenset()
         await ctx.success("Cleared the server's ignore list.")
 
     @decorators.group(
@@ -316,16 +299,10 @@ class Config(commands.Cog):
             all  # Unignore all previous entities.
         """
         await ctx.trigger_typing()
-        query = """
-                DELETE FROM plonks
-                WHERE server_id = $1
-                AND entity_id = ANY($2::BIGINT[]);
-                """
         entries = [c.id for c in entities]
-        await self.bot.cxn.execute(query, ctx.guild.id, entries)
-        self.ignored[ctx.guild.id] = [
-            x for x in self.ignored[ctx.guild.id] if x not in entries
-        ]
+        await queries.delete_plonks(ctx.guild.id, entries)
+        config = self.bot.server_settings[ctx.guild.id]
+        config.ignored = config.ignored - set(entries)
         await ctx.success(
             f"Removed `{', '.join([str(x) for x in entities])}` from the ignored list."
         )
@@ -348,18 +325,14 @@ class Config(commands.Cog):
         await ctx.invoke(self.ignore_clear)
 
     async def disable_command(self, ctx, entity, commands):
-        query = """
-                INSERT INTO command_config (server_id, entity_id, command)
-                VALUES ($1, $2, $3);
-                """
         failed = []
         success = []
         async with self.bot.cxn.acquire() as conn:
             async with conn.transaction():
                 for command in commands:
                     try:
-                        await self.bot.cxn.execute(
-                            query, ctx.guild.id, entity.id, command
+                        await queries.insert_command_config(
+                            ctx.guild.id, entity.id, command
                         )
                     except asyncpg.exceptions.UniqueViolationError:
                         failed.append(
@@ -383,13 +356,7 @@ class Config(commands.Cog):
             await helpers.error_info(ctx, failed, option="Command")
 
     async def enable_command(self, ctx, entity, commands):
-        query = """
-                DELETE FROM command_config
-                WHERE server_id = $1
-                AND entity_id = $2
-                AND command = ANY($3::TEXT[]);
-                """
-        await self.bot.cxn.execute(query, ctx.guild.id, entity.id, commands)
+        await queries.delete_command_config(ctx.guild.id, entity.id, commands)
         self.command_config[entity.id] = [
             x for x in self.command_config[entity.id] if x not in commands
         ]
@@ -463,14 +430,7 @@ class Config(commands.Cog):
 
         """
         await ctx.trigger_typing()
-        query = """
-                SELECT entity_id,
-                ARRAY_AGG(command) as commands
-                FROM command_config
-                WHERE server_id = $1
-                GROUP BY entity_id;
-                """
-        records = await self.bot.cxn.fetch(query, ctx.guild.id)
+        records = await queries.server_command_config(ctx.guild.id)
         if not records:
             return await ctx.success("No commands are disabled.")
 
@@ -521,8 +481,7 @@ class Config(commands.Cog):
             for channels, roles and users.
         """
         await ctx.trigger_typing()
-        query = "DELETE FROM command_config WHERE server_id = $1;"
-        await self.bot.cxn.execute(query, ctx.guild.id)
+        await queries.clear_command_config(ctx.guild.id)
         await self.load_command_config()
         await ctx.success("Cleared the server's disabled command list.")
 
@@ -225,7 +225,7 @@ class Files(commands.Cog):
             content="Saving settings to **{}**...".format(settings_file),
         )
 
-        settings = self.bot.server_settings[ctx.guild.id]
+        settings = self.bot.server_settings[ctx.guild.id].to_dict()
 
         utils.write_json(settings_file, settings)
 
@@ -9,6 +9,7 @@ from discord.ext import commands, menus
 
 from dislash.interactions import ActionRow, ButtonStyle, Button
 
+from settings import queries
 from utilities import utils
 from utilities import checks
 from utilities import converters
@@ -149,10 +150,7 @@ class Help(commands.Cog):
                 i.brief = "No description"
             line = f"\n`{i.name}` {i.brief}\n"
             if ctx.guild:
-                if (
-                    i.name
-                    not in self.bot.server_settings[ctx.guild.id]["disabled_commands"]
-                ):
+                if i.name not in self.bot.server_settings[ctx.guild.id].disabled_commands:
                     msg += line
                 else:
                     msg += f"\n[!] `{i.name}` ~~{i.brief}~~\n"
@@ -229,9 +227,9 @@ class Help(commands.Cog):
                 else:
                     line = f"\n`{c.qualified_name}` {c.description}\n"
                 if ctx.guild:
-                    disabled_comms = self.bot.server_settings[ctx.guild.id][
-                        "disabled_commands"
-                    ]
+                    disabled_comms = self.bot.server_settings[
+                        ctx.guild.id
+                    ].disabled_commands
                     cog_comms = [y.name for y in c.get_commands() if not y.hidden]
                     if all(x in disabled_comms for x in cog_comms):
                         msg += f"\n[!] `{c.qualified_name}` ~~{c.description}~~\n"
@@ -871,12 +869,7 @@ class Help(commands.Cog):
         writer = f"{self.bot.get_user(command.writer)} [{command.writer}]"
         uperms = await self.required_permissions(command, "")
         bperms = await self.required_permissions(command)
-        query = """
-                SELECT (COUNT(*), MAX(timestamp))
-                FROM commands
-                WHERE command = $1
-                """
-        stats = await self.bot.cxn.fetchval(query, command.qualified_name)
+        stats = await queries.command_stats(command.qualified_name)
         last_run = utils.format_time(stats[1])
         total_runs = stats[0]
         title = f"{self.bot.emote_dict['commands']} **Information on `{command.qualified_name}`**"
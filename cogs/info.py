@@ -21,6 +21,7 @@ from PIL import Image, ImageDraw, ImageFont
 
 from dislash.interactions import ActionRow, ButtonStyle, Button
 
+from settings import queries
 from utilities import utils
 from utilities import checks
 from utilities import converters
@@ -58,22 +59,13 @@ class Info(commands.Cog):
             self.bot.socket_events[event_type] += 1
 
     async def total_global_commands(self):
-        query = """SELECT COUNT(*) FROM commands"""
-        value = await self.bot.cxn.fetchval(query)
-        return value
+        return await queries.global_command_count()
 
     async def total_global_messages(self):
-        query = """SELECT COUNT(*) FROM messages"""
-        value = await self.bot.cxn.fetchval(query)
-        return value
+        return await queries.global_message_count()
 
     async def get_version(self):
-        query = """
-                SELECT version
-                FROM config
-                WHERE client_id = $1;
-                """
-        v = await self.bot.cxn.fetchval(query, self.bot.user.id)
+        v = await queries.bot_version(self.bot.user.id)
         version = ".".join(str(round(v, 1)).replace(".", ""))
         return version
 
@@ -1060,11 +1052,7 @@ class Info(commands.Cog):
             of my uptime across all time
         """
         await ctx.trigger_typing()
-        query = """
-                SELECT runtime, starttime, last_run
-                FROM config WHERE client_id = $1;
-                """
-        botstats = await self.bot.cxn.fetchrow(query, self.bot.user.id)
+        botstats = await queries.bot_uptime(self.bot.user.id)
         unix_timestamp = time.time()
         current_uptime = unix_timestamp - self.bot.statustime
         uptime = current_uptime + botstats["runtime"]
@@ -6,6 +6,7 @@ from collections import defaultdict
 from datetime import datetime
 from discord.ext import commands, tasks
 
+from settings import guilds, queries
 from utilities import utils
 from utilities import checks
 from utilities import humantime
@@ -40,27 +41,14 @@ class Logging(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.entities = defaultdict(list)
         self.log_data = defaultdict(dict)
-        self.settings = defaultdict(dict)
         self.tasks = defaultdict(list)
         self.webhooks = defaultdict(discord.Webhook)
 
-        bot.loop.create_task(self.load_settings())
         bot.loop.create_task(self.load_log_data())
 
-        self.log_types = [
-            "channels",
-            "emojis",
-            "invites",
-            "joins",
-            "messages",
-            "moderation",
-            "users",
-            "roles",
-            "server",
-            "voice",
-        ]  # Helper list with all our logging types.
+        # Helper list with all our logging types.
+        self.log_types = list(guilds.LOG_EVENTS)
 
         # self.dispatch_webhooks.add_exception_type(discord.NotFound)
         self.dispatch_webhooks.start()  # Start the task loop
@@ -73,52 +61,34 @@ class Logging(commands.Cog):
     def cog_unload(self):  # Stop the task loop
         self.dispatch_webhooks.stop()
 
-    async def load_settings(self):
-        query = """
-                SELECT 
-                logs.server_id,
-                (SELECT ROW_TO_JSON(_) FROM (SELECT
-                    logs.channels,
-                    logs.emojis,
-                    logs.invites,
-                    logs.joins,
-                    logs.messages,
-                    logs.moderation,
-                    logs.users,
-                    logs.roles,
-                    logs.server,
-                    logs.voice
-                ) AS _) AS settings
-                FROM logs;
-                """
-        records = await self.bot.cxn.fetch(query)
-        if records:
-            for record in records:
-                self.settings[record["server_id"]].update(
-                    json.loads(record["settings"])
-                )
-
     async def load_log_data(self):
-        query = """
-                SELECT 
-                d.server_id, d.entities,
-                (SELECT ROW_TO_JSON(_) FROM (SELECT
-                    d.channel_id,
-                    d.webhook_id,
-                    d.webhook_token
-                ) AS _) AS log_data
-                FROM log_data as d;
-                """
-        records = await self.bot.cxn.fetch(query)
+        records = await queries.load_log_data()
+        self.log_data.clear()
+        self.webhooks.clear()
         if records:
             for record in records:
                 self.log_data[record["server_id"]].update(
                     json.loads(record["log_data"])
                 )
-                self.entities[record["server_id"]].extend(record["entities"])
                 webhook = self.parse_json(json.loads(record["log_data"]))
                 self.webhooks[record["server_id"]] = webhook
 
+    async def load_server_log_data(self, server_id):
+        record = await queries.load_server_log_data(server_id)
+        self.log_data.pop(server_id, None)
+        self.webhooks.pop(server_id, None)
+        if record and record["webhook_id"]:
+            self.log_data[server_id].update(dict(record))
+            self.webhooks[server_id] = self.parse_json(record)
+
+    @commands.Cog.listener()
+    async def on_config_update(self, server_id, section):
+        # Another process changed the settings, a section of None is everything.
+        if section is None:
+            await self.load_log_data()
+        elif section == "log_data":
+            await self.load_server_log_data(server_id)
+
     def parse_json(self, data):
         return self.fetch_webhook(data["webhook_id"], data["webhook_token"])
 
@@ -147,11 +117,12 @@ class Logging(commands.Cog):
             return webhook
 
     def get_settings(self, guild, event=None):
-        settings = self.settings.get(guild.id)
+        events = self.bot.server_settings[guild.id].log_events
+        if events is None:
+            return None  # Logging is disabled.
         if event is None:
-            return settings
-        if settings:
-            return self.settings[guild.id].get(event)
+            return {log_type: log_type in events for log_type in self.log_types}
+        return event in events
 
     def get_log_data(self, guild):
         return self.log_data.get(guild.id)
@@ -164,17 +135,8 @@ class Logging(commands.Cog):
     async def destroy_logging(self, guild):
         async with self.bot.cxn.acquire() as conn:
             async with conn.transaction():
-                query = """
-                        DELETE FROM log_data
-                        WHERE server_id = $1;
-                        """
-                await conn.execute(query, guild.id)
-
-                query = """
-                        DELETE FROM logs
-                        WHERE server_id = $1;
-                        """
-                await conn.execute(query, guild.id)
+                await queries.delete_log_data(guild.id, con=conn)
+                await queries.delete_logs(guild.id, con=conn)
 
         webhook = self.get_webhook(guild)
         if webhook:
@@ -195,7 +157,8 @@ class Logging(commands.Cog):
 
     # Helper function to check if an object is ignored
     def is_ignored(self, guild, objects):
-        return any([obj in self.entities[guild.id] for obj in objects])
+        ignored = self.bot.server_settings[guild.id].log_ignored
+        return any(obj in ignored for obj in objects)
 
     @tasks.loop(seconds=3.0)
     async def dispatch_webhooks(self):
@@ -291,20 +254,15 @@ class Logging(commands.Cog):
                             "All logging events are already enabled."
                         )
 
-                    query = """
-                            DELETE FROM logs
-                            WHERE server_id = $1
-                            """  # Delete what we have if we have it.
-                    await self.bot.cxn.execute(query, ctx.guild.id)
-
-                    query = """
-                            INSERT INTO logs
-                            VALUES ($1)
-                            """  # Reinsert to refresh the log config.
-                    await self.bot.cxn.execute(query, ctx.guild.id)
+                    # Delete what we have if we have it.
+                    await queries.delete_logs(ctx.guild.id)
+                    # Reinsert to refresh the log config.
+                    await queries.insert_logs(ctx.guild.id)
 
                     # Update the logging settings in the cache
-                    self.settings[ctx.guild.id] = {x: True for x in self.log_types}
+                    self.bot.server_settings[ctx.guild.id].log_events = frozenset(
+                        self.log_types
+                    )
                     await ctx.success("All logging events have been enabled.")
                 else:  # They specified an event
                     current = settings.get(event)
@@ -313,15 +271,12 @@ class Logging(commands.Cog):
                             f"Logging event `{event}` is already enabled."
                         )
 
-                    query = f"""
-                            UPDATE logs
-                            SET {event} = $1
-                            WHERE server_id = $2
-                            """  # Update the event column, set it to True.
-                    await self.bot.cxn.execute(query, True, ctx.guild.id)
+                    # Update the event column, set it to True.
+                    await queries.set_log_event[event](True, ctx.guild.id)
 
                     # Update the event in the cache to reflect the db.
-                    self.settings[ctx.guild.id][event] = True
+                    config = self.bot.server_settings[ctx.guild.id]
+                    config.log_events = config.log_events | {event}
                     await ctx.success(f"Logging event `{event}` has been enabled.")
 
     @_log.command(
@@ -343,7 +298,7 @@ class Logging(commands.Cog):
         if c:  # They confirmed they wanted to teardown the logging system
             await self.destroy_logging(ctx.guild)  # Drop from DB and delete webhooks.
             self.log_data[ctx.guild.id].clear()  # Clear data cache
-            self.settings[ctx.guild.id].clear()  # Clear settings cache
+            self.bot.server_settings[ctx.guild.id].log_events = None  # Clear settings cache
             self.webhooks.pop(ctx.guild.id, None)  # Clear cached webhook
             self.tasks.pop(webhook, None)  # Delete any pending embeds/files to be sent.
             await ctx.success("Logging successfully disabled.")
@@ -390,17 +345,10 @@ class Logging(commands.Cog):
         except Exception as e:  # Tell them what went wrong.
             return await msg.edit(content=f"{self.bot.emote_dict['failed']} {str(e)}")
 
-        query = """
-                INSERT INTO logs (server_id)
-                VALUES ($1)
-                """  # Insert server_id into DB
-        await self.bot.cxn.execute(query, ctx.guild.id)
-
-        query = """
-                INSERT INTO log_data (server_id, channel_id, webhook_id, webhook_token)
-                VALUES ($1, $2, $3, $4)
-                """  # Insert logging data.
-        await self.bot.cxn.execute(query, ctx.guild.id, channel.id, wh.id, wh.token)
+        # Insert server_id into DB
+        await queries.insert_logs(ctx.guild.id)
+        # Insert logging data.
+        await queries.insert_log_data(ctx.guild.id, channel.id, wh.id, wh.token)
 
         # Update log_data so it matches the data in the DB
         self.log_data[ctx.guild.id] = {
@@ -409,7 +357,7 @@ class Logging(commands.Cog):
             "webhook_token": wh.token,
         }
         # Update the settings to reflect the default logging config.
-        self.settings[ctx.guild.id] = {log_type: True for log_type in self.log_types}
+        self.bot.server_settings[ctx.guild.id].log_events = frozenset(self.log_types)
         # Set the server logging webhook to the webhook we just created.
         self.webhooks[ctx.guild.id] = wh
 
@@ -446,21 +394,13 @@ class Logging(commands.Cog):
             if current is True:  # Already have all events disabled.
                 return await ctx.success("All logging events are already disabled.")
 
-            query = """
-                    DELETE FROM logs
-                    WHERE server_id = $1
-                    """  # Delete what we have in the DB
-            await self.bot.cxn.execute(query, ctx.guild.id)
-
-            args = [False] * 10
-            query = """
-                    INSERT INTO logs
-                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
-                    """  # Insert false for all events
-            await self.bot.cxn.execute(query, ctx.guild.id, *args)
+            # Delete what we have in the DB
+            await queries.delete_logs(ctx.guild.id)
+            # Insert false for all events
+            await queries.insert_disabled_logs(ctx.guild.id)
 
             # Update all the cached event settings to false
-            self.settings[ctx.guild.id] = {x: False for x in self.log_types}
+            self.bot.server_settings[ctx.guild.id].log_events = frozenset()
             await ctx.success("All logging events have been disabled.")
         else:  # They specified an event.
             current = settings.get(event)
@@ -469,15 +409,12 @@ class Logging(commands.Cog):
                     f"Logging event `{event}` is already disabled."
                 )
 
-            query = f"""
-                    UPDATE logs
-                    SET {event} = $1
-                    WHERE server_id = $2
-                    """  # Update the setting to false for this event.
-            await self.bot.cxn.execute(query, False, ctx.guild.id)
+            # Update the setting to false for this event.
+            await queries.set_log_event[event](False, ctx.guild.id)
 
             # Update the cache to match the DB
-            self.settings[ctx.guild.id][event] = False
+            config = self.bot.server_settings[ctx.guild.id]
+            config.log_events = config.log_events - {event}
             await ctx.success(f"Logging event `{event}` has been disabled.")
 
     ###################
@@ -532,10 +469,9 @@ class Logging(commands.Cog):
         webhook = self.get_webhook(guild)
         if webhook:
             await self.destroy_logging(guild)  # Drop from DB and delete webhooks.
-            self.log_data[guild.id].clear()  # Clear data cache
-            self.settings[guild.id].clear()  # Clear settings cache
-            self.webhooks.pop(guild.id, None)  # Clear cached webhook
             self.tasks.pop(webhook, None)  # Delete any pending embeds/files to be sent.
+        self.log_data.pop(guild.id, None)  # Clear data cache
+        self.webhooks.pop(guild.id, None)  # Clear cached webhook
 
     @commands.Cog.listener()
     @decorators.wait_until_ready()
@@ -3037,24 +2973,9 @@ class Logging(commands.Cog):
             Will fetch a messages sent by a specific user if specified
         """
         if member is None:
-            query = """
-                    SELECT author_id, message_id, content, timestamp
-                    FROM messages
-                    WHERE channel_id = $1
-                    AND deleted = True
-                    ORDER BY unix DESC;
-                    """
-            result = await self.bot.cxn.fetchrow(query, ctx.channel.id)
+            result = await queries.snipe(ctx.channel.id)
         else:
-            query = """
-                    SELECT author_id, message_id, content, timestamp
-                    FROM messages
-                    WHERE channel_id = $1
-                    AND author_id = $2
-                    AND deleted = True
-                    ORDER BY unix DESC;
-                    """
-            result = await self.bot.cxn.fetchrow(query, ctx.channel.id, member.id)
+            result = await queries.snipe_user(ctx.channel.id, member.id)
 
         if not result:
             return await ctx.fail(f"There is nothing to snipe.")
@@ -3105,24 +3026,9 @@ class Logging(commands.Cog):
             Will fetch a messages sent by a specific user if specified
         """
         if member is None:
-            query = """
-                    SELECT author_id, message_id, content, timestamp
-                    FROM messages
-                    WHERE channel_id = $1
-                    AND edited = True
-                    ORDER BY unix DESC;
-                    """
-            result = await self.bot.cxn.fetchrow(query, ctx.channel.id)
+            result = await queries.editsnipe(ctx.channel.id)
         else:
-            query = """
-                    SELECT author_id, message_id, content, timestamp
-                    FROM messages
-                    WHERE channel_id = $1
-                    AND author_id = $2
-                    AND edited = True
-                    ORDER BY unix DESC;
-                    """
-            result = await self.bot.cxn.fetchrow(query, ctx.channel.id, member.id)
+            result = await queries.editsnipe_user(ctx.channel.id, member.id)
 
         if not result:
             return await ctx.fail("There are no edits to snipe.")
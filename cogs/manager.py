@@ -17,6 +17,7 @@ import subprocess
 
 from discord.ext import commands, menus
 
+from settings import cleanup, pools, queries
 from utilities import utils
 from utilities import checks
 from utilities import converters
@@ -91,10 +92,165 @@ class Manager(commands.Cog):
             Get the number of successful
             batch inserts the bot has
             performed since last reboot.
+        Notes:
+            Also shows the depth, swap latency,
+            lock wait time, spooled backlog,
+            p50/p99 flush latency, rows per flush
+            and overflowed records of every batch buffer
+            along with the avatar upload counters
+            and how edited message authors were found.
         """
         await ctx.bold(
             f"{self.bot.emote_dict['db']} {self.bot.user} ({self.bot.user.id}) Batch Inserts: {self.bot.batch_inserts}"
         )
+        batch = self.bot.get_cog("Batch")
+        if not batch:
+            return
+
+        table = formatting.TabularData()
+        table.set_columns(
+            [
+                "buffer",
+                "depth",
+                "peak",
+                "swaps",
+                "rows",
+                "swap avg",
+                "lock wait",
+                "backlog",
+                "p50",
+                "p99",
+                "rows/flush",
+                "dropped",
+                "spilled",
+            ]
+        )
+        for buffer in batch.buffers:
+            stats = buffer.stats
+            table.add_row(
+                [
+                    buffer.name,
+                    len(buffer),
+                    stats.peak_depth,
+                    stats.swaps,
+                    stats.rows,
+                    f"{stats.swap_avg * 1e6:.1f}µs",
+                    f"{stats.lock_wait * 1000:.2f}ms",
+                    buffer.backlog,
+                    f"{stats.p50 * 1000:.2f}ms",
+                    f"{stats.p99 * 1000:.2f}ms",
+                    f"{stats.rows_per_flush:.1f}",
+                    stats.dropped,
+                    stats.spilled,
+                ]
+            )
+        uploads = batch.avatars.stats
+        edits = ", ".join(f"{path} {count}" for path, count in batch.edit_paths.items())
+        await ctx.send_or_reply(
+            f"```sml\n{table.render()}\n"
+            f"Avatars: {uploads.files} files in {uploads.uploads} uploads "
+            f"({uploads.bytes / 1024 / 1024:.2f} MB), "
+            f"{uploads.dedupe_hits} dedupe hits, {uploads.splits} splits, "
+            f"{uploads.failures} failed, {uploads.dropped} dropped\n"
+            f"Edit authors: {edits or 'none yet'}\n```"
+        )
+
+    @decorators.command(
+        aliases=["queries"],
+        brief="Show query latency stats.",
+        examples="""
+                {0}querystats
+                {0}queries
+                """,
+    )
+    async def querystats(self, ctx):
+        """
+        Usage: {0}querystats
+        Alias: {0}queries
+        Output:
+            Get the calls, errors and average,
+            p50 and p99 latency of every named
+            query since last reboot.
+        """
+        table = formatting.TabularData()
+        table.set_columns(["query", "calls", "errors", "avg", "p50", "p99"])
+        ran = sorted(
+            (query for query in queries.QUERIES.values() if query.stats.calls),
+            key=lambda query: query.stats.calls,
+            reverse=True,
+        )
+        if not ran:
+            return await ctx.fail("No queries have run yet.")
+        for query in ran:
+            stats = query.stats
+            table.add_row(
+                [
+                    query.name,
+                    stats.calls,
+                    stats.errors,
+                    f"{stats.average * 1000:.2f}ms",
+                    f"{stats.percentile(0.5) * 1000:.0f}ms",
+                    f"{stats.percentile(0.99) * 1000:.0f}ms",
+                ]
+            )
+        await ctx.send_or_reply(f"```sml\n{table.render()}\n```")
+
+    @decorators.command(
+        aliases=["poolstats"],
+        brief="Show connection pool stats.",
+        examples="""
+                {0}pools
+                {0}poolstats
+                """,
+    )
+    async def pools(self, ctx):
+        """
+        Usage: {0}pools
+        Alias: {0}poolstats
+        Output:
+            Get the saturation of the ingest,
+            interactive and analytics pools.
+        Notes:
+            Shows connections in use, peak use,
+            waiters, checkouts that found the pool
+            full and the p50/p99 of the wait for
+            a connection and of how long it is held.
+        """
+        table = formatting.TabularData()
+        table.set_columns(
+            [
+                "pool",
+                "in use",
+                "peak",
+                "waiting",
+                "saturated",
+                "checkouts",
+                "wait p50",
+                "wait p99",
+                "hold p50",
+                "hold p99",
+                "timeout",
+                "replica",
+            ]
+        )
+        for pool in pools.POOLS.values():
+            table.add_row(
+                [
+                    pool.name,
+                    f"{pool.in_use}/{pool.max_size}",
+                    pool.peak,
+                    pool.waiting,
+                    pool.saturated,
+                    pool.wait.calls,
+                    f"{pool.wait.percentile(0.5) * 1000:.0f}ms",
+                    f"{pool.wait.percentile(0.99) * 1000:.0f}ms",
+                    f"{pool.hold.percentile(0.5) * 1000:.0f}ms",
+                    f"{pool.hold.percentile(0.99) * 1000:.0f}ms",
+                    f"{pool.statement_timeout}s" if pool.statement_timeout else "none",
+                    pool.replica,
+                ]
+            )
+        await ctx.send_or_reply(f"```sml\n{table.render()}\n```")
 
     @decorators.command(
         brief="Reload the bot variables.",
@@ -429,14 +585,7 @@ class Manager(commands.Cog):
         message = msg.id
         channel = msg.channel.id
 
-        query = """
-                UPDATE config SET
-                reboot_invoker = $2,
-                reboot_message_id = $3,
-                reboot_channel_id = $4
-                WHERE client_id = $1
-                """
-        await self.bot.cxn.execute(query, client_id, invoker, message, channel)
+        await queries.set_reboot_info(client_id, invoker, message, channel)
         self.bot.loop.stop()
         self.bot.loop.close()
         await self.bot.close()
@@ -751,10 +900,17 @@ class Manager(commands.Cog):
         Alias: {0}json config
         Output:
             Stars a pagination session
-            showing all server settings.
+            showing the server settings
+            a restore from disk would load.
         """
-        sh = self.bot.get_command("sh")
-        await ctx.invoke(sh, prefix="json", command="cat ./data/json/settings.json")
+        backup = self.bot.settings_backup
+        async with ctx.typing():
+            _, text = await backup.run(backup.dump)
+        pages = pagination.MainMenu(pagination.TextPageSource(text, prefix="```json"))
+        try:
+            await pages.start(ctx)
+        except menus.MenuError as e:
+            await ctx.send_or_reply(str(e))
 
     @decorators.command(
         aliases=["updatedb"],
@@ -790,20 +946,59 @@ class Manager(commands.Cog):
         Alias: {0}drop
         Permission: Bot owner
         Output:
-            Runs a cleanup function that
-            removes all data on the server.
+            Queues the removal of all
+            data on the server.
+        Notes:
+            The rows are deleted in the
+            background a chunk at a time.
         """
         if server is None:
             server = ctx.guild
         c = await ctx.confirm("This action will purge all this server's data.")
         if c:
-            msg = await ctx.load("Recursively discarding all server data...")
-            from settings.cleanup import destroy_server
+            await cleanup.enqueue_teardown(server.id)
+            await ctx.send_or_reply(
+                content=f"**{self.bot.emote_dict['delete']} Queued all server data to be discarded.**"
+            )
 
-            await destroy_server(server.id)
-            await msg.edit(
-                content=f"**{self.bot.emote_dict['delete']} Successfully discarded all server data.**"
+    @decorators.command(
+        aliases=["purgeorphans"],
+        brief="Purge data of servers the bot left.",
+        examples="""
+                {0}orphans
+                {0}purgeorphans
+                """,
+    )
+    async def orphans(self, ctx):
+        """
+        Usage: {0}orphans
+        Alias: {0}purgeorphans
+        Permission: Bot owner
+        Output:
+            Starts a background purge of the data
+            of every server the bot is no longer in,
+            or shows the progress of the running one.
+        """
+        progress = cleanup.progress
+        if not progress.running:
+            c = await ctx.confirm(
+                "This action will purge the data of every server I am not in."
             )
+            if not c:
+                return
+            self.bot.loop.create_task(cleanup.purge_orphans(self.bot))
+            await asyncio.sleep(0)  # Let the purge start
+            progress = cleanup.progress
+        await ctx.send_or_reply(
+            f"```prolog\n"
+            f"Running    : {progress.running}\n"
+            f"Table      : {progress.table or 'none'}\n"
+            f"Tables     : {progress.tables}/{len(cleanup.GUILD_TABLES)}\n"
+            f"Servers    : {progress.servers}\n"
+            f"Rows       : {progress.rows:,}\n"
+            f"Elapsed    : {progress.elapsed:.1f}s\n"
+            f"Throughput : {progress.throughput:.0f} rows/s\n```"
+        )
 
     # Thank you R. Danny
     @decorators.command(
@@ -818,6 +1013,10 @@ class Manager(commands.Cog):
         Output:
             Shows results in rst format.
             Sends traceback if query failed.
+        Notes:
+            Runs on its own connection to the primary,
+            in a transaction without a statement timeout,
+            so it never holds a pooled connection.
         """
 
         if query is None:
@@ -828,16 +1027,22 @@ class Manager(commands.Cog):
         query = utils.cleanup_code(query)
 
         is_multistatement = query.count(";") > 1
-        if is_multistatement:
-            # fetch does not support multiple statements
-            strategy = self.bot.cxn.execute
-        else:
-            strategy = self.bot.cxn.fetch
 
         try:
-            start = time.perf_counter()
-            results = await strategy(query)
-            dt = (time.perf_counter() - start) * 1000.0
+            con = await asyncpg.connect(self.bot.constants.postgres)
+            try:
+                if is_multistatement:
+                    # fetch does not support multiple statements
+                    strategy = con.execute
+                else:
+                    strategy = con.fetch
+                start = time.perf_counter()
+                async with con.transaction():
+                    await con.execute("SET LOCAL statement_timeout = 0")
+                    results = await strategy(query)
+                dt = (time.perf_counter() - start) * 1000.0
+            finally:
+                await con.close()
         except Exception:
             return await ctx.send_or_reply(
                 content=f"```py\n{traceback.format_exc()}\n```",
@@ -1407,12 +1612,7 @@ class Manager(commands.Cog):
             return await ctx.send_help(str(ctx.command))
 
         # I never remember to keep track of bot versions...
-        query = """
-                UPDATE config
-                SET version = version + 0.1
-                WHERE client_id = $1;
-                """
-        await self.bot.cxn.execute(query, self.bot.user.id)
+        await queries.bump_version(self.bot.user.id)
 
         if subcommand == "give":
             subcommand = "add . && git commit -m 'update' && git push"
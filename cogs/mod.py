@@ -11,6 +11,7 @@ from collections import Counter
 from discord.ext import commands
 from discord.ext.commands.core import check
 
+from settings import queries
 from utilities import utils
 from utilities import checks
 from utilities import helpers
@@ -1102,13 +1103,7 @@ class Mod(commands.Cog):
                 f"I need to be able to send messages in {channel.mention}"
             )
 
-        query = """
-                select (id)
-                from tasks
-                where event = 'lockdown'
-                and extra->'kwargs'->>'channel_id' = $1;
-                """
-        s = await self.bot.cxn.fetchval(query, str(channel.id))
+        s = await queries.lockdown_timer_id(str(channel.id))
         if s:
             raise commands.BadArgument(f"Channel {channel.mention} is already locked.")
 
@@ -1187,13 +1182,7 @@ class Mod(commands.Cog):
                 f"I need to be able to send messages in {channel.mention}"
             )
 
-        query = """
-                select (id, extra)
-                from tasks
-                where event = 'lockdown'
-                and extra->'kwargs'->>'channel_id' = $1;
-                """
-        s = await self.bot.cxn.fetchval(query, str(channel.id))
+        s = await queries.lockdown_timer(str(channel.id))
         if not s:
             return await ctx.fail(f"Channel {channel.mention} is already unlocked.")
 
@@ -1203,11 +1192,7 @@ class Mod(commands.Cog):
         perms = args_and_kwargs["kwargs"]["perms"]
         reason = "Channel unlocked by command execution"
 
-        query = """
-                DELETE FROM tasks
-                WHERE id = $1
-                """
-        await self.bot.cxn.execute(query, task_id)
+        await queries.delete_timer(task_id)
 
         overwrites = channel.overwrites_for(ctx.guild.default_role)
         overwrites.send_messages = perms
@@ -1430,12 +1415,7 @@ class Mod(commands.Cog):
             return await ctx.usage()
 
         await ctx.trigger_typing()
-        query = """
-                SELECT (muterole)
-                FROM servers
-                WHERE server_id = $1;
-                """
-        muterole = await self.bot.cxn.fetchval(query, ctx.guild.id)
+        muterole = await queries.server_muterole(ctx.guild.id)
         muterole = ctx.guild.get_role(muterole)
         if not muterole:
             raise commands.BadArgument(
@@ -1461,13 +1441,7 @@ class Mod(commands.Cog):
             if res:
                 failed.append((str(user), res))
                 continue
-            query = """
-                    select (id)
-                    from tasks
-                    where event = 'mute'
-                    and extra->'kwargs'->>'user_id' = $1;
-                    """
-            s = await self.bot.cxn.fetchval(query, str(user.id))
+            s = await queries.mute_timer_id(str(user.id))
             if s:
                 failed.append((str(user), "User is already muted."))
                 continue
@@ -1555,13 +1529,7 @@ class Mod(commands.Cog):
                 failed.append((str(user), res))
                 continue
 
-            query = """
-                    select (id, extra)
-                    from tasks
-                    where event = 'mute'
-                    and extra->'kwargs'->>'user_id' = $1;
-                    """
-            s = await self.bot.cxn.fetchval(query, str(user.id))
+            s = await queries.mute_timer(str(user.id))
             if not s:
                 return await ctx.fail(f"User `{user}` is not muted.")
             await ctx.trigger_typing()
@@ -1574,11 +1542,7 @@ class Mod(commands.Cog):
                     roles=[ctx.guild.get_role(x) for x in roles],
                     reason=await converters.ActionReason().convert(ctx, reason),
                 )
-                query = """
-                        DELETE FROM tasks
-                        WHERE id = $1
-                        """
-                await self.bot.cxn.execute(query, task_id)
+                await queries.delete_timer(task_id)
                 unmuted.append(str(user))
             except Exception as e:
                 failed.append((str(user), e))
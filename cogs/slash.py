@@ -16,7 +16,7 @@ class Slash(commands.Cog):
         description="Show my server prefix.", guild_ids=[x.id for x in bot.guilds]
     )
     async def prefix(self, ctx: SlashContext):
-        current_prefixes = self.bot.server_settings[ctx.guild.id]["prefixes"].copy()
+        current_prefixes = list(self.bot.server_settings[ctx.guild.id].prefixes or ())
         try:
             current_prefixes.remove(f"<@!{self.bot.user.id}>")
         except ValueError:
@@ -5,6 +5,7 @@ from collections import Counter
 from discord.abc import User
 from discord.ext import commands, menus
 
+from settings import queries
 from utilities import utils
 from utilities import checks
 from utilities import converters
@@ -26,25 +27,11 @@ class Stats(commands.Cog):
 
     async def get_user_cmds(self, member):
         """Helper function to get member command count"""
-        query = """
-                SELECT COUNT(*)
-                FROM commands
-                WHERE author_id = $1
-                AND server_id = $2;
-                """
-        cmd_count = await self.bot.cxn.fetchval(query, member.id, member.guild.id)
-        return cmd_count or 0
+        return await queries.user_command_count(member.id, member.guild.id)
 
     async def get_user_msgs(self, member):
         """Helper function to get member message count"""
-        query = """
-                SELECT COUNT(*)
-                FROM messages
-                WHERE author_id = $1
-                AND server_id = $2;
-                """
-        msg_count = await self.bot.cxn.fetchval(query, member.id, member.guild.id)
-        return msg_count or 0
+        return await queries.user_message_count(member.id, member.guild.id)
 
     @decorators.command(
         aliases=["flags"],
@@ -534,15 +521,8 @@ class Stats(commands.Cog):
                 content=f"{self.bot.emote_dict['loading']} **Collecting Emoji Statistics...**",
             )
             if user is None:
-                query = """
-                        SELECT (emoji_id, total)
-                        FROM emojistats
-                        WHERE server_id = $1
-                        ORDER BY total DESC;
-                        """
-
                 emoji_list = []
-                result = await self.bot.cxn.fetch(query, ctx.guild.id)
+                result = await queries.server_emoji_usage(ctx.guild.id)
                 for x in result:
                     try:
                         emoji = self.bot.get_emoji(int(x[0][0]))
@@ -567,16 +547,8 @@ class Stats(commands.Cog):
             else:
                 if user.bot:
                     return await ctx.fail(f"I do not track bots.")
-                query = """
-                        SELECT (content)
-                        FROM messages
-                        WHERE content ~ '<a?:.+?:([0-9]{15,21})>'
-                        AND author_id = $1
-                        AND server_id = $2
-                        """
-
                 emoji_list = []
-                result = await self.bot.cxn.fetch(query, user.id, ctx.guild.id)
+                result = await queries.user_emoji_messages(user.id, ctx.guild.id)
                 if not result:
                     return await ctx.fail(
                         f"`{user}` has no recorded emoji usage stats."
@@ -636,14 +608,7 @@ class Stats(commands.Cog):
         """
         msg = await ctx.load("Collecting Emoji Statistics")
         await ctx.trigger_typing()
-        query = f"""
-                SELECT author_id, string_agg(content, '') as content
-                FROM messages
-                WHERE content ~ '<a?:.+?:{emoji.id}>'
-                GROUP BY author_id;
-                """
-
-        emoji_usage = await self.bot.cxn.fetch(query)
+        emoji_usage = await queries.emoji_usage(str(emoji.id))
         matches = {
             record["author_id"]: len(
                 re.compile(f"<a?:.+?:{emoji.id}>").findall(record["content"])
@@ -9,6 +9,7 @@ import datetime
 
 from discord.ext import commands
 
+from settings import queries
 from utilities import humantime
 
 
@@ -110,8 +111,7 @@ class Tasks(commands.Cog):
 
     async def call_timer(self, timer):
         # delete the timer
-        query = "DELETE FROM tasks WHERE id=$1;"
-        await self.bot.cxn.execute(query, timer.id)
+        await queries.delete_timer(timer.id)
 
         # dispatch the event
         event_name = f"{timer.event}_timer_complete"
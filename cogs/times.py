@@ -13,6 +13,7 @@ from discord.ext import commands
 from discord.ext import menus
 from geopy import geocoders
 
+from settings import queries
 from utilities import utils
 from utilities import checks
 from utilities import humantime
@@ -67,9 +68,7 @@ class Times(commands.Cog):
             Will not inform you if you did
             not previously set your timezone.
         """
-        await self.bot.cxn.execute(
-            "DELETE FROM usertime WHERE user_id = $1;", ctx.author.id
-        )
+        await queries.delete_timezone(ctx.author.id)
         await ctx.send_or_reply(
             f"{self.bot.emote_dict['success']} Your timezone has been removed."
         )
@@ -164,14 +163,7 @@ class Times(commands.Cog):
                 edit = False
                 selection = tz_list[0]["result"]
 
-            query = """
-                    INSERT INTO usertime
-                    VALUES ($1, $2)
-                    ON CONFLICT (user_id)
-                    DO UPDATE SET timezone = $2
-                    WHERE usertime.user_id = $1;
-                    """
-            await self.bot.cxn.execute(query, ctx.author.id, selection)
+            await queries.set_timezone(ctx.author.id, selection)
             msg = f"{self.bot.emote_dict['success']} Timezone set to `{selection}`"
             if edit:
                 await message.edit(content=msg, embed=None)
@@ -198,14 +190,10 @@ class Times(commands.Cog):
             Shows the current time for all
             users who set their timezone
         """
-        query = """
-                SELECT *
-                FROM usertime;
-                """
         message = await ctx.send_or_reply(
             content=f"{self.bot.emote_dict['loading']} **Loading user timezones...**",
         )
-        result = await self.bot.cxn.fetch(query)
+        result = await queries.user_timezones()
         users = []
         for x in result:
             member = ctx.guild.get_member(x[0])
@@ -279,12 +267,7 @@ class Times(commands.Cog):
         if user is None:
             user = ctx.author
 
-        query = """
-                SELECT timezone
-                FROM usertime
-                WHERE user_id = $1;
-                """
-        timezone = await self.bot.cxn.fetchval(query, user.id) or None
+        timezone = await queries.user_timezone(user.id) or None
         if timezone is None:
             return await ctx.send_or_reply(
                 content=f"{self.bot.emote_dict['warn']} `{user}` has not set their timezone. "
@@ -327,12 +310,7 @@ class Times(commands.Cog):
         if member is None:
             member = ctx.author
 
-        query = """
-                SELECT timezone
-                FROM usertime
-                WHERE user_id = $1;
-                """
-        tz = await self.bot.cxn.fetchval(query, member.id) or None
+        tz = await queries.user_timezone(member.id) or None
         if tz is None:
             msg = (
                 f"{self.bot.emote_dict['warn']} "
@@ -527,17 +505,7 @@ class Times(commands.Cog):
         else:
             actual_time = 604800  # 1 week
             the_datetime = datetime.utcfromtimestamp(t.time() - actual_time)
-        query = """
-                SELECT DISTINCT (
-                    SELECT EXTRACT(
-                        DAY FROM (
-                            TO_TIMESTAMP(unix)
-                        )
-                    ) WHERE author_id = $1
-                    AND unix > ((SELECT EXTRACT(EPOCH FROM NOW()) - $2))
-                ) FROM messages;
-                """
-        row = await self.bot.cxn.fetch(query, user.id, (actual_time - 86400))
+        row = await queries.active_days(user.id, (actual_time - 86400))
         results = len([x[0] for x in row if x[0] is not None])
         emote = self.bot.emote_dict["graph"]
         pluralize = "" if results == 1 else "s"
@@ -577,13 +545,7 @@ class Times(commands.Cog):
         else:
             actual_time = 604800  # 1 week
             the_datetime = datetime.utcfromtimestamp(t.time() - actual_time)
-        query = """
-                SELECT DISTINCT author_id, (SELECT EXTRACT(DAY FROM (TO_TIMESTAMP(unix))))
-                FROM messages
-                WHERE server_id = $1
-                AND unix > (SELECT EXTRACT(EPOCH FROM NOW()) - $2);
-                """
-        rows = await self.bot.cxn.fetch(query, ctx.guild.id, (actual_time - 86400))
+        rows = await queries.active_users(ctx.guild.id, (actual_time - 86400))
         counter = collections.Counter([row[0] for row in rows])
         fmt = [
             (str(ctx.guild.get_member(x[0])), x[1])
@@ -5,10 +5,11 @@ import discord
 import inspect
 
 from collections import Counter
-from datetime import datetime
+from datetime import datetime, timedelta
 from discord.ext import commands, menus
-from PIL import Image, ImageDraw, ImageFont, UnidentifiedImageError
+from PIL import Image, ImageDraw, ImageFont
 
+from settings import queries
 from utilities import utils
 from utilities import checks
 from utilities import images
@@ -57,14 +58,8 @@ class Tracking(commands.Cog):
         """
         if user is None:
             user = ctx.author
-        query = """
-                SELECT (inviter)
-                FROM invites
-                WHERE invitee = $1
-                AND server_id = $2;
-                """
         await ctx.trigger_typing()
-        inviter_id = await self.bot.cxn.fetchval(query, user.id, ctx.guild.id)
+        inviter_id = await queries.inviter(user.id, ctx.guild.id)
         if not inviter_id:
             return await ctx.fail(f"I cannot trace who invited `{user}`")
         inviter = await self.bot.get_or_fetch_member(ctx.guild, inviter_id)
@@ -94,14 +89,8 @@ class Tracking(commands.Cog):
         """
         if user is None:
             user = ctx.author
-        query = """
-                SELECT COUNT(*)
-                FROM invites
-                WHERE inviter = $1
-                AND server_id = $2;
-                """
         await ctx.trigger_typing()
-        count = await self.bot.cxn.fetchval(query, user.id, ctx.guild.id)
+        count = await queries.invite_count(user.id, ctx.guild.id)
         if not count or count == 0:
             return await ctx.fail(f"User `{user}` has invited zero new users.")
         await ctx.success(
@@ -285,27 +274,11 @@ class Tracking(commands.Cog):
         if ctx.guild and isinstance(user, discord.Member):
             if last_observed["server_last_spoke"]:
                 msg += f"Spoke here    : {last_observed['server_last_spoke']} ago\n"
-            query = """
-                    SELECT COUNT(*)
-                    FROM commands
-                    WHERE author_id = $1
-                    AND server_id = $2;
-                    """
-            command_count = await self.bot.cxn.fetchval(query, user.id, ctx.guild.id)
-            if not command_count:
-                command_count = 0
+            command_count = await queries.user_command_count(user.id, ctx.guild.id)
 
             msg += f"Commands Run  : {command_count}\n"
 
-            query = """
-                    SELECT COUNT(*)
-                    FROM messages
-                    WHERE author_id = $1
-                    AND server_id = $2;
-                    """
-            message_count = await self.bot.cxn.fetchval(query, user.id, ctx.guild.id)
-            if not message_count:
-                message_count = 0
+            message_count = await queries.user_message_count(user.id, ctx.guild.id)
 
             msg += f"Messages Sent : {message_count}\n"
 
@@ -419,15 +392,13 @@ class Tracking(commands.Cog):
             Will default to yourself if no user is passed.
         """
         user = ctx.author if member is None else member
-        query = """SELECT COUNT(*) as c FROM messages WHERE author_id = $1 AND server_id = $2"""
-        a = await self.bot.cxn.fetchrow(query, user.id, ctx.guild.id) or None
-        if a is None:
+        a = await queries.user_message_count(user.id, ctx.guild.id)
+        if not a:
             # await self.fix_member(ctx.author)
             return await ctx.send_or_reply(
                 content="`{}` has sent **0** messages.".format(user),
             )
         else:
-            a = int(a[0])
             await ctx.send_or_reply(
                 content=f"`{user}` has sent **{a}** message{'' if a == 1 else 's'}",
             )
@@ -464,19 +435,8 @@ class Tracking(commands.Cog):
         if not limit.isdigit():
             raise commands.BadArgument("The `limit` argument must be an integer.")
         limit = int(limit)
-        query = """
-                SELECT author_id,
-                count(author_id)
-                FROM messages
-                WHERE server_id = $1
-                GROUP BY author_id
-                ORDER BY COUNT(author_id)
-                DESC LIMIT $2
-                """
-        a = await self.bot.cxn.fetch(query, ctx.guild.id, limit)
-        sum_query = """SELECT COUNT(*) FROM messages WHERE server_id = $1"""
-        b = await self.bot.cxn.fetchrow(sum_query, ctx.guild.id)
-        b = b[0]
+        a = await queries.top_messagers(ctx.guild.id, limit)
+        b = await queries.server_message_count(ctx.guild.id)
         p = pagination.SimplePages(
             entries=[f"<@!{row[0]}>. [ Messages: {row[1]} ]" for row in a], per_page=20
         )
@@ -636,45 +596,21 @@ class Tracking(commands.Cog):
             raise commands.DisabledCommand()
 
         msg = await ctx.load(f"Collecting {user}'s Avatars...")
-        avatars = await batch.get_avs(user)
+        avatars = await batch.get_avatar_thumbnails(user)
         if not avatars:
             # Tack on their current avatar
-            avatars.append([str(user.avatar_url_as(format="png", size=256))])
+            res = await user.avatar_url_as(format="png", size=256).read()
+            avatars.append(
+                await self.bot.loop.run_in_executor(
+                    None, batch.avatar_store.put, res
+                )
+            )
 
         em = discord.Embed(color=self.bot.constants.embed)
         em.title = f"Recorded Avatars for {user}"
-        iteration = 0
-        parent = Image.new("RGBA", (1024, 1024), (0, 0, 0, 0))
-        for av in avatars:
-            if iteration < 4:
-                val = 0
-                x = iteration
-            elif iteration >= 4 and iteration < 8:
-                val = 1
-                x = iteration - 4
-            elif iteration >= 8 and iteration < 12:
-                val = 2
-                x = iteration - 8
-            elif iteration >= 12 and iteration < 16:
-                val = 3
-                x = iteration - 12
-            else:
-                break
-
-            res = await self.bot.get(str(av), res_method="read")
-            av_bytes = io.BytesIO(res)
-            av_bytes.seek(0)
-            try:
-                im = Image.open(av_bytes)
-            except UnidentifiedImageError:
-                continue
-            im = im.resize((256, 256))
-            parent.paste(im, (x * 256, 256 * val))
-            iteration += 1
-
-        buffer = io.BytesIO()
-        parent.save(buffer, "png")  # 'save' function for PIL
-        buffer.seek(0)
+        buffer = await self.bot.loop.run_in_executor(
+            None, batch.avatar_store.collage, avatars
+        )
         dfile = discord.File(fp=buffer, filename="avatars.png")
         em.set_image(url="attachment://avatars.png")
         await msg.delete()
@@ -772,24 +708,15 @@ class Tracking(commands.Cog):
             should be included (100 by default).
         """
         if user is None:
-            query = """
-                    SELECT command
-                    FROM commands
-                    WHERE server_id = $1;
-                    """
-            command_list = await self.bot.cxn.fetch(query, ctx.guild.id)
+            command_list = await queries.server_command_usage(ctx.guild.id)
         # if not limit.isdigit():
         #     raise commands.BadArgument("The `limit` argument must be an integer.")
         else:
             if user.bot:
                 return await ctx.fail(f"I do not track bots.")
-            query = """SELECT command FROM commands WHERE server_id = $1 AND author_id = $2"""
-            command_list = await self.bot.cxn.fetch(query, ctx.guild.id, user.id)
-        formatted_list = []
-        for c in command_list:
-            formatted_list.append(c[0])
+            command_list = await queries.user_command_usage(ctx.guild.id, user.id)
 
-        counter = Counter(formatted_list)
+        counter = Counter(dict(command_list))
         try:
             width = len(max(counter, key=len))
         except ValueError:
@@ -851,27 +778,16 @@ class Tracking(commands.Cog):
             will show total server commands.
         """
         if user is None:
-            query = """
-                    SELECT COUNT(*) as c
-                    FROM commands
-                    WHERE server_id = $1;
-                    """
-            command_count = await self.bot.cxn.fetchrow(query, ctx.guild.id)
+            command_count = await queries.server_command_count(ctx.guild.id)
             return await ctx.send_or_reply(
-                f"{self.bot.emote_dict['graph']} A total of **{command_count[0]:,}** command{' has' if int(command_count[0]) == 1 else 's have'} been executed on this server.",
+                f"{self.bot.emote_dict['graph']} A total of **{command_count:,}** command{' has' if command_count == 1 else 's have'} been executed on this server.",
             )
         else:
             if user.bot:
                 return await ctx.fail("I do not track bots.")
-            query = """
-                    SELECT COUNT(*) as c
-                    FROM commands
-                    WHERE author_id = $1
-                    AND server_id = $2;
-                    """
-            command_count = await self.bot.cxn.fetchrow(query, user.id, ctx.guild.id)
+            command_count = await queries.user_command_count(user.id, ctx.guild.id)
             return await ctx.send_or_reply(
-                f"{self.bot.emote_dict['graph']} User `{user}` has executed **{int(command_count[0]):,}** commands.",
+                f"{self.bot.emote_dict['graph']} User `{user}` has executed **{command_count:,}** commands.",
             )
 
     @decorators.command(
@@ -899,14 +815,9 @@ class Tracking(commands.Cog):
         time_dict = {"day": 86400, "week": 604800, "month": 2592000, "year": 31556952}
         if unit not in time_dict:
             unit = "month"
-        query = """
-                SELECT COUNT(*) as c, author_id
-                FROM commands
-                WHERE server_id = $1
-                GROUP BY author_id
-                ORDER BY c DESC LIMIT 25;
-                """
-        usage = await self.bot.cxn.fetch(query, ctx.guild.id)
+        usage = await queries.bot_usage(
+            ctx.guild.id, timedelta(seconds=time_dict[unit])
+        )
         e = discord.Embed(
             title=f"Bot usage for the last {unit}",
             description=f"{sum(x[0] for x in usage)} commands from {len(usage)} user{'' if len(usage) == 1 else 's'}",
@@ -962,21 +873,11 @@ class Tracking(commands.Cog):
         message = await ctx.send_or_reply(
             content=f"**{self.bot.emote_dict['loading']} Collecting Word Statistics...**",
         )
-        query = """
-                SELECT ARRAY_AGG(content)
-                FROM messages
-                WHERE author_id = $1
-                AND server_id = $2;
-                """
-        all_msgs = await self.bot.cxn.fetchval(
-            query,
-            user.id,
-            ctx.guild.id,
-        )
-
-        all_msgs = " ".join(all_msgs).split()
-        all_msgs = list(filter(lambda x: len(x) > 0, all_msgs))
-        all_words = Counter(all_msgs).most_common()[:limit]
+        all_words = await queries.top_words(ctx.guild.id, user.id, limit)
+        if not all_words:
+            return await message.edit(
+                content=f"{self.bot.emote_dict['graph']} **{user}** has not sent any words yet.",
+            )
         msg = ""
         for i in all_words:
             msg += f"Uses: [{str(i[1]).zfill(2)}] Word: {i[0]}\n"
@@ -1037,32 +938,19 @@ class Tracking(commands.Cog):
         message = await ctx.send_or_reply(
             content=f"**{self.bot.emote_dict['loading']} Collecting Word Statistics...**",
         )
-        query = f"""
-                SELECT ARRAY_AGG(content)
-                FROM messages
-                WHERE author_id = $1
-                AND server_id = $2;
-                """
-        all_msgs = await self.bot.cxn.fetchval(query, user.id, ctx.guild.id)
-        if not all_msgs:
-            return await message.edit(
-                content=f"{self.bot.emote_dict['graph']} The word `{word}` has never been used by **{user}**",
-            )
-        all_msgs = " ".join(all_msgs).split()
-        all_msgs = list(filter(lambda x: len(x) > 0, all_msgs))
-        all_words = Counter(all_msgs)
-        count = all_words.get(word)
+        count = await queries.word_count(ctx.guild.id, user.id, word)
 
         if not count:
             return await message.edit(
                 content=f"{self.bot.emote_dict['graph']} The word `{word}` has never been used by **{user}**",
             )
 
-        usage = list(all_words).index(word)
+        # Ranked by how many of the user's words are used more often.
+        usage = await queries.word_rank(ctx.guild.id, user.id, count)
         common = utils.number_format(usage)
 
         await message.edit(
-            content=f"{self.bot.emote_dict['graph']} The word `{word}` has been used {count} time{'' if usage == 1 else 's'} and is the {common} most common word used by **{user}**"
+            content=f"{self.bot.emote_dict['graph']} The word `{word}` has been used {count} time{'' if count == 1 else 's'} and is the {common} most common word used by **{user}**"
         )
 
     @word.error
@@ -1106,15 +994,7 @@ class Tracking(commands.Cog):
         time_seconds = time_dict.get(unit, 2592000)
         now = int(time.time())
         diff = now - time_seconds
-        query = """
-                SELECT COUNT(*) as c, author_id
-                FROM messages
-                WHERE server_id = $1
-                AND unix > $2
-                GROUP BY author_id
-                ORDER BY c DESC LIMIT 25;
-                """
-        stuff = await self.bot.cxn.fetch(query, ctx.guild.id, diff)
+        stuff = await queries.message_leaderboard(ctx.guild.id, diff)
 
         e = discord.Embed(
             title=f"Message Leaderboard",
@@ -1175,14 +1055,7 @@ class Tracking(commands.Cog):
         time_seconds = time_dict.get(unit, 2592000)
         now = int(time.time())
         diff = now - time_seconds
-        query = """
-                SELECT SUM(LENGTH(content)) as c, author_id, COUNT(*)
-                FROM messages
-                WHERE server_id = $1
-                AND unix > $2
-                GROUP BY author_id
-                ORDER BY c DESC LIMIT 25"""
-        stuff = await self.bot.cxn.fetch(query, ctx.guild.id, diff)
+        stuff = await queries.character_leaderboard(ctx.guild.id, diff)
         e = discord.Embed(
             title="Character Leaderboard",
             description=f"{sum(x[0] for x in stuff)} characters from {len(stuff)} user{'' if len(stuff) == 1 else 's'} in the last {unit}",
@@ -1238,11 +1111,7 @@ class Tracking(commands.Cog):
             raise commands.BadArgument("I do not track bots.")
 
         await ctx.trigger_typing()
-        query = """
-                SELECT * FROM userstatus
-                WHERE user_id = $1;
-                """
-        data = await self.bot.cxn.fetch(query, user.id)
+        data = await queries.user_status(user.id)
         if not data:
             return await self.do_generic(ctx, user)
         for row in data:
@@ -1559,11 +1428,7 @@ class Tracking(commands.Cog):
         """
         user = user or ctx.author
         await ctx.trigger_typing()
-        query = """
-                SELECT * FROM userstatus
-                WHERE user_id = $1;
-                """
-        data = await self.bot.cxn.fetch(query, user.id)
+        data = await queries.user_status(user.id)
         if not data:
             return await self.do_generic(ctx, user)
         for row in data:
@@ -7,6 +7,7 @@ import math
 import base64
 import codecs
 import random
+import shlex
 import typing
 import asyncio
 import discord
@@ -16,12 +17,13 @@ import pyparsing
 import unicodedata
 
 from collections import Counter, namedtuple
-from datetime import datetime
+from datetime import datetime, timezone
 from discord.ext import commands, menus
 from functools import cmp_to_key
 from PIL import Image
 from unidecode import unidecode
 
+from settings import queries
 from utilities import utils
 from utilities import checks
 from utilities import cleaner
@@ -29,6 +31,7 @@ from utilities import helpers
 from utilities import converters
 from utilities import decorators
 from utilities import formatting
+from utilities import humantime
 from utilities import pagination
 
 
@@ -926,6 +929,7 @@ class Utility(commands.Cog):
             duplicates
             hardmention
             hash       (Ex: 3523)
+            messages   (Ex: hello world)
             nickname   (Ex: Hecate)
             playing    (Ex: Visual Studio Code)
             snowflake  (Ex: 708584008065351681)
@@ -1213,6 +1217,147 @@ class Utility(commands.Cog):
         except menus.MenuError as e:
             await ctx.send_or_reply(e)
 
+    @find.command(
+        name="messages",
+        aliases=["message", "msgs"],
+        brief="Search the stored server messages.",
+    )
+    async def find_messages(self, ctx, *, args: str):
+        """
+        Usage: {0}find messages <search> [flags]
+        Alias:
+            {0}find message
+            {0}find msgs
+        Output:
+            Starts a pagination session showing
+            stored messages matching your search,
+            newest first.
+        Examples:
+            {0}find messages hello world
+            {0}find messages "exact phrase" -u Hecate
+            {0}find messages spam -c #general --after 2 days
+            {0}find messages link --deleted --before 1 week
+        Notes:
+            Searches whole words. Quote a phrase
+            to match it exactly, prefix a word with
+            - to exclude it and use "or" between words
+            to match either one of them.
+        """
+        help_docstr = ""
+        help_docstr += "```yaml\n"
+        help_docstr += "Flags: [Every flag is optional.]\n"
+        help_docstr += "\t--help|-h: Shows this message\n"
+        help_docstr += "\t--user|-u: Only messages sent by this user.\n"
+        help_docstr += "\t--channel|-c: Only messages sent in this channel.\n"
+        help_docstr += "\t--after|-a: Only messages sent after this long ago.\n"
+        help_docstr += "\t--before|-b: Only messages sent before this long ago.\n"
+        help_docstr += "\t--deleted: Only deleted messages. (no arguments)\n"
+        help_docstr += "\t--edited: Only edited messages. (no arguments)\n"
+        help_docstr += "```"
+
+        parser = converters.Arguments(add_help=False, allow_abbrev=False)
+        parser.add_argument("search", nargs="*")
+        parser.add_argument("--help", "-h", action="store_true")
+        parser.add_argument("--user", "-u", nargs="+")
+        parser.add_argument("--channel", "-c")
+        parser.add_argument("--after", "-a", nargs="+")
+        parser.add_argument("--before", "-b", nargs="+")
+        parser.add_argument("--deleted", action="store_true")
+        parser.add_argument("--edited", action="store_true")
+
+        try:
+            args = parser.parse_args(shlex.split(args))
+        except Exception as e:
+            return await ctx.fail(str(e).capitalize())
+
+        if args.help:
+            return await ctx.send_or_reply(help_docstr)
+        if not args.search:
+            return await ctx.usage("<search> [flags]")
+        search = " ".join(args.search)
+
+        # Only search the channels the invoker can read.
+        channels = [
+            channel.id
+            for channel in ctx.guild.text_channels
+            if channel.permissions_for(ctx.author).read_messages
+        ]
+        author_id = None
+        if args.user:
+            user = await converters.DiscordUser().convert(ctx, " ".join(args.user))
+            author_id = user.id
+        if args.channel:
+            channel = await commands.TextChannelConverter().convert(ctx, args.channel)
+            channels = [c for c in channels if c == channel.id]
+        now = ctx.message.created_at
+        bounds = []
+        for flag in ("after", "before"):
+            value = getattr(args, flag)
+            if not value:
+                bounds.append(None)
+                continue
+            dt = humantime.PastTime(" ".join(value), now=now).dt
+            bounds.append(dt.replace(tzinfo=timezone.utc).timestamp())
+        after_bound, before_bound = bounds
+        # No message is older than its server.
+        floor = ctx.guild.created_at.replace(tzinfo=timezone.utc).timestamp()
+        floor = max(floor, after_bound or floor)
+        newest = before_bound or now.replace(tzinfo=timezone.utc).timestamp()
+
+        # Every page starts below the last row of the one before,
+        # so deep pages cost the same as the first one. Matches are
+        # searched a window at a time newest first, doubling the
+        # window until the page fills, so a common word never sorts
+        # every match of the server and a rare one takes few queries.
+        async def fetch(after, limit):
+            if after is None:
+                after = (float("inf"), 0)
+            rows = []
+            upper = before_bound
+            span = 30 * 24 * 3600
+            lower = min(after[0], newest) - span
+            while True:
+                lower = max(lower, floor)
+                rows += await queries.search_messages(
+                    ctx.guild.id,
+                    search,
+                    channels,
+                    author_id,
+                    lower,
+                    upper,
+                    args.deleted,
+                    args.edited,
+                    *after,
+                    limit - len(rows),
+                )
+                if len(rows) >= limit or lower <= floor:
+                    return rows
+                upper = lower
+                span *= 2
+                lower = upper - span
+
+        def formatter(row):
+            content = cleaner.clean_all(row["content"] or "")
+            if len(content) > 200:
+                content = content[:197] + "..."
+            link = f"https://discord.com/channels/{ctx.guild.id}/{row['channel_id']}/{row['message_id']}"
+            return f"<@!{row['author_id']}> in <#{row['channel_id']}> [`{datetime.utcfromtimestamp(row['unix']):%Y-%m-%d %H:%M}`]({link})\n{content}"
+
+        p = pagination.KeysetPages(
+            fetch,
+            lambda row: (row["unix"], row["index"]),
+            formatter,
+            per_page=6,
+            title=f"Messages matching {search}"[:256],
+        )
+        await p.source.prepare()
+        if not p.source.pages:
+            return await ctx.fail(f"**No results.**")
+        try:
+            await p.start(ctx)
+        except menus.MenuError as e:
+            await ctx.send_or_reply(e)
+
     @decorators.command(
         aliases=["id"],
         brief="Show info on a discord snowflake.",
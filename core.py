@@ -18,8 +18,16 @@ from logging.handlers import RotatingFileHandler
 
 from dislash.slash_commands import SlashClient
 
-from settings import cleanup, database, constants
-from utilities import utils, override
+from settings import (
+    cache,
+    cleanup,
+    database,
+    constants,
+    notifications,
+    partitions,
+    queries,
+)
+from utilities import utils, override, invites
 
 MAX_LOGGING_BYTES = 32 * 1024 * 1024  # 32 MiB
 
@@ -110,7 +118,7 @@ def get_prefixes(bot, msg):
     if msg.guild is None:
         base.append(constants.prefix)
     else:
-        base.extend(bot.prefixes.get(msg.guild.id, [constants.prefix]))
+        base.extend(bot.get_raw_guild_prefixes(msg.guild.id))
     return base
 
 
@@ -132,6 +140,8 @@ class Snowbot(commands.AutoShardedBot):
         self.command_stats = collections.Counter()
         self.constants = constants
         self.cxn = database.postgres
+        self.ingest = database.ingest  # Batch writers and upkeep
+        self.analytics = database.analytics  # Long reports
         self.exts = [
             x[:-3] for x in sorted(os.listdir("././cogs")) if x.endswith(".py")
         ]
@@ -139,7 +149,6 @@ class Snowbot(commands.AutoShardedBot):
             r"(?:https?://)?discord(?:app)?\.(?:com/invite|gg)/[a-zA-Z0-9]+/?"
         )  # discord invite regex
         self.emote_dict = constants.emotes
-        self.prefixes = database.prefixes
         # self.command_config = database.command_config
         self.ready = False
         self.session = aiohttp.ClientSession(loop=self.loop)
@@ -199,17 +208,15 @@ class Snowbot(commands.AutoShardedBot):
     async def close(self):  # Shutdown the bot cleanly
         try:
             runtime = time.time() - self.starttime
-            query = """
-                    UPDATE config SET last_run = $1,
-                    runtime = runtime + $1
-                    WHERE client_id = $2;
-                    """
-            await self.cxn.execute(query, runtime, self.user.id)
+            await queries.record_runtime(runtime, self.user.id)
         except AttributeError:
             # Probably because the process was killed before
             # the bot attrs were set. Let's silence errors.
             pass
 
+        if hasattr(self, "settings_backup"):
+            await self.settings_backup.close()
+        await notifications.listener.stop()
         await super().close()
         await self.session.close()
 
@@ -336,11 +343,36 @@ class Snowbot(commands.AutoShardedBot):
                 text=f"Member   iteration : {str(time.time() - st)[:10]} s",
             )
         )
+        try:  # Partition messages before migrations index it
+            await partitions.convert()
+        except Exception as e:
+            print(utils.traceback_maker(e))
+
         try:
             await database.initialize(self, member_list)
         except Exception as e:
             print(utils.traceback_maker(e))
 
+        self.settings_backup = cache.Settings(self)
+        try:  # Load the settings and follow changes from other processes
+            await notifications.listener.start(self)
+        except Exception as e:
+            print(utils.traceback_maker(e))
+            try:  # The database is unreachable, use the last backup
+                seq = await self.settings_backup.restore()
+                print(f"Restored settings from backup {seq}")
+            except Exception as e:
+                print(utils.traceback_maker(e))
+        self.settings_backup.backup.start()  # Back the settings up as they change
+
+        try:  # Create upcoming monthly partitions
+            await partitions.maintain(
+                retention=constants.message_retention,
+                action=constants.retention_action,
+            )
+        except Exception as e:
+            print(utils.traceback_maker(e))
+
         try:  # Set up our webhooks
             await self.setup_webhooks()
         except Exception as e:
@@ -399,11 +431,7 @@ class Snowbot(commands.AutoShardedBot):
             self.server_settings = database.settings
 
         if not hasattr(self, "invites"):
-            self.invites = {
-                guild.id: await guild.invites()
-                for guild in self.guilds
-                if guild.me.guild_permissions.manage_guild
-            }
+            self.invites = {}  # Filled in gradually by the Batch cog.
 
         await self.finalize_startup()
 
@@ -412,16 +440,7 @@ class Snowbot(commands.AutoShardedBot):
         This sets the bot's presence, status, and activity
         based off of the values in ./config.json
         """
-        query = """
-                SELECT (
-                    activity,
-                    presence,
-                    status
-                )
-                FROM config
-                WHERE client_id = $1;
-                """
-        status_values = await self.cxn.fetchval(query, self.user.id)
+        status_values = await queries.bot_status(self.user.id)
         if not status_values:
             activity = "playing"
             presence = ""
@@ -452,9 +471,6 @@ class Snowbot(commands.AutoShardedBot):
         await self.change_presence(status=s, activity=activity)
 
     async def finalize_startup(self):
-        # Delete all records of servers that kicked the bot
-        await cleanup.basic_cleanup(self.guilds)
-
         # load all initial extensions
         try:
             for cog in self.exts:
@@ -478,15 +494,7 @@ class Snowbot(commands.AutoShardedBot):
         self.ready = True
 
         # See if we were rebooted by a command and send confirmation if we were.
-        query = """
-                SELECT (
-                    reboot_invoker,
-                    reboot_message_id,
-                    reboot_channel_id
-                ) FROM config
-                WHERE client_id = $1;
-                """
-        reboot = await self.cxn.fetchval(query, self.user.id)
+        reboot = await queries.reboot_info(self.user.id)
         if reboot:
             if any((item is None for item in reboot)):
                 return
@@ -511,30 +519,23 @@ class Snowbot(commands.AutoShardedBot):
         return local_inject(self, proxy_msg)
 
     def get_raw_guild_prefixes(self, guild_id):
-        return self.prefixes.get(guild_id, [self.constants.prefix])
+        prefixes = database.settings[guild_id].prefixes
+        return [self.constants.prefix] if prefixes is None else list(prefixes)
 
     async def set_guild_prefixes(self, guild, prefixes):
         if len(prefixes) == 0:
             await self.put(guild.id, [None])
-            self.prefixes[guild.id] = prefixes
         elif len(prefixes) > 10:
             raise RuntimeError("Cannot have more than 10 custom prefixes.")
         else:
             await self.put(guild.id, prefixes)
-            self.prefixes[guild.id] = prefixes
 
     async def put(self, guild_id, prefixes):
-        query = """
-                DELETE FROM prefixes
-                WHERE server_id = $1
-                """
-        await self.cxn.execute(query, guild_id)
-        query = """
-                INSERT INTO prefixes
-                VALUES ($1, $2)
-                """
-        await self.cxn.executemany(query, ((guild_id, prefix) for prefix in prefixes))
-        self.prefixes[guild_id] = prefixes
+        await queries.delete_prefixes(guild_id)
+        await queries.insert_prefixes(guild_id, list(prefixes))
+        database.settings[guild_id].prefixes = tuple(
+            prefix for prefix in prefixes if prefix is not None
+        )
 
     async def get_or_fetch_member(self, guild, member_id):
         """Looks up a member in cache or fetches if not found.
@@ -724,10 +725,11 @@ class Snowbot(commands.AutoShardedBot):
         if self.ready is False:
             return
 
+        await cleanup.cancel_teardown(guild.id)  # Rejoined before the data was gone
         await database.update_server(guild, guild.members)
         await database.fix_server(guild.id)
         if guild.me.guild_permissions.manage_guild:
-            self.invites[guild.id] = await guild.invites()
+            self.invites[guild.id] = invites.index(await guild.invites())
         try:
             await self.logging_webhook.send(
                 f"{self.emote_dict['success']} **Information** `{datetime.utcnow()}`\n"
@@ -743,7 +745,9 @@ class Snowbot(commands.AutoShardedBot):
             return  # Wait until ready
         # This happens when the bot gets kicked from a server.
         # No need to waste any space storing their info anymore.
-        await cleanup.destroy_server(guild.id)
+        # The Batch cog deletes the rows in the background.
+        await cleanup.enqueue_teardown(guild.id)
+        database.settings.pop(guild.id, None)
         try:
             await self.logging_webhook.send(
                 f"{self.emote_dict['success']} **Information** `{datetime.utcnow()}`\n"
@@ -6,8 +6,9 @@ CREATE TABLE IF NOT EXISTS emojistats (
 );
 CREATE UNIQUE INDEX IF NOT EXISTS emojistats_idx ON emojistats(server_id, emoji_id);
 
+-- Monthly partitions are created by settings/partitions.py
 CREATE TABLE IF NOT EXISTS messages (
-    index BIGSERIAL PRIMARY KEY,
+    index BIGSERIAL,
     unix REAL,
     timestamp TIMESTAMP,
     content TEXT,
@@ -16,8 +17,18 @@ CREATE TABLE IF NOT EXISTS messages (
     channel_id BIGINT,
     server_id BIGINT,
     deleted BOOLEAN DEFAULT False,
-    edited BOOLEAN DEFAULT False
-);
+    edited BOOLEAN DEFAULT False,
+    PRIMARY KEY (index, unix)
+) PARTITION BY RANGE (unix);
+
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'messages'::regclass) = 'p' THEN
+        CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT;
+    END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS messages_message_id_idx ON messages(message_id);
 
 CREATE TABLE IF NOT EXISTS commands (
     index BIGSERIAL PRIMARY KEY,
@@ -5,14 +5,7 @@ CREATE TABLE IF NOT EXISTS useravatars (
     insertion TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'UTC')
 );
 CREATE INDEX IF NOT EXISTS useravatars_idx ON useravatars(user_id, avatar_id);
-
-CREATE TABLE IF NOT EXISTS useravatars (
-    id BIGSERIAL PRIMARY KEY,
-    user_id BIGINT,
-    avatar_id BIGINT,
-    insertion TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'UTC')
-);
-CREATE INDEX IF NOT EXISTS useravatars_idx ON useravatars(user_id, avatar_id);
+ALTER TABLE useravatars ADD COLUMN IF NOT EXISTS avatar_hash TEXT;
 
 CREATE TABLE IF NOT EXISTS usernames (
     id BIGSERIAL PRIMARY KEY,
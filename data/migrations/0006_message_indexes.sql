@@ -0,0 +1,20 @@
+-- Indexes for the hot message queries.
+-- messages is partitioned so these can not be built concurrently,
+-- each one is created on every partition inside this transaction.
+
+-- snipe and editsnipe: latest deleted/edited message in a channel
+CREATE INDEX IF NOT EXISTS messages_deleted_idx
+ON messages(channel_id, unix DESC) INCLUDE (author_id)
+WHERE deleted;
+
+CREATE INDEX IF NOT EXISTS messages_edited_idx
+ON messages(channel_id, unix DESC) INCLUDE (author_id)
+WHERE edited;
+
+-- Stats.get_user_msgs, words and last_observed
+CREATE INDEX IF NOT EXISTS messages_author_server_idx
+ON messages(author_id, server_id) INCLUDE (unix);
+
+-- activity, characters and messagestats
+CREATE INDEX IF NOT EXISTS messages_server_unix_idx
+ON messages(server_id, unix) INCLUDE (author_id);
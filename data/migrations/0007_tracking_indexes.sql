@@ -0,0 +1,38 @@
+-- migrate: no-transaction
+-- Indexes for the hot command and tracking queries,
+-- built concurrently so writers are never blocked.
+
+-- Stats.get_user_cmds, commandstats and botadmin user lookups
+CREATE INDEX CONCURRENTLY IF NOT EXISTS commands_author_server_idx
+ON commands(author_id, server_id) INCLUDE (command);
+
+-- commandstats and botadmin server lookups
+CREATE INDEX CONCURRENTLY IF NOT EXISTS commands_server_timestamp_idx
+ON commands(server_id, timestamp DESC) INCLUDE (command);
+
+-- help "last run" and the botadmin usage windows
+CREATE INDEX CONCURRENTLY IF NOT EXISTS commands_command_timestamp_idx
+ON commands(command, timestamp);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS commands_timestamp_idx
+ON commands(timestamp) INCLUDE (command);
+
+-- Avatar, username and nickname history, newest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS useravatars_history_idx
+ON useravatars(user_id, insertion DESC) INCLUDE (avatar_id, avatar_hash);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS useravatars_avatar_id_idx
+ON useravatars(avatar_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS usernames_history_idx
+ON usernames(user_id, insertion DESC) INCLUDE (username);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS usernicks_history_idx
+ON usernicks(user_id, server_id, insertion DESC) INCLUDE (nickname);
+
+-- inviter and invites
+CREATE INDEX CONCURRENTLY IF NOT EXISTS invites_invitee_idx
+ON invites(invitee, server_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS invites_inviter_idx
+ON invites(inviter, server_id);
@@ -0,0 +1,23 @@
+-- Daily message and character counts per author,
+-- kept up to date by the batch cog's message flush.
+CREATE TABLE IF NOT EXISTS dailymessages (
+    server_id BIGINT,
+    author_id BIGINT,
+    day DATE,
+    messages BIGINT DEFAULT 0 NOT NULL,
+    characters BIGINT DEFAULT 0 NOT NULL,
+    PRIMARY KEY (server_id, author_id, day)
+);
+CREATE INDEX IF NOT EXISTS dailymessages_server_day_idx
+ON dailymessages(server_id, day) INCLUDE (author_id, messages, characters);
+
+-- Messages stored before the rollups existed are counted by
+-- settings/rollups.py, walking down from this index to zero.
+CREATE TABLE IF NOT EXISTS rollup_backfill (
+    name TEXT PRIMARY KEY,
+    cursor BIGINT NOT NULL
+);
+INSERT INTO rollup_backfill (name, cursor)
+SELECT 'messages', COALESCE(MAX(index), 0)
+FROM messages
+ON CONFLICT (name) DO NOTHING;
@@ -0,0 +1,16 @@
+-- Per author word frequencies for the words and word commands,
+-- kept up to date by the batch cog's message flush.
+CREATE TABLE IF NOT EXISTS word_counts (
+    server_id BIGINT,
+    author_id BIGINT,
+    word TEXT,
+    count BIGINT DEFAULT 0 NOT NULL,
+    PRIMARY KEY (server_id, author_id, word)
+);
+CREATE INDEX IF NOT EXISTS word_counts_rank_idx
+ON word_counts(server_id, author_id, count DESC) INCLUDE (word);
+
+INSERT INTO rollup_backfill (name, cursor)
+SELECT 'words', COALESCE(MAX(index), 0)
+FROM messages
+ON CONFLICT (name) DO NOTHING;
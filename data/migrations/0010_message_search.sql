@@ -0,0 +1,8 @@
+-- Full text search over stored messages for the find messages command.
+-- The simple configuration neither stems nor drops stop words,
+-- so searches match what was actually said in any language.
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS search TSVECTOR
+GENERATED ALWAYS AS (TO_TSVECTOR('simple', COALESCE(content, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS messages_search_idx
+ON messages USING GIN (search);
@@ -0,0 +1,20 @@
+-- Hourly command uses per (command, server, author, failed),
+-- kept up to date by the batch cog's command flush.
+-- Commands run in direct messages are stored with server_id 0.
+CREATE TABLE IF NOT EXISTS hourlycommands (
+    server_id BIGINT,
+    author_id BIGINT,
+    command TEXT,
+    failed BOOLEAN,
+    hour TIMESTAMP,
+    uses BIGINT DEFAULT 0 NOT NULL,
+    PRIMARY KEY (server_id, author_id, command, failed, hour)
+);
+CREATE INDEX IF NOT EXISTS hourlycommands_hour_idx
+ON hourlycommands(hour) INCLUDE (command, failed, uses);
+CREATE INDEX IF NOT EXISTS hourlycommands_command_idx
+ON hourlycommands(command, hour) INCLUDE (server_id, failed, uses);
+
+INSERT INTO rollup_backfill (name, cursor)
+VALUES ('commands', NEXTVAL(PG_GET_SERIAL_SEQUENCE('commands', 'index')))
+ON CONFLICT (name) DO NOTHING;
@@ -0,0 +1,8 @@
+-- Servers the bot left whose rows are still being deleted.
+-- done lists the tables that no longer hold rows of the server.
+CREATE TABLE IF NOT EXISTS teardowns (
+    server_id BIGINT PRIMARY KEY,
+    queued TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'UTC'),
+    done TEXT[] DEFAULT '{}',
+    deleted BIGINT DEFAULT 0
+);
@@ -0,0 +1,41 @@
+-- Every write to a settings table bumps config_version and sends
+-- NOTIFY snowbot_config, '<server_id>:<table>:<version>' so each
+-- bot process reloads that part of the server's settings. The
+-- version row is locked until commit, so notifications arrive in
+-- version order and a gap means one was missed.
+CREATE TABLE IF NOT EXISTS config_version (
+    id BOOLEAN PRIMARY KEY DEFAULT True CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO config_version DEFAULT VALUES ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION notify_config() RETURNS TRIGGER AS $$
+DECLARE
+    server BIGINT;
+    current BIGINT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        server := OLD.server_id;
+    ELSE
+        server := NEW.server_id;
+    END IF;
+    UPDATE config_version SET version = version + 1 RETURNING version INTO current;
+    PERFORM PG_NOTIFY('snowbot_config', server || ':' || TG_TABLE_NAME || ':' || current);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    name TEXT;
+BEGIN
+    FOREACH name IN ARRAY ARRAY['servers', 'prefixes', 'plonks', 'logs', 'log_data', 'command_config'] LOOP
+        EXECUTE FORMAT('DROP TRIGGER IF EXISTS %I ON %I', name || '_notify', name);
+        EXECUTE FORMAT(
+            'CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE ON %I '
+            'FOR EACH ROW EXECUTE FUNCTION notify_config()',
+            name || '_notify', name
+        );
+    END LOOP;
+END;
+$$;
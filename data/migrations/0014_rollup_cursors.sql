@@ -0,0 +1,17 @@
+-- 0008 and 0009 seeded the backfill cursors with MAX(index) of
+-- messages. Right after partitions.convert() the partitioned table
+-- is still empty, so the cursors started at 0 and the history
+-- moved over from messages_legacy was never counted.
+-- A cursor whose rollup is still empty has counted nothing, live or
+-- backfilled, so it starts from the index sequence instead. Every
+-- row below it was stored before the rollups and every row after it
+-- is counted by the batch cog as it is inserted.
+UPDATE rollup_backfill
+SET cursor = NEXTVAL(PG_GET_SERIAL_SEQUENCE('messages', 'index'))
+WHERE name = 'messages'
+AND NOT EXISTS (SELECT 1 FROM dailymessages);
+
+UPDATE rollup_backfill
+SET cursor = NEXTVAL(PG_GET_SERIAL_SEQUENCE('messages', 'index'))
+WHERE name = 'words'
+AND NOT EXISTS (SELECT 1 FROM word_counts);
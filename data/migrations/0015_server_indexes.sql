@@ -0,0 +1,23 @@
+-- migrate: no-transaction
+-- Indexes led by the server id for the tables settings/cleanup.py
+-- deletes from in chunks, so each chunk of a purge or teardown
+-- is an index scan instead of a scan of the whole table.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS command_config_server_idx
+ON command_config(server_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS lockedchannels_server_idx
+ON lockedchannels(server_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS warn_server_idx
+ON warn(server_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS invites_server_idx
+ON invites(server_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS usernicks_server_idx
+ON usernicks(server_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS userroles_server_idx
+ON userroles(server_id);
+
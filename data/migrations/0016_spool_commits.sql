@@ -0,0 +1,9 @@
+-- Spool segments whose records postgres committed, written in the
+-- same transaction as the records. A segment still on disk after a
+-- crash between that commit and its unlink is skipped on replay.
+-- spool is the id of the spool folder, so processes never collide.
+CREATE TABLE IF NOT EXISTS spool_commits (
+    spool TEXT,
+    segment BIGINT,
+    PRIMARY KEY (spool, segment)
+);
@@ -1,71 +1,233 @@
-import asyncio
+import os
+import re
 import json
+import time
 import logging
-import os
-from datetime import datetime
+import tempfile
 
-import discord
-from discord.ext import commands, tasks
+from discord.ext import tasks
 
-from settings import database
+from settings import database, guilds
 from utilities import utils
 
 log = logging.getLogger("INFO_LOGGER")
 
+# Files of the backup folder. A snapshot holds every server and each
+# delta the servers changed since the file numbered one below it.
+FILE_REGEX = re.compile(r"^(snapshot|delta)-(\d+)\.json$")
+
+
+def filename(kind, seq):
+    return f"{kind}-{seq:010d}.json"
+
+
+def dumps(data):
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def write(path, data):
+    """Write data to path so a crash leaves either the old or the new file."""
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        os.remove(temp)
+        raise
+
 
 class Settings:
-    def __init__(self, bot):
+    """
+    Backs the server settings up to disk.
+    Every cycle writes a delta of the servers marked dirty in
+    settings/guilds.py, so the cost follows the rate of change
+    instead of the number of servers. Deltas are compacted into
+    a full snapshot every compact_every cycles and the two newest
+    snapshots are kept with the deltas needed to replay them.
+    Serializing and file access happen on a worker thread.
+    The backup loop is started once the settings are loaded
+    or restored, so its first snapshot is never empty.
+    """
+
+    def __init__(self, bot, folder="./data/json/settings-backup", compact_every=12):
         self.bot = bot
-        self.backup_folder = "./data/json/settings-backup"
-        self.max_backups = 20
-        self.backup_interval = 7200  # runs every 2 hours
-        self.initial_backup = 10  # initial wait time before first backup
-        self.dump_interval = 3600  # runs every hour
+        self.folder = folder
+        self.compact_every = compact_every  # Deltas between full snapshots
+        self.seq = None  # Last file written, None until the first snapshot
+        self.deltas = 0  # Written since the last snapshot
+        self.writes = 0
+        self.bytes = 0
 
         self.server_settings = database.settings
 
-        utils.write_json("./data/json/settings.json", self.server_settings)
+        os.makedirs(self.folder, exist_ok=True)
 
-        self.backup.start()
+    def snapshot(self):
+        return {
+            server_id: config.to_dict()
+            for server_id, config in self.server_settings.items()
+        }
 
     # Get the requested stat
     async def get_server_setting(self, server, setting, default=None):
-        return self.server_settings.get(server.id, {}).get(setting, default)
+        config = self.server_settings.get(server.id)
+        return getattr(config, setting, default)
 
     # Set the provided stat
     async def set_server_setting(self, server, setting, value):
-        self.server_settings[server.id][setting] = value
+        setattr(self.server_settings[server.id], setting, value)
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def files(self, kind):
+        """Sequence numbers of the files of kind, oldest first."""
+        found = []
+        for name in os.listdir(self.folder):
+            match = FILE_REGEX.match(name)
+            if match and match.group(1) == kind:
+                found.append(int(match.group(2)))
+        return sorted(found)
+
+    async def run(self, func, *args):
+        return await self.bot.loop.run_in_executor(None, func, *args)
+
+    def write(self, kind, seq, configs):
+        # The configs are read here, off the event loop. Their
+        # attributes are immutable so each one is read whole,
+        # and one changed meanwhile is dirty for the next delta.
+        data = {
+            str(server_id): config.to_dict() if config is not None else None
+            for server_id, config in configs.items()
+        }
+        key = "settings" if kind == "snapshot" else "changes"
+        payload = dumps({"seq": seq, "time": time.time(), key: data})
+        write(self.path(filename(kind, seq)), payload)
+        self.writes += 1
+        self.bytes += len(payload)
+
+    def load(self):
+        """
+        The last good state as (seq, {server_id: dict}).
+        Falls back to the older snapshot when the newest can't be
+        read and replays deltas until one is missing or unreadable.
+        """
+        deltas = self.files("delta")
+        for base in reversed(self.files("snapshot")[-2:]):
+            try:
+                with open(self.path(filename("snapshot", base)), "rb") as fp:
+                    settings = json.load(fp)["settings"]
+            except (OSError, ValueError, KeyError):
+                log.warning(f"Skipping unreadable settings snapshot {base}.")
+                continue
+            seq = base
+            for number in deltas:
+                if number <= seq:
+                    continue
+                if number != seq + 1:
+                    break
+                try:
+                    with open(self.path(filename("delta", number)), "rb") as fp:
+                        changes = json.load(fp)["changes"]
+                except (OSError, ValueError, KeyError):
+                    log.warning(f"Stopping the settings replay at delta {number}.")
+                    break
+                for server_id, config in changes.items():
+                    if config is None:
+                        settings.pop(server_id, None)
+                    else:
+                        settings[server_id] = config
+                seq = number
+            return seq, settings
+        return 0, {}
+
+    def dump(self):
+        """The last good state as indented JSON, for viewing."""
+        seq, settings = self.load()
+        return seq, json.dumps(settings, indent=2)
+
+    def compact(self, seq):
+        """Fold the deltas into a new snapshot at seq and prune old files."""
+        base, settings = self.load()
+        if base != seq:
+            return False
+        payload = dumps({"seq": seq, "time": time.time(), "settings": settings})
+        write(self.path(filename("snapshot", seq)), payload)
+        self.writes += 1
+        self.bytes += len(payload)
+        self.prune()
+        return True
+
+    def prune(self):
+        # Keep the two newest snapshots and the deltas after the older one.
+        snapshots = self.files("snapshot")
+        oldest = snapshots[-2] if len(snapshots) > 1 else snapshots[-1]
+        for number in snapshots[:-2]:
+            os.remove(self.path(filename("snapshot", number)))
+        for number in self.files("delta"):
+            if number <= oldest:
+                os.remove(self.path(filename("delta", number)))
+        for name in os.listdir(self.folder):
+            if name.endswith(".tmp"):  # Left by a crash mid write
+                os.remove(self.path(name))
+
+    async def flush(self):
+        if self.seq is None:
+            # The settings were just loaded from the database, so the
+            # first file is a full snapshot numbered after any on disk.
+            numbers = await self.run(
+                lambda: self.files("snapshot") + self.files("delta")
+            )
+            seq = max(numbers, default=0) + 1
+            guilds.take_dirty()
+            configs = dict(self.server_settings)
+            await self.run(self.write, "snapshot", seq, configs)
+            await self.run(self.prune)
+            self.seq, self.deltas = seq, 0
+            return
+
+        changed = guilds.take_dirty()
+        if changed:
+            configs = {sid: self.server_settings.get(sid) for sid in changed}
+            try:
+                await self.run(self.write, "delta", self.seq + 1, configs)
+            except Exception:
+                guilds.dirty.update(changed)  # Retry them next cycle
+                raise
+            self.seq += 1
+            self.deltas += 1
+
+        if self.deltas >= self.compact_every:
+            if not await self.run(self.compact, self.seq):
+                log.warning(
+                    "Settings deltas failed to replay, writing a full snapshot."
+                )
+                self.seq = None
+            self.deltas = 0
+
+    async def restore(self):
+        """
+        Replace the cached settings with the last good state on disk,
+        for when the database can't be reached. Returns its seq.
+        """
+        seq, settings = await self.run(self.load)
+        registry = guilds.GuildConfigs()
+        for server_id, config in settings.items():
+            registry[int(server_id)] = guilds.GuildConfig.from_dict(config)
+        self.server_settings.clear()
+        self.server_settings.update(registry)
+        return seq
+
+    async def close(self):
+        self.backup.cancel()
+        await self.flush()
 
     @tasks.loop(minutes=5)
     async def backup(self):
-
-        if not os.path.exists(self.backup_folder):
-            # Create it
-            os.makedirs(self.backup_folder)
-        # Flush backup
-        timestamp = datetime.today().strftime("%Y-%m-%d %H.%M")
-        utils.write_json(
-            f"./{self.backup_folder}/Backup-{timestamp}.json", self.server_settings
-        )
-
-        # Get curr dir and change curr dir
-        retval = os.getcwd()
-        os.chdir(self.backup_folder)
-
-        # Get reverse sorted backups
-        backups = sorted(os.listdir(os.getcwd()), key=os.path.getmtime)
-        num_to_remove = None
-        if len(backups) > self.max_backups:
-            num_to_remove = len(backups) - self.max_backups
-            for i in range(0, num_to_remove):
-                os.remove(backups[i])
-
-        # Restore curr dir
-        os.chdir(retval)
-        if num_to_remove:
-            pass
-            # log.info("Settings Backed Up ({} removed): {}".format(num_to_remove, timestamp))
-        else:
-            pass
-            # log.info("Settings Backed Up: {}".format(timestamp))
-        await asyncio.sleep(self.backup_interval)
+        try:
+            await self.flush()
+        except Exception as e:
+            self.bot.dispatch("error", "loop_error", tb=utils.traceback_maker(e))
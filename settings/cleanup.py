@@ -1,95 +1,226 @@
 # Module for deleting useless entries in postgres
+import time
+import asyncio
 import logging
 
 from . import database
+from utilities import utils
 
 log = logging.getLogger("INFO_LOGGER")
 
-conn = database.postgres
-
-
-async def basic_cleanup(guilds):
-    query = "SELECT server_id FROM servers"
-    await find_discrepancy(query, guilds)
-
-
-async def find_discrepancy(query, guilds):
-    server_list = [x.id for x in guilds]
-    records = await conn.fetch(query)
-    for record in records:
-        server_id = record["server_id"]
-        if server_id not in server_list:
-            await destroy_server(server_id)
-
-
-async def purge_discrepancies(guilds):
-    print("Running purge_discrepancies(guilds)")
-    query = "SELECT server_id FROM servers"
-    await find_discrepancy(query, guilds)
-    print(f"{query.split()[-1]}_query")
-
-    query = "SELECT server_id FROM prefixes"
-    await find_discrepancy(query, guilds)
-    print(f"{query.split()[-1]}_query")
-
-    query = "SELECT server_id FROM logs"
-    await find_discrepancy(query, guilds)
-    print(f"{query.split()[-1]}_query")
-
-    query = "SELECT server_id FROM log_data"
-    await find_discrepancy(query, guilds)
-    print(f"{query.split()[-1]}_query")
-
-    query = "SELECT server_id FROM warn"
-    await find_discrepancy(query, guilds)
-    print(f"{query.split()[-1]}_query")
-
-    query = "SELECT server_id FROM invites"
-    await find_discrepancy(query, guilds)
-    print(f"{query.split()[-1]}_query")
-
-    query = "SELECT server_id FROM emojistats"
-    await find_discrepancy(query, guilds)
-    print(f"{query.split()[-1]}_query")
-
-    query = "SELECT server_id FROM messages"
-    await find_discrepancy(query, guilds)
-    print(f"{query.split()[-1]}_query")
-
-    query = "SELECT server_id FROM usernicks"
-    await find_discrepancy(query, guilds)
-    print(f"{query.split()[-1]}_query")
-
-    query = "SELECT server_id FROM userroles"
-    await find_discrepancy(query, guilds)
-    print(f"{query.split()[-1]}_query")
-
-
-async def destroy_server(guild_id):
-    """Delete all records of a server from the db"""
-
-    query = "DELETE FROM servers WHERE server_id = $1"
-    await conn.execute(query, guild_id)
-
-    query = "DELETE FROM prefixes WHERE server_id = $1"
-    await conn.execute(query, guild_id)
-
-    query = "DELETE FROM warn WHERE server_id = $1"
-    await conn.execute(query, guild_id)
-
-    query = "DELETE FROM invites WHERE server_id = $1"
-    await conn.execute(query, guild_id)
-
-    query = "DELETE FROM emojistats WHERE server_id = $1"
-    await conn.execute(query, guild_id)
-
-    query = "DELETE FROM messages WHERE server_id = $1"
-    await conn.execute(query, guild_id)
-
-    query = "DELETE FROM usernicks WHERE server_id = $1"
-    await conn.execute(query, guild_id)
-
-    query = "DELETE FROM userroles WHERE server_id = $1"
-    await conn.execute(query, guild_id)
-
-    log.info(f"Destroyed server [{guild_id}]")
+conn = database.ingest
+
+# table: expression holding the server id of a row. servers is last
+# so a purge or teardown that stops early finds the server next time.
+GUILD_TABLES = {
+    "prefixes": "server_id",
+    "logs": "server_id",
+    "log_data": "server_id",
+    "command_config": "server_id",
+    "plonks": "server_id",
+    "lockedchannels": "server_id",
+    "warn": "server_id",
+    "invites": "server_id",
+    "emojistats": "server_id",
+    "messages": "server_id",
+    "dailymessages": "server_id",
+    "word_counts": "server_id",
+    "commands": "server_id",
+    "hourlycommands": "server_id",
+    "usernicks": "server_id",
+    "userroles": "server_id",
+    # Every timer event is created with the server as its first argument.
+    "tasks": "(extra->'args'->>0)::BIGINT",
+    "servers": "server_id",
+}
+
+# table: primary key of the partitioned tables. A ctid is only unique
+# within one partition, so their chunks are picked by key instead.
+PARTITION_KEYS = {
+    "messages": "index, unix",
+}
+
+# Commands run in direct messages are counted under server 0.
+DM_SERVER_ID = 0
+
+
+class PurgeProgress:
+    def __init__(self):
+        self.running = False
+        self.table = None
+        self.tables = 0  # Tables finished
+        self.servers = 0  # Orphaned servers found, counted per table
+        self.rows = 0
+        self.started = None
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def throughput(self):
+        """Rows deleted per second."""
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+progress = PurgeProgress()
+
+
+async def find_orphans(table, live):
+    """Servers with rows in table that are not in the live ids."""
+    column = GUILD_TABLES[table]
+    query = f"""
+            SELECT DISTINCT {column}
+            FROM {table}
+            WHERE {column} <> ALL($1::BIGINT[]);
+            """
+    return [record[0] for record in await conn.fetch(query, live)]
+
+
+async def delete_chunk(con, table, server_id, chunk):
+    """Delete up to chunk rows of a server from table and return the count."""
+    column = GUILD_TABLES[table]
+    key = PARTITION_KEYS.get(table)
+    if key is None:
+        query = f"""
+                DELETE FROM {table}
+                WHERE {column} = $1
+                AND ctid = ANY(ARRAY(
+                    SELECT ctid
+                    FROM {table}
+                    WHERE {column} = $1
+                    LIMIT $2
+                ));
+                """
+    else:
+        query = f"""
+                DELETE FROM {table}
+                WHERE {column} = $1
+                AND ({key}) IN (
+                    SELECT {key}
+                    FROM {table}
+                    WHERE {column} = $1
+                    LIMIT $2
+                );
+                """
+    status = await con.execute(query, server_id, chunk)
+    return int(status.split()[-1])
+
+
+def live_ids(bot):
+    return [guild.id for guild in bot.guilds] + [DM_SERVER_ID]
+
+
+async def purge_orphans(bot, *, chunk=5000, pause=0.05):
+    """
+    Delete the rows of every server the bot is no longer in.
+    Orphans are found per table with one query against the live
+    guild ids and deleted in chunks, sleeping pause seconds
+    between chunks so the writers keep up. The live ids are
+    read again for every table and each server is checked
+    before every chunk, so one joined mid purge is kept.
+    """
+    global progress
+    if progress.running:
+        return progress
+    if not bot.guilds:  # Never purge before the guilds are known
+        return progress
+
+    progress = PurgeProgress()
+    progress.running = True
+    progress.started = time.time()
+    try:
+        for table in GUILD_TABLES:
+            progress.table = table
+            orphans = await find_orphans(table, live_ids(bot))
+            progress.servers += len(orphans)
+            rows = progress.rows
+            for server_id in orphans:
+                deleted = chunk
+                while deleted >= chunk and bot.get_guild(server_id) is None:
+                    deleted = await delete_chunk(conn, table, server_id, chunk)
+                    progress.rows += deleted
+                    await asyncio.sleep(pause)
+            progress.tables += 1
+            if orphans:
+                log.info(
+                    f"Purged {progress.rows - rows} rows of {len(orphans)} "
+                    f"orphaned servers from {table} "
+                    f"({progress.throughput:.0f} rows/s)."
+                )
+    except Exception as e:
+        bot.dispatch("error", "loop_error", tb=utils.traceback_maker(e))
+        return progress
+    finally:
+        progress.running = False
+        progress.table = None
+        progress.finished = time.time()
+    log.info(
+        f"Orphan purge finished: {progress.rows} rows in {progress.elapsed:.1f}s "
+        f"({progress.throughput:.0f} rows/s)."
+    )
+    return progress
+
+
+async def enqueue_teardown(server_id):
+    """Queue the deletion of every row of a server."""
+    query = """
+            INSERT INTO teardowns (server_id)
+            VALUES ($1)
+            ON CONFLICT DO NOTHING;
+            """
+    await conn.execute(query, server_id)
+
+
+async def cancel_teardown(server_id):
+    """Keep what is left of a server that the bot joined again."""
+    query = """
+            DELETE FROM teardowns
+            WHERE server_id = $1;
+            """
+    await conn.execute(query, server_id)
+
+
+async def teardown(chunk=5000):
+    """
+    Delete one chunk of the oldest queued server in its own
+    transaction. The tables a server is done with are kept on
+    its job so a restart picks up where it stopped. Returns
+    False once the queue is empty.
+    """
+    async with conn.acquire() as con:
+        async with con.transaction():
+            query = """
+                    SELECT server_id, done
+                    FROM teardowns
+                    ORDER BY queued
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED;
+                    """
+            job = await con.fetchrow(query)
+            if job is None:
+                return False
+            server_id = job["server_id"]
+            table = next((t for t in GUILD_TABLES if t not in job["done"]), None)
+            if table is None:
+                query = """
+                        DELETE FROM teardowns
+                        WHERE server_id = $1
+                        RETURNING deleted;
+                        """
+                deleted = await con.fetchval(query, server_id)
+                log.info(f"Destroyed server [{server_id}] ({deleted} rows)")
+                return True
+
+            deleted = await delete_chunk(con, table, server_id, chunk)
+            query = """
+                    UPDATE teardowns
+                    SET deleted = deleted + $2,
+                    done = CASE WHEN $3 THEN ARRAY_APPEND(done, $4) ELSE done END
+                    WHERE server_id = $1;
+                    """
+            await con.execute(query, server_id, deleted, deleted < chunk, table)
+    return True
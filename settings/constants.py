@@ -20,6 +20,11 @@ except KeyError as e:
           Add this key or the bot might not function properly.
           """
     )
+batch_sink = config.get("batch_sink", "copy")  # copy|json
+flush_policies = config.get("flush_policies", {})  # {buffer: {max_rows: ...}}
+message_retention = config.get("message_retention", None)  # months, None keeps all
+retention_action = config.get("retention_action", "detach")  # detach|drop
+pools = config.get("pools", {})  # {ingest|interactive|analytics: {dsn: ...}}
 avatars = {
     "red": "https://cdn.discordapp.com/attachments/846597178918436885/847339918216658984/red.png",
     "orange": "https://cdn.discordapp.com/attachments/846597178918436885/847342151238811648/orange.png",
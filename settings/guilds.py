@@ -0,0 +1,168 @@
+# Module for the cached configuration of every server
+
+# Columns of the logs table, one per event that can be logged.
+LOG_EVENTS = (
+    "channels",
+    "emojis",
+    "invites",
+    "joins",
+    "messages",
+    "moderation",
+    "users",
+    "roles",
+    "server",
+    "voice",
+)
+
+
+dirty = set()  # server_ids changed since settings/cache.py last wrote them
+
+
+def take_dirty():
+    """Return the changed server_ids and start a new set."""
+    global dirty
+    changed, dirty = dirty, set()
+    return changed
+
+
+def split(value, kind=str):
+    """Parse a comma separated servers column into a frozenset."""
+    if not value:
+        return frozenset()
+    return frozenset(kind(item) for item in value.split(",") if item)
+
+
+def join(values):
+    """Store a frozenset back into a comma separated column."""
+    return ",".join(str(value) for value in sorted(values)) or None
+
+
+class GuildConfig:
+    """
+    Everything the bot keeps in memory about a server's settings.
+    The collections are frozensets, so a change assigns a new set
+    instead of mutating one another coroutine may be reading,
+    and every change passes through __setattr__ to be marked dirty.
+    prefixes is None until a server sets custom prefixes and
+    log_events is None while logging is disabled.
+    """
+
+    __slots__ = (
+        "server_id",
+        "prefixes",
+        "profanities",
+        "autoroles",
+        "disabled_commands",
+        "admin_allow",
+        "react",
+        "antiinvite",
+        "reassign",
+        "ignored",
+        "log_events",
+        "log_ignored",
+    )
+
+    def __init__(
+        self,
+        server_id,
+        *,
+        prefixes=None,
+        profanities=frozenset(),
+        autoroles=frozenset(),
+        disabled_commands=frozenset(),
+        admin_allow=True,
+        react=True,
+        antiinvite=False,
+        reassign=True,
+        ignored=frozenset(),
+        log_events=None,
+        log_ignored=frozenset(),
+    ):
+        self.server_id = server_id
+        self.prefixes = prefixes
+        self.profanities = profanities
+        self.autoroles = autoroles
+        self.disabled_commands = disabled_commands
+        self.admin_allow = admin_allow
+        self.react = react
+        self.antiinvite = antiinvite
+        self.reassign = reassign
+        self.ignored = ignored
+        self.log_events = log_events
+        self.log_ignored = log_ignored
+
+    def __repr__(self):
+        return f"<GuildConfig server_id={self.server_id}>"
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        dirty.add(self.server_id)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a config saved with to_dict."""
+        config = cls(data["server_id"])
+        for name in cls.__slots__[1:]:
+            value = data.get(name, getattr(config, name))
+            if isinstance(value, list):
+                value = tuple(value) if name == "prefixes" else frozenset(value)
+            setattr(config, name, value)
+        return config
+
+    def update(self, record):
+        """Set the columns of a servers table record."""
+        self.profanities = split(record["profanities"])
+        self.autoroles = split(record["autoroles"], int)
+        self.disabled_commands = split(record["disabled_commands"])
+        self.admin_allow = record["admin_allow"]
+        self.react = record["react"]
+        self.antiinvite = record["antiinvite"]
+        self.reassign = record["reassign"]
+
+    def update_logs(self, record):
+        """Set the enabled events from a logs table record."""
+        self.log_events = frozenset(event for event in LOG_EVENTS if record[event])
+
+    def to_dict(self):
+        data = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if isinstance(value, frozenset):
+                value = sorted(value)
+            elif isinstance(value, tuple):
+                value = list(value)
+            data[name] = value
+        return data
+
+
+class GuildConfigs(dict):
+    """server_id: GuildConfig, creating the defaults on first lookup."""
+
+    def __missing__(self, server_id):
+        config = self[server_id] = GuildConfig(server_id)
+        return config
+
+    # Adding or removing a server marks it dirty as well.
+
+    def __setitem__(self, server_id, config):
+        super().__setitem__(server_id, config)
+        dirty.add(server_id)
+
+    def __delitem__(self, server_id):
+        super().__delitem__(server_id)
+        dirty.add(server_id)
+
+    def pop(self, server_id, *default):
+        dirty.add(server_id)
+        return super().pop(server_id, *default)
+
+    def clear(self):
+        dirty.update(self)
+        super().clear()
+
+    def update(self, *args, **kwargs):
+        for server_id, config in dict(*args, **kwargs).items():
+            self[server_id] = config
+
+
+configs = GuildConfigs()
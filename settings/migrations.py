@@ -0,0 +1,211 @@
+# Module for applying versioned schema migrations
+import os
+import re
+import sys
+import time
+import hashlib
+import logging
+
+log = logging.getLogger("INFO_LOGGER")
+
+MIGRATION_FOLDER = "./data/migrations"
+MIGRATION_REGEX = re.compile(r"^(\d+)_(\w+)\.sql$")
+NO_TRANSACTION = "-- migrate: no-transaction"
+CONCURRENT_INDEX_REGEX = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)",
+    re.IGNORECASE,
+)
+
+# Key of the postgres advisory lock held while migrating,
+# so several processes starting at once apply each file once.
+LOCK_KEY = 0x536E6F77  # "Snow"
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Migration:
+    """A migration file, only read once load() is called."""
+
+    __slots__ = ("version", "name", "path", "sql", "checksum")
+
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        self.sql = None
+        self.checksum = None
+
+    def load(self):
+        if self.sql is None:
+            with open(self.path, "r", encoding="utf-8") as fp:
+                self.sql = fp.read()
+            self.checksum = hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+        return self
+
+    def __repr__(self):
+        return f"<Migration {self.version:04d}_{self.name}>"
+
+    @property
+    def transactional(self):
+        return not self.sql.lstrip().startswith(NO_TRANSACTION)
+
+
+def discover(folder=MIGRATION_FOLDER):
+    """Return every migration file in version order, unread."""
+    migrations = {}
+    for filename in sorted(os.listdir(folder)):
+        match = MIGRATION_REGEX.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Duplicate migration version {version}")
+        migrations[version] = Migration(
+            version, match.group(2), os.path.join(folder, filename)
+        )
+    return [migrations[version] for version in sorted(migrations)]
+
+
+async def ensure_table(con):
+    query = """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                checksum TEXT NOT NULL,
+                execution_ms REAL,
+                applied_at TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'UTC')
+            );
+            """
+    await con.execute(query)
+
+
+async def applied(con):
+    query = """
+            SELECT version, checksum
+            FROM schema_migrations;
+            """
+    return dict(await con.fetch(query))
+
+
+async def plan(con, migrations):
+    """
+    Return the migrations that still have to be applied.
+    Raises MigrationError when an applied file was edited.
+    """
+    done = await applied(con)
+    for migration in migrations:
+        migration.load()
+        checksum = done.get(migration.version)
+        if checksum is not None and checksum != migration.checksum:
+            raise MigrationError(
+                f"{migration!r} was changed after it was applied, "
+                "add a new migration instead."
+            )
+    return [migration for migration in migrations if migration.version not in done]
+
+
+async def apply(con, migration):
+    st = time.time()
+    query = """
+            INSERT INTO schema_migrations (version, name, checksum, execution_ms)
+            VALUES ($1, $2, $3, $4);
+            """
+    if migration.transactional:
+        async with con.transaction():
+            await con.execute(migration.sql)
+            elapsed = (time.time() - st) * 1000
+            await con.execute(
+                query, migration.version, migration.name, migration.checksum, elapsed
+            )
+    else:  # CREATE INDEX CONCURRENTLY and friends
+        for statement in statements(migration.sql):
+            await drop_invalid_index(con, statement)
+            await con.execute(statement)
+        elapsed = (time.time() - st) * 1000
+        await con.execute(
+            query, migration.version, migration.name, migration.checksum, elapsed
+        )
+    log.info(f"Applied {migration!r} in {elapsed:.0f}ms")
+
+
+async def drop_invalid_index(con, statement):
+    """
+    A failed CREATE INDEX CONCURRENTLY leaves an invalid index
+    behind, which IF NOT EXISTS would skip on the next attempt.
+    Drop it so the statement builds it again.
+    """
+    match = CONCURRENT_INDEX_REGEX.search(statement)
+    if not match:
+        return
+    query = """
+            SELECT indexrelid::REGCLASS::TEXT
+            FROM pg_index
+            WHERE indexrelid = TO_REGCLASS($1)
+            AND NOT indisvalid;
+            """
+    index = await con.fetchval(query, match.group(1))
+    if index is not None:
+        log.warning(f"Rebuilding invalid index {index}")
+        await con.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index};")
+
+
+def statements(sql):
+    """Split a script on semicolons at the end of a line."""
+    return [
+        statement.strip()
+        for statement in re.split(r";\s*$", sql, flags=re.MULTILINE)
+        if statement.strip()
+        and not all(
+            line.strip().startswith("--") or not line.strip()
+            for line in statement.splitlines()
+        )
+    ]
+
+
+async def migrate(pool, *, dry_run=False, folder=MIGRATION_FOLDER):
+    """
+    Apply every pending migration in order and return them.
+    When the newest file is already applied nothing else is
+    read or checksummed. With dry_run the pending migrations
+    are only returned.
+    """
+    migrations = discover(folder)
+    if not migrations:
+        return []
+    async with pool.acquire() as con:
+        await con.execute("SELECT pg_advisory_lock($1);", LOCK_KEY)
+        try:
+            await ensure_table(con)
+            query = """
+                    SELECT MAX(version)
+                    FROM schema_migrations;
+                    """
+            latest = await con.fetchval(query)
+            if latest == migrations[-1].version and not dry_run:
+                return []
+            pending = await plan(con, migrations)
+            if dry_run:
+                return pending
+            for migration in pending:
+                await apply(con, migration)
+        finally:
+            await con.execute("SELECT pg_advisory_unlock($1);", LOCK_KEY)
+    return pending
+
+
+if __name__ == "__main__":
+    # python -m settings.migrations [--dry-run]
+    import asyncio
+
+    from settings import database
+
+    dry_run = "--dry-run" in sys.argv
+    pending = asyncio.get_event_loop().run_until_complete(
+        migrate(database.ingest, dry_run=dry_run)
+    )
+    action = "Pending" if dry_run else "Applied"
+    print(f"{action} migrations: {len(pending)}")
+    for migration in pending:
+        print(f"  {migration.version:04d}  {migration.name}  {migration.checksum[:12]}")
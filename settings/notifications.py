@@ -0,0 +1,180 @@
+# Module for keeping the settings cache of every bot process in sync
+import asyncio
+import asyncpg
+import logging
+
+from . import constants, database, guilds, queries
+
+log = logging.getLogger("INFO_LOGGER")
+
+# Channel the notify_config trigger from migration 0013 notifies
+# with '<server_id>:<table>:<version>' on every settings write.
+CHANNEL = "snowbot_config"
+CHECK_INTERVAL = 60  # Seconds between checks for missed notifications
+
+
+def parse(payload):
+    server_id, section, version = payload.split(":")
+    return int(server_id), section, int(version)
+
+
+async def refresh_servers(config):
+    record = await queries.load_server(config.server_id)
+    if record is None:  # Row deleted, fall back to the defaults
+        database.settings.pop(config.server_id, None)
+    else:
+        config.update(record)
+
+
+async def refresh_prefixes(config):
+    record = await queries.load_server_prefixes(config.server_id)
+    config.prefixes = tuple(record.prefix_list) if record else None
+
+
+async def refresh_plonks(config):
+    entities = await queries.load_server_plonks(config.server_id)
+    config.ignored = frozenset(entities or ())
+
+
+async def refresh_logs(config):
+    record = await queries.load_server_logs(config.server_id)
+    if record is None:
+        config.log_events = None
+    else:
+        config.update_logs(record)
+
+
+async def refresh_log_data(config):
+    entities = await queries.load_server_log_ignored(config.server_id)
+    config.log_ignored = frozenset(entities or ())
+
+
+# table: coroutine reloading the part of a GuildConfig stored in it.
+# command_config is not cached here, the Config cog reloads it
+# when the config_update event is dispatched.
+SECTIONS = {
+    "servers": refresh_servers,
+    "prefixes": refresh_prefixes,
+    "plonks": refresh_plonks,
+    "logs": refresh_logs,
+    "log_data": refresh_log_data,
+}
+
+
+class ConfigListener:
+    """
+    Listens on a dedicated connection for settings written by
+    any process and reloads only the section that changed.
+    Pooled connections can't be used since asyncpg runs UNLISTEN
+    when they are released. Versions are handed out in commit
+    order, so a skipped version or a dropped connection means a
+    notification was missed and the whole cache is reloaded.
+    """
+
+    def __init__(self):
+        self.bot = None
+        self.connection = None
+        self.queue = asyncio.Queue()
+        self.version = 0  # Last version applied to the cache
+        self.received = 0  # Highest version notified
+        self.applied = 0
+        self.reloads = 0
+        self.tasks = []
+
+    async def start(self, bot):
+        # The tasks start first so a failed load is retried by check().
+        self.bot = bot
+        self.tasks = [
+            bot.loop.create_task(self.work()),
+            bot.loop.create_task(self.check()),
+        ]
+        await self.connect()
+        await self.reload()
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        if self.connection is not None and not self.connection.is_closed():
+            await self.connection.close()
+
+    async def connect(self):
+        try:
+            self.connection = await asyncpg.connect(constants.postgres)
+            await self.connection.add_listener(CHANNEL, self.receive)
+        except Exception as e:
+            self.connection = None
+            log.warning(f"Unable to listen for settings changes: {e}")
+
+    def receive(self, connection, pid, channel, payload):
+        try:
+            self.received = max(self.received, parse(payload)[2])
+        except ValueError:
+            log.warning(f"Ignoring malformed settings notification {payload!r}")
+            return
+        self.queue.put_nowait(payload)
+
+    async def reload(self):
+        # Read the version first, anything committed after
+        # it is notified again and applied on top.
+        version = await queries.config_version()
+        registry = guilds.GuildConfigs()
+        await database.load_settings(registry)
+        database.settings.clear()  # Swapped in place, bot.server_settings
+        database.settings.update(registry)  # refers to the same dict.
+        self.version = max(self.version, version)
+        self.received = max(self.received, version)
+        self.reloads += 1
+        self.bot.dispatch("config_update", None, None)
+
+    async def apply(self, payload):
+        if payload is None:
+            return await self.reload()
+        server_id, section, version = parse(payload)
+        if version <= self.version:
+            return  # Already part of a reload.
+        if version > self.version + 1:
+            log.warning(
+                f"Missed settings versions {self.version + 1}-{version - 1}, reloading."
+            )
+            return await self.reload()
+        self.version = version
+        if self.bot.get_guild(server_id) is None:
+            return  # Served by another process.
+        refresh = SECTIONS.get(section)
+        if refresh is not None:
+            await refresh(database.settings[server_id])
+        self.applied += 1
+        self.bot.dispatch("config_update", server_id, section)
+
+    async def work(self):
+        while True:
+            payload = await self.queue.get()
+            try:
+                await self.apply(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"Unable to apply settings change {payload!r}: {e}")
+                await asyncio.sleep(1)
+                self.queue.put_nowait(None)  # Reload to get back in sync
+
+    async def check(self):
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL)
+            try:
+                if self.connection is None or self.connection.is_closed():
+                    await self.connect()
+                    if self.connection is not None:
+                        self.queue.put_nowait(None)
+                elif not self.reloads:  # Never loaded, running on a backup
+                    self.queue.put_nowait(None)
+                elif await queries.config_version() > self.received:
+                    self.queue.put_nowait(None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"Unable to check the settings version: {e}")
+
+
+listener = ConfigListener()
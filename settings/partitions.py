@@ -0,0 +1,243 @@
+# Module for managing the monthly partitions of the messages table
+import re
+import time
+import asyncpg
+import calendar
+import logging
+
+from . import database
+
+log = logging.getLogger("INFO_LOGGER")
+
+conn = database.ingest
+
+PARTITION_REGEX = re.compile(r"^messages_(\d{4})_(\d{2})$")
+LEGACY = "messages_legacy"
+# Whether messages_legacy may still exist, cleared once it's gone.
+legacy = True
+COLUMNS = (
+    "index, unix, timestamp, content, message_id, "
+    "author_id, channel_id, server_id, deleted, edited"
+)
+
+
+def shift(year, month, months):
+    index = year * 12 + (month - 1) + months
+    return index // 12, index % 12 + 1
+
+
+def bounds(year, month):
+    """The [start, end) unix range of a month."""
+    start = calendar.timegm((year, month, 1, 0, 0, 0))
+    end = calendar.timegm((*shift(year, month, 1), 1, 0, 0, 0))
+    return start, end
+
+
+def partition_name(year, month):
+    return f"messages_{year:04d}_{month:02d}"
+
+
+def current_month():
+    now = time.gmtime()
+    return now.tm_year, now.tm_mon
+
+
+async def is_partitioned():
+    query = """
+            SELECT relkind = 'p'
+            FROM pg_class
+            WHERE oid = to_regclass('messages');
+            """
+    return await conn.fetchval(query)
+
+
+async def partitions():
+    """Return {(year, month): name} for every attached monthly partition."""
+    query = """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = 'messages'::regclass;
+            """
+    months = {}
+    for (name,) in await conn.fetch(query):
+        match = PARTITION_REGEX.match(name)
+        if match:
+            months[(int(match.group(1)), int(match.group(2)))] = name
+    return months
+
+
+async def create_partition(year, month, con=conn):
+    start, end = bounds(year, month)
+    name = partition_name(year, month)
+    query = f"""
+            CREATE TABLE IF NOT EXISTS {name}
+            PARTITION OF messages
+            FOR VALUES FROM ({start}) TO ({end});
+            """
+    try:
+        await con.execute(query)
+    except Exception as e:
+        # Rows for this month already sit in the default partition.
+        log.warning(f"Could not create partition {name}: {e}")
+        return False
+    return True
+
+
+async def convert():
+    """
+    Swap an unpartitioned messages table for a partitioned one.
+    The old table is renamed to messages_legacy and its rows
+    are moved over in chunks by backfill() afterwards.
+    """
+    global legacy
+    if await is_partitioned() is not False:
+        return False
+    async with conn.acquire() as con:
+        async with con.transaction():
+            oldest = await con.fetchval("SELECT MIN(unix) FROM messages;")
+            # unix is the partition key, so it's widened from REAL.
+            # Single precision rounds to minutes, which would move
+            # month bounds and the rows near them across partitions.
+            await con.execute(f"""
+                ALTER TABLE messages RENAME TO {LEGACY};
+                ALTER INDEX IF EXISTS messages_pkey RENAME TO {LEGACY}_pkey;
+                ALTER INDEX IF EXISTS messages_message_id_idx
+                RENAME TO {LEGACY}_message_id_idx;
+
+                CREATE TABLE messages (
+                    index BIGSERIAL,
+                    unix DOUBLE PRECISION,
+                    timestamp TIMESTAMP,
+                    content TEXT,
+                    message_id BIGINT,
+                    author_id BIGINT,
+                    channel_id BIGINT,
+                    server_id BIGINT,
+                    deleted BOOLEAN DEFAULT False,
+                    edited BOOLEAN DEFAULT False,
+                    PRIMARY KEY (index, unix)
+                ) PARTITION BY RANGE (unix);
+
+                CREATE TABLE messages_default PARTITION OF messages DEFAULT;
+                CREATE INDEX messages_message_id_idx ON messages(message_id);
+
+                SELECT setval(
+                    pg_get_serial_sequence('messages', 'index'),
+                    (SELECT COALESCE(MAX(index), 0) + 1 FROM {LEGACY}),
+                    false
+                );
+                """)
+            # Every month the legacy rows span needs a partition
+            # before any new rows can land in the default one.
+            year, month = current_month()
+            if oldest is not None:
+                start = time.gmtime(oldest)
+                year, month = min((start.tm_year, start.tm_mon), (year, month))
+            while (year, month) <= current_month():
+                await create_partition(year, month, con)
+                year, month = shift(year, month, 1)
+    legacy = True
+    log.info("Converted messages into a partitioned table.")
+    return True
+
+
+async def has_legacy():
+    return await conn.fetchval("SELECT to_regclass($1) IS NOT NULL;", LEGACY)
+
+
+async def mark_legacy(con, column, message_ids):
+    """
+    Set the deleted or edited flag of messages still in the
+    legacy table. Run before the same update of messages in
+    one transaction: a row the backfill is moving is locked,
+    so it is either updated here before the move or found
+    in its partition once the move commits.
+    """
+    global legacy
+    if not legacy:
+        return
+    query = f"""
+            UPDATE {LEGACY}
+            SET {column} = True
+            WHERE message_id = ANY($1::BIGINT[])
+            AND {column} = False;
+            """
+    try:
+        async with con.transaction():  # Dropped by the backfill meanwhile
+            await con.execute(query, message_ids)
+    except asyncpg.UndefinedTableError:
+        legacy = False
+
+
+async def backfill(chunk=5000):
+    """
+    Move one chunk of legacy rows into the partitioned table,
+    newest first so recent time windows are complete quickly.
+    Returns the number of rows moved, 0 once the legacy table
+    is empty and has been dropped.
+    """
+    global legacy
+    if not await has_legacy():
+        return 0
+    query = f"""
+            WITH moved AS (
+                DELETE FROM {LEGACY}
+                WHERE index IN (
+                    SELECT index FROM {LEGACY}
+                    ORDER BY index DESC
+                    LIMIT $1
+                )
+                RETURNING *
+            )
+            INSERT INTO messages ({COLUMNS})
+            SELECT {COLUMNS} FROM moved;
+            """
+    async with conn.acquire() as con:
+        async with con.transaction():
+            status = await con.execute(query, chunk)
+    moved = int(status.split()[-1])
+    if moved == 0:
+        await conn.execute(f"DROP TABLE IF EXISTS {LEGACY};")
+        legacy = False
+        log.info("Finished moving legacy messages into partitions.")
+    return moved
+
+
+async def expire(retention, action="detach"):
+    """
+    Detach or drop partitions older than retention months.
+    Detached partitions are left as plain tables.
+    """
+    cutoff = shift(*current_month(), -retention)
+    expired = []
+    for (year, month), name in sorted((await partitions()).items()):
+        if (year, month) >= cutoff:
+            break
+        if action == "drop":
+            await conn.execute(f"DROP TABLE {name};")
+        else:
+            await conn.execute(f"ALTER TABLE messages DETACH PARTITION {name};")
+        expired.append(name)
+    if expired:
+        log.info(f"Expired message partitions ({action}): {', '.join(expired)}")
+    return expired
+
+
+async def maintain(ahead=3, retention=None, action="detach"):
+    """
+    Convert the table if needed, create the partitions for
+    the next few months and expire the ones past retention.
+    """
+    await convert()
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT;"
+    )
+    existing = await partitions()
+    year, month = current_month()
+    for _ in range(ahead + 1):
+        if (year, month) not in existing:
+            await create_partition(year, month)
+        year, month = shift(year, month, 1)
+    if retention:
+        await expire(retention, action)
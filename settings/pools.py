@@ -0,0 +1,122 @@
+# Module for the connection pools the bot reads and writes through
+import time
+import asyncpg
+import contextlib
+
+from . import constants
+from .queries import Connection, QueryStats
+
+# Settings of each pool, overridden per pool by the "pools" key of
+# config.json. statement_timeout is in seconds, 0 never cancels.
+DEFAULTS = {
+    # Batch writers, rollups, partition upkeep and migrations.
+    "ingest": {"min_size": 2, "max_size": 4, "statement_timeout": 0},
+    # Command reads and writes that a user is waiting on.
+    "interactive": {"min_size": 2, "max_size": 10, "statement_timeout": 15},
+    # Long leaderboards, usage reports and the sql command.
+    "analytics": {"min_size": 1, "max_size": 3, "statement_timeout": 120},
+}
+
+# Pools that only ever read. Only these may set a dsn pointed at a
+# replica to keep their reads off the primary, the others write.
+READ_ONLY = ("analytics",)
+
+POOLS = {}  # name: Pool
+
+
+class Pool:
+    """
+    Wraps an asyncpg pool and times how long callers wait
+    for a connection and how long they hold it. Anything
+    not defined here is read from the asyncpg pool.
+    """
+
+    def __init__(self, name, pool, *, replica, max_size, statement_timeout):
+        self.name = name
+        self.pool = pool
+        self.replica = replica
+        self.max_size = max_size
+        self.statement_timeout = statement_timeout
+        self.in_use = 0
+        self.peak = 0
+        self.waiting = 0
+        self.saturated = 0  # Checkouts that found every connection taken
+        self.wait = QueryStats()
+        self.hold = QueryStats()
+
+    def __repr__(self):
+        return f"<Pool {self.name} in_use={self.in_use}/{self.max_size}>"
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+    @property
+    def saturation(self):
+        return self.in_use / self.max_size
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, *, timeout=None):
+        if self.in_use >= self.max_size:
+            self.saturated += 1
+        self.waiting += 1
+        st = time.perf_counter()
+        try:
+            con = await self.pool.acquire(timeout=timeout)
+        except Exception:
+            self.wait.errors += 1
+            raise
+        finally:
+            self.waiting -= 1
+        checkout = time.perf_counter()
+        self.wait.observe(checkout - st)
+        self.in_use += 1
+        self.peak = max(self.peak, self.in_use)
+        try:
+            yield con
+        finally:
+            self.in_use -= 1
+            self.hold.observe(time.perf_counter() - checkout)
+            await self.pool.release(con)
+
+    async def execute(self, query, *args, timeout=None):
+        async with self.acquire() as con:
+            return await con.execute(query, *args, timeout=timeout)
+
+    async def executemany(self, query, args, *, timeout=None):
+        async with self.acquire() as con:
+            return await con.executemany(query, args, timeout=timeout)
+
+    async def fetch(self, query, *args, timeout=None):
+        async with self.acquire() as con:
+            return await con.fetch(query, *args, timeout=timeout)
+
+    async def fetchval(self, query, *args, column=0, timeout=None):
+        async with self.acquire() as con:
+            return await con.fetchval(query, *args, column=column, timeout=timeout)
+
+    async def fetchrow(self, query, *args, timeout=None):
+        async with self.acquire() as con:
+            return await con.fetchrow(query, *args, timeout=timeout)
+
+
+async def create(name):
+    """Create the pool called name from its settings and register it."""
+    options = {**DEFAULTS[name], **constants.pools.get(name, {})}
+    dsn = options.pop("dsn", None) or constants.postgres
+    if dsn != constants.postgres and name not in READ_ONLY:
+        raise ValueError(f"The {name} pool writes and must use the primary")
+    statement_timeout = options.pop("statement_timeout")
+    pool = await asyncpg.create_pool(
+        dsn,
+        connection_class=Connection,
+        server_settings={"statement_timeout": str(int(statement_timeout * 1000))},
+        **options,
+    )
+    POOLS[name] = Pool(
+        name,
+        pool,
+        replica=dsn != constants.postgres,
+        max_size=options["max_size"],
+        statement_timeout=statement_timeout,
+    )
+    return POOLS[name]
@@ -0,0 +1,1537 @@
+# Module for the named queries the cogs run
+# Left inline are statements built at runtime or run through a caller's
+# connection: the migrations, partition, rollup and cleanup upkeep and
+# the bulk startup inserts in settings/, the schema and sql owner
+# commands, the timers in cogs/tasks.py and the testing cog.
+import time
+import bisect
+import asyncpg
+
+from . import guilds
+from .sinks import connection
+
+# Upper bounds of the latency histogram buckets in milliseconds.
+BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+QUERIES = {}  # name: Query
+pools = {}  # Bound by settings/database.py once the pools exist
+
+
+def bind(registry):
+    global pools
+    pools = registry
+
+
+class Record(asyncpg.Record):
+    """A record whose columns can also be read as attributes."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+class Connection(asyncpg.Connection):
+    """Keeps the statements prepared on this connection by query name."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements = {}
+
+
+class QueryStats:
+    __slots__ = ("calls", "errors", "total", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.histogram = [0] * len(BUCKETS)
+
+    def observe(self, elapsed):
+        self.calls += 1
+        self.total += elapsed
+        self.histogram[bisect.bisect_left(BUCKETS, elapsed * 1000)] += 1
+
+    @property
+    def average(self):
+        return self.total / self.calls if self.calls else 0.0
+
+    def percentile(self, q):
+        """Upper bound in seconds of the bucket holding the q-th percentile."""
+        if not self.calls:
+            return 0.0
+        rank = q * self.calls
+        seen = 0
+        for bound, count in zip(BUCKETS, self.histogram):
+            seen += count
+            if seen >= rank:
+                return bound / 1000
+        return BUCKETS[-2] / 1000
+
+
+class Query:
+    """
+    A named statement.
+    Calling it runs the statement with method on a connection
+    from its pool, or on con when the caller holds one. It is
+    prepared the first time it runs on each connection.
+    """
+
+    def __init__(self, name, sql, method, pool):
+        self.name = name
+        self.sql = sql
+        self.method = method
+        self.pool = pool
+        self.stats = QueryStats()
+
+    def __repr__(self):
+        return f"<Query {self.name}>"
+
+    async def prepare(self, con):
+        statement = con.statements.get(self.name)
+        if statement is None:
+            statement = await con.prepare(self.sql, record_class=Record)
+            con.statements[self.name] = statement
+        return statement
+
+    async def run(self, con, args):
+        statement = await self.prepare(con)
+        try:
+            return await self.call(statement, args)
+        except asyncpg.InvalidCachedStatementError:
+            # A migration changed a table the statement depends on.
+            del con.statements[self.name]
+            return await self.call(await self.prepare(con), args)
+
+    async def call(self, statement, args):
+        if self.method == "execute":
+            await statement.fetch(*args)
+            return statement.get_statusmsg()
+        return await getattr(statement, self.method)(*args)
+
+    async def __call__(self, *args, con=None):
+        st = time.perf_counter()
+        try:
+            async with connection(pools[self.pool], con) as con:
+                result = await self.run(con, args)
+        except Exception:
+            self.stats.errors += 1
+            raise
+        self.stats.observe(time.perf_counter() - st)
+        return result
+
+
+def register(name, sql, method="fetch", pool="interactive"):
+    if name in QUERIES:
+        raise ValueError(f"Query {name} is already registered")
+    QUERIES[name] = query = Query(name, sql, method, pool)
+    return query
+
+
+# Settings
+
+load_servers = register(
+    "load_servers",
+    """
+    SELECT server_id, prefix, profanities, autoroles, antiinvite,
+    reassign, disabled_commands, admin_allow, react
+    FROM servers;
+    """,
+)
+
+load_server = register(
+    "load_server",
+    """
+    SELECT server_id, prefix, profanities, autoroles, antiinvite,
+    reassign, disabled_commands, admin_allow, react
+    FROM servers
+    WHERE server_id = $1;
+    """,
+    "fetchrow",
+)
+
+load_prefixes = register(
+    "load_prefixes",
+    """
+    SELECT server_id, ARRAY_REMOVE(ARRAY_AGG(prefix), NULL) as prefix_list
+    FROM prefixes GROUP BY server_id;
+    """,
+)
+
+load_server_prefixes = register(
+    "load_server_prefixes",
+    """
+    SELECT server_id, ARRAY_REMOVE(ARRAY_AGG(prefix), NULL) as prefix_list
+    FROM prefixes WHERE server_id = $1 GROUP BY server_id;
+    """,
+    "fetchrow",
+)
+
+load_plonks = register(
+    "load_plonks",
+    """
+    SELECT server_id, ARRAY_AGG(entity_id) AS entities
+    FROM plonks GROUP BY server_id;
+    """,
+)
+
+load_logs = register(
+    "load_logs",
+    """
+    SELECT server_id, channels, emojis, invites, joins, messages,
+    moderation, users, roles, server, voice
+    FROM logs;
+    """,
+)
+
+load_log_ignored = register(
+    "load_log_ignored",
+    """
+    SELECT server_id, entities
+    FROM log_data;
+    """,
+)
+
+load_server_plonks = register(
+    "load_server_plonks",
+    """
+    SELECT ARRAY_AGG(entity_id)
+    FROM plonks WHERE server_id = $1;
+    """,
+    "fetchval",
+)
+
+load_server_logs = register(
+    "load_server_logs",
+    """
+    SELECT server_id, channels, emojis, invites, joins, messages,
+    moderation, users, roles, server, voice
+    FROM logs WHERE server_id = $1;
+    """,
+    "fetchrow",
+)
+
+load_server_log_ignored = register(
+    "load_server_log_ignored",
+    """
+    SELECT entities
+    FROM log_data WHERE server_id = $1;
+    """,
+    "fetchval",
+)
+
+config_version = register(
+    "config_version",
+    """
+    SELECT version
+    FROM config_version;
+    """,
+    "fetchval",
+)
+
+insert_config = register(
+    "insert_config",
+    """
+    INSERT INTO config
+    VALUES ($1)
+    ON CONFLICT (client_id)
+    DO NOTHING;
+    """,
+    "execute",
+)
+
+insert_server = register(
+    "insert_server",
+    """
+    INSERT INTO servers (server_id, server_name, owner_id)
+    VALUES ($1, $2, $3)
+    ON CONFLICT DO NOTHING;
+    """,
+    "execute",
+)
+
+# Bot config
+
+record_runtime = register(
+    "record_runtime",
+    """
+    UPDATE config SET last_run = $1,
+    runtime = runtime + $1
+    WHERE client_id = $2;
+    """,
+    "execute",
+)
+
+bot_status = register(
+    "bot_status",
+    """
+    SELECT (
+        activity,
+        presence,
+        status
+    )
+    FROM config
+    WHERE client_id = $1;
+    """,
+    "fetchval",
+)
+
+reboot_info = register(
+    "reboot_info",
+    """
+    SELECT (
+        reboot_invoker,
+        reboot_message_id,
+        reboot_channel_id
+    ) FROM config
+    WHERE client_id = $1;
+    """,
+    "fetchval",
+)
+
+set_presence = register(
+    "set_presence",
+    """
+    UPDATE config
+    SET presence = $1
+    WHERE client_id = $2;
+    """,
+    "execute",
+)
+
+set_status = register(
+    "set_status",
+    """
+    UPDATE config
+    SET status = $1
+    WHERE client_id = $2;
+    """,
+    "execute",
+)
+
+set_activity = register(
+    "set_activity",
+    """
+    UPDATE config
+    SET activity = $1
+    WHERE client_id = $2;
+    """,
+    "execute",
+)
+
+set_ownerlocked = register(
+    "set_ownerlocked",
+    """
+    UPDATE config
+    SET ownerlocked = $1
+    WHERE client_id = $2;
+    """,
+    "execute",
+)
+
+set_reboot_info = register(
+    "set_reboot_info",
+    """
+    UPDATE config SET
+    reboot_invoker = $2,
+    reboot_message_id = $3,
+    reboot_channel_id = $4
+    WHERE client_id = $1;
+    """,
+    "execute",
+)
+
+bump_version = register(
+    "bump_version",
+    """
+    UPDATE config
+    SET version = version + 0.1
+    WHERE client_id = $1;
+    """,
+    "execute",
+)
+
+bot_version = register(
+    "bot_version",
+    """
+    SELECT version
+    FROM config
+    WHERE client_id = $1;
+    """,
+    "fetchval",
+)
+
+bot_uptime = register(
+    "bot_uptime",
+    """
+    SELECT runtime, starttime, last_run
+    FROM config WHERE client_id = $1;
+    """,
+    "fetchrow",
+)
+
+delete_prefixes = register(
+    "delete_prefixes",
+    """
+    DELETE FROM prefixes
+    WHERE server_id = $1;
+    """,
+    "execute",
+)
+
+insert_prefixes = register(
+    "insert_prefixes",
+    """
+    INSERT INTO prefixes
+    SELECT $1, UNNEST($2::TEXT[]);
+    """,
+    "execute",
+)
+
+# Settings writes
+
+server_antiinvite = register(
+    "server_antiinvite",
+    """
+    SELECT antiinvite
+    FROM servers
+    WHERE server_id = $1;
+    """,
+    "fetchval",
+)
+
+set_antiinvite = register(
+    "set_antiinvite",
+    """
+    UPDATE servers
+    SET antiinvite = $1
+    WHERE server_id = $2;
+    """,
+    "execute",
+)
+
+set_autoroles = register(
+    "set_autoroles",
+    """
+    UPDATE servers
+    SET autoroles = $1
+    WHERE server_id = $2;
+    """,
+    "execute",
+)
+
+set_reassign = register(
+    "set_reassign",
+    """
+    UPDATE servers
+    SET reassign = $1
+    WHERE server_id = $2;
+    """,
+    "execute",
+)
+
+set_profanities = register(
+    "set_profanities",
+    """
+    UPDATE servers
+    SET profanities = $1
+    WHERE server_id = $2;
+    """,
+    "execute",
+)
+
+server_plonks = register(
+    "server_plonks",
+    """
+    SELECT entity_id
+    FROM plonks
+    WHERE server_id = $1;
+    """,
+)
+
+insert_plonk = register(
+    "insert_plonk",
+    """
+    INSERT INTO plonks (server_id, entity_id)
+    VALUES ($1, $2);
+    """,
+    "execute",
+)
+
+delete_plonks = register(
+    "delete_plonks",
+    """
+    DELETE FROM plonks
+    WHERE server_id = $1
+    AND entity_id = ANY($2::BIGINT[]);
+    """,
+    "execute",
+)
+
+clear_plonks = register(
+    "clear_plonks",
+    """
+    DELETE FROM plonks
+    WHERE server_id = $1;
+    """,
+    "execute",
+)
+
+load_command_config = register(
+    "load_command_config",
+    """
+    SELECT entity_id, ARRAY_AGG(command) AS commands
+    FROM command_config GROUP BY entity_id;
+    """,
+)
+
+server_command_config = register(
+    "server_command_config",
+    """
+    SELECT entity_id,
+    ARRAY_AGG(command) as commands
+    FROM command_config
+    WHERE server_id = $1
+    GROUP BY entity_id;
+    """,
+)
+
+insert_command_config = register(
+    "insert_command_config",
+    """
+    INSERT INTO command_config (server_id, entity_id, command)
+    VALUES ($1, $2, $3);
+    """,
+    "execute",
+)
+
+delete_command_config = register(
+    "delete_command_config",
+    """
+    DELETE FROM command_config
+    WHERE server_id = $1
+    AND entity_id = $2
+    AND command = ANY($3::TEXT[]);
+    """,
+    "execute",
+)
+
+clear_command_config = register(
+    "clear_command_config",
+    """
+    DELETE FROM command_config
+    WHERE server_id = $1;
+    """,
+    "execute",
+)
+
+# Logging
+
+load_log_data = register(
+    "load_log_data",
+    """
+    SELECT
+    d.server_id,
+    (SELECT ROW_TO_JSON(_) FROM (SELECT
+        d.channel_id,
+        d.webhook_id,
+        d.webhook_token
+    ) AS _) AS log_data
+    FROM log_data as d;
+    """,
+)
+
+load_server_log_data = register(
+    "load_server_log_data",
+    """
+    SELECT channel_id, webhook_id, webhook_token
+    FROM log_data
+    WHERE server_id = $1;
+    """,
+    "fetchrow",
+)
+
+insert_log_data = register(
+    "insert_log_data",
+    """
+    INSERT INTO log_data (server_id, channel_id, webhook_id, webhook_token)
+    VALUES ($1, $2, $3, $4);
+    """,
+    "execute",
+)
+
+delete_log_data = register(
+    "delete_log_data",
+    """
+    DELETE FROM log_data
+    WHERE server_id = $1;
+    """,
+    "execute",
+)
+
+# Every event defaults to enabled.
+insert_logs = register(
+    "insert_logs",
+    """
+    INSERT INTO logs (server_id)
+    VALUES ($1);
+    """,
+    "execute",
+)
+
+insert_disabled_logs = register(
+    "insert_disabled_logs",
+    f"""
+    INSERT INTO logs (server_id, {", ".join(guilds.LOG_EVENTS)})
+    VALUES ($1, {", ".join(["False"] * len(guilds.LOG_EVENTS))});
+    """,
+    "execute",
+)
+
+delete_logs = register(
+    "delete_logs",
+    """
+    DELETE FROM logs
+    WHERE server_id = $1;
+    """,
+    "execute",
+)
+
+# event: query setting whether server $2 logs it to $1.
+set_log_event = {
+    event: register(
+        f"set_log_{event}",
+        f"""
+        UPDATE logs
+        SET {event} = $1
+        WHERE server_id = $2;
+        """,
+        "execute",
+    )
+    for event in guilds.LOG_EVENTS
+}
+
+# Messages
+
+snipe = register(
+    "snipe",
+    """
+    SELECT author_id, message_id, content, timestamp
+    FROM messages
+    WHERE channel_id = $1
+    AND deleted = True
+    ORDER BY unix DESC
+    LIMIT 1;
+    """,
+    "fetchrow",
+)
+
+snipe_user = register(
+    "snipe_user",
+    """
+    SELECT author_id, message_id, content, timestamp
+    FROM messages
+    WHERE channel_id = $1
+    AND author_id = $2
+    AND deleted = True
+    ORDER BY unix DESC
+    LIMIT 1;
+    """,
+    "fetchrow",
+)
+
+editsnipe = register(
+    "editsnipe",
+    """
+    SELECT author_id, message_id, content, timestamp
+    FROM messages
+    WHERE channel_id = $1
+    AND edited = True
+    ORDER BY unix DESC
+    LIMIT 1;
+    """,
+    "fetchrow",
+)
+
+editsnipe_user = register(
+    "editsnipe_user",
+    """
+    SELECT author_id, message_id, content, timestamp
+    FROM messages
+    WHERE channel_id = $1
+    AND author_id = $2
+    AND edited = True
+    ORDER BY unix DESC
+    LIMIT 1;
+    """,
+    "fetchrow",
+)
+
+edit_author = register(
+    "edit_author",
+    """
+    SELECT author_id
+    FROM messages
+    WHERE message_id = $1
+    LIMIT 1;
+    """,
+    "fetchval",
+)
+
+# Keyset page of the messages in server $1 matching the search $2,
+# newest first. $3 lists the channels the invoker can read and the
+# optional filters are skipped when passed NULL or False. Rows come
+# from below (unix, index) ($9, $10), pass infinity for the first page.
+search_messages = register(
+    "search_messages",
+    """
+    SELECT index, unix, message_id, author_id, channel_id, content
+    FROM messages
+    WHERE server_id = $1
+    AND search @@ WEBSEARCH_TO_TSQUERY('simple', $2)
+    AND channel_id = ANY($3::BIGINT[])
+    AND ($4::BIGINT IS NULL OR author_id = $4)
+    AND ($5::FLOAT8 IS NULL OR unix >= $5)
+    AND ($6::FLOAT8 IS NULL OR unix < $6)
+    AND (NOT $7::BOOLEAN OR deleted)
+    AND (NOT $8::BOOLEAN OR edited)
+    AND (unix, index) < ($9::FLOAT8, $10::BIGINT)
+    ORDER BY unix DESC, index DESC
+    LIMIT $11;
+    """,
+)
+
+# Batch writes
+
+# Rows hold seconds already accumulated by the presence tracker.
+# Users first seen leaving a status also get the time since the
+# stored last_changed credited to that status.
+insert_statuses = register(
+    "insert_statuses",
+    """
+    INSERT INTO userstatus (user_id, online, idle, dnd, last_changed)
+    SELECT x.user_id,
+    SUM(x.online + CASE WHEN x.resumed = 'online' THEN x.gap ELSE 0 END),
+    SUM(x.idle + CASE WHEN x.resumed = 'idle' THEN x.gap ELSE 0 END),
+    SUM(x.dnd + CASE WHEN x.resumed = 'dnd' THEN x.gap ELSE 0 END),
+    MAX(x.last_changed)
+    FROM (
+        SELECT rows.*, GREATEST(
+            rows.resumed_until - COALESCE(
+                userstatus.last_changed, rows.resumed_until
+            ), 0
+        ) AS gap
+        FROM UNNEST(
+            $1::BIGINT[], $2::FLOAT8[], $3::FLOAT8[], $4::FLOAT8[],
+            $5::FLOAT8[], $6::TEXT[], $7::FLOAT8[]
+        ) AS rows(
+            user_id, online, idle, dnd,
+            last_changed, resumed, resumed_until
+        )
+        LEFT JOIN userstatus
+        ON userstatus.user_id = rows.user_id
+        AND rows.resumed IS NOT NULL
+    ) AS x
+    GROUP BY x.user_id
+    ON CONFLICT (user_id)
+    DO UPDATE SET
+    online = userstatus.online + EXCLUDED.online,
+    idle = userstatus.idle + EXCLUDED.idle,
+    dnd = userstatus.dnd + EXCLUDED.dnd,
+    last_changed = GREATEST(userstatus.last_changed, EXCLUDED.last_changed);
+    """,
+    "execute",
+    pool="ingest",
+)
+
+mark_deleted = register(
+    "mark_deleted",
+    """
+    UPDATE messages
+    SET deleted = True
+    WHERE message_id = ANY($1::BIGINT[])
+    AND deleted = False;
+    """,
+    "execute",
+    pool="ingest",
+)
+
+mark_edited = register(
+    "mark_edited",
+    """
+    UPDATE messages
+    SET edited = True
+    WHERE message_id = ANY($1::BIGINT[])
+    AND edited = False;
+    """,
+    "execute",
+    pool="ingest",
+)
+
+insert_tracker = register(
+    "insert_tracker",
+    """
+    INSERT INTO tracker (user_id, unix, action)
+    SELECT x.user_id, x.unix::NUMERIC, x.action
+    FROM UNNEST($1::BIGINT[], $2::FLOAT8[], $3::TEXT[])
+    AS x(user_id, unix, action)
+    ON CONFLICT (user_id)
+    DO UPDATE SET
+    unix = EXCLUDED.unix,
+    action = EXCLUDED.action;
+    """,
+    "execute",
+    pool="ingest",
+)
+
+# Records the spool segments behind a batch in its transaction and
+# returns the ones not already recorded. Segments of the spool
+# below the batch have all been unlinked, so their rows are pruned.
+claim_segments = register(
+    "claim_segments",
+    """
+    WITH pruned AS (
+        DELETE FROM spool_commits
+        WHERE spool = $1
+        AND segment < $3
+    )
+    INSERT INTO spool_commits (spool, segment)
+    SELECT $1, UNNEST($2::BIGINT[])
+    ON CONFLICT DO NOTHING
+    RETURNING segment;
+    """,
+    pool="ingest",
+)
+
+# Users
+
+last_seen = register(
+    "last_seen",
+    """
+    SELECT DISTINCT ON (unix) unix, action
+    FROM tracker
+    WHERE user_id = $1
+    ORDER BY unix DESC;
+    """,
+    "fetchrow",
+)
+
+last_spoke = register(
+    "last_spoke",
+    """
+    SELECT MAX(unix)
+    FROM messages
+    WHERE author_id = $1;
+    """,
+    "fetchval",
+)
+
+server_last_spoke = register(
+    "server_last_spoke",
+    """
+    SELECT MAX(unix)
+    FROM messages
+    WHERE author_id = $1
+    AND server_id = $2;
+    """,
+    "fetchval",
+)
+
+user_avatars = register(
+    "user_avatars",
+    """
+    SELECT ARRAY(
+        SELECT avatar_id
+        FROM useravatars
+        WHERE user_id = $1
+        AND avatar_id IS NOT NULL
+        ORDER BY insertion DESC
+    ) as avatar_list;
+    """,
+    "fetchval",
+)
+
+avatar_thumbnails = register(
+    "avatar_thumbnails",
+    """
+    SELECT avatar_id, avatar_hash
+    FROM useravatars
+    WHERE user_id = $1
+    ORDER BY insertion DESC
+    LIMIT $2;
+    """,
+)
+
+set_avatar_hash = register(
+    "set_avatar_hash",
+    """
+    UPDATE useravatars
+    SET avatar_hash = $1
+    WHERE avatar_id = $2;
+    """,
+    "execute",
+)
+
+user_names = register(
+    "user_names",
+    """
+    SELECT ARRAY(
+        SELECT username
+        FROM usernames
+        WHERE user_id = $1
+        ORDER BY insertion DESC
+    ) as name_list;
+    """,
+    "fetchval",
+)
+
+user_nicks = register(
+    "user_nicks",
+    """
+    SELECT ARRAY(
+        SELECT nickname
+        FROM usernicks
+        WHERE user_id = $1
+        AND server_id = $2
+        ORDER BY insertion DESC
+    ) as nick_list;
+    """,
+    "fetchval",
+)
+
+member_roles = register(
+    "member_roles",
+    """
+    SELECT roles
+    FROM userroles
+    WHERE user_id = $1
+    AND server_id = $2;
+    """,
+    "fetchval",
+)
+
+# Warnings
+
+warnings = register(
+    "warnings",
+    """
+    SELECT warnings
+    FROM warn
+    WHERE user_id = $1
+    AND server_id = $2;
+    """,
+    "fetchrow",
+)
+
+insert_warning = register(
+    "insert_warning",
+    """
+    INSERT INTO warn
+    VALUES ($1, $2, $3);
+    """,
+    "execute",
+)
+
+add_warning = register(
+    "add_warning",
+    """
+    UPDATE warn
+    SET warnings = warnings + 1
+    WHERE server_id = $1
+    AND user_id = $2;
+    """,
+    "execute",
+)
+
+revoke_warning = register(
+    "revoke_warning",
+    """
+    UPDATE warn
+    SET warnings = warnings - 1
+    WHERE server_id = $1
+    AND user_id = $2;
+    """,
+    "execute",
+)
+
+clear_warnings = register(
+    "clear_warnings",
+    """
+    DELETE FROM warn
+    WHERE user_id = $1
+    AND server_id = $2;
+    """,
+    "execute",
+)
+
+server_warning_count = register(
+    "server_warning_count",
+    """
+    SELECT COUNT(*)
+    FROM warn
+    WHERE server_id = $1;
+    """,
+    "fetchrow",
+)
+
+server_warnings = register(
+    "server_warnings",
+    """
+    SELECT user_id, warnings
+    FROM warn
+    WHERE server_id = $1
+    ORDER BY warnings DESC;
+    """,
+)
+
+server_warn_counts = register(
+    "server_warn_counts",
+    """
+    SELECT (warnings, user_id)
+    FROM warn WHERE
+    server_id = $1;
+    """,
+)
+
+# Moderation
+
+server_muterole = register(
+    "server_muterole",
+    """
+    SELECT (muterole)
+    FROM servers
+    WHERE server_id = $1;
+    """,
+    "fetchval",
+)
+
+set_muterole = register(
+    "set_muterole",
+    """
+    UPDATE servers
+    SET muterole = $1
+    WHERE server_id = $2;
+    """,
+    "execute",
+)
+
+# Pending lockdown and mute timers of the channel or user id $1,
+# passed as text since it is read from the jsonb arguments.
+lockdown_timer_id = register(
+    "lockdown_timer_id",
+    """
+    SELECT (id)
+    FROM tasks
+    WHERE event = 'lockdown'
+    AND extra->'kwargs'->>'channel_id' = $1;
+    """,
+    "fetchval",
+)
+
+lockdown_timer = register(
+    "lockdown_timer",
+    """
+    SELECT (id, extra)
+    FROM tasks
+    WHERE event = 'lockdown'
+    AND extra->'kwargs'->>'channel_id' = $1;
+    """,
+    "fetchval",
+)
+
+mute_timer_id = register(
+    "mute_timer_id",
+    """
+    SELECT (id)
+    FROM tasks
+    WHERE event = 'mute'
+    AND extra->'kwargs'->>'user_id' = $1;
+    """,
+    "fetchval",
+)
+
+mute_timer = register(
+    "mute_timer",
+    """
+    SELECT (id, extra)
+    FROM tasks
+    WHERE event = 'mute'
+    AND extra->'kwargs'->>'user_id' = $1;
+    """,
+    "fetchval",
+)
+
+delete_timer = register(
+    "delete_timer",
+    """
+    DELETE FROM tasks
+    WHERE id = $1;
+    """,
+    "execute",
+)
+
+# Message rollups
+
+user_message_count = register(
+    "user_message_count",
+    """
+    SELECT COALESCE(SUM(messages), 0)::BIGINT
+    FROM dailymessages
+    WHERE author_id = $1
+    AND server_id = $2;
+    """,
+    "fetchval",
+)
+
+server_message_count = register(
+    "server_message_count",
+    """
+    SELECT COALESCE(SUM(messages), 0)::BIGINT
+    FROM dailymessages
+    WHERE server_id = $1;
+    """,
+    "fetchval",
+)
+
+global_message_count = register(
+    "global_message_count",
+    """
+    SELECT COALESCE(SUM(messages), 0)::BIGINT
+    FROM dailymessages;
+    """,
+    "fetchval",
+    pool="analytics",
+)
+
+top_messagers = register(
+    "top_messagers",
+    """
+    SELECT author_id, SUM(messages)::BIGINT AS messages
+    FROM dailymessages
+    WHERE server_id = $1
+    GROUP BY author_id
+    ORDER BY messages DESC
+    LIMIT $2;
+    """,
+    pool="analytics",
+)
+
+# Per author counts in server $1 since unix time $2. Whole days come
+# from the dailymessages rollups and the rest of the day $2 falls in
+# is counted from the raw messages, which stays a small index scan.
+ROLLUP_WINDOW = """
+    SELECT author_id, messages, characters
+    FROM dailymessages
+    WHERE server_id = $1
+    AND day > (TO_TIMESTAMP($2) AT TIME ZONE 'UTC')::DATE
+    UNION ALL
+    SELECT author_id, 1, COALESCE(LENGTH(content), 0)
+    FROM messages
+    WHERE server_id = $1
+    AND unix > $2
+    AND unix < EXTRACT(
+        EPOCH FROM ((TO_TIMESTAMP($2) AT TIME ZONE 'UTC')::DATE + 1)::TIMESTAMP
+    )
+"""
+
+message_leaderboard = register(
+    "message_leaderboard",
+    f"""
+    SELECT SUM(messages)::BIGINT as c, author_id
+    FROM ({ROLLUP_WINDOW}) AS counts
+    GROUP BY author_id
+    ORDER BY c DESC LIMIT 25;
+    """,
+    pool="analytics",
+)
+
+character_leaderboard = register(
+    "character_leaderboard",
+    f"""
+    SELECT SUM(characters)::BIGINT as c, author_id, SUM(messages)::BIGINT
+    FROM ({ROLLUP_WINDOW}) AS counts
+    GROUP BY author_id
+    ORDER BY c DESC LIMIT 25;
+    """,
+    pool="analytics",
+)
+
+top_words = register(
+    "top_words",
+    """
+    SELECT word, count
+    FROM word_counts
+    WHERE server_id = $1
+    AND author_id = $2
+    ORDER BY count DESC
+    LIMIT $3;
+    """,
+    pool="analytics",
+)
+
+word_count = register(
+    "word_count",
+    """
+    SELECT count
+    FROM word_counts
+    WHERE server_id = $1
+    AND author_id = $2
+    AND word = $3;
+    """,
+    "fetchval",
+)
+
+word_rank = register(
+    "word_rank",
+    """
+    SELECT COUNT(*) + 1
+    FROM word_counts
+    WHERE server_id = $1
+    AND author_id = $2
+    AND count > $3;
+    """,
+    "fetchval",
+)
+
+# Command rollups
+
+user_command_count = register(
+    "user_command_count",
+    """
+    SELECT COALESCE(SUM(uses), 0)::BIGINT
+    FROM hourlycommands
+    WHERE author_id = $1
+    AND server_id = $2;
+    """,
+    "fetchval",
+)
+
+server_command_count = register(
+    "server_command_count",
+    """
+    SELECT COALESCE(SUM(uses), 0)::BIGINT
+    FROM hourlycommands
+    WHERE server_id = $1;
+    """,
+    "fetchval",
+)
+
+server_command_usage = register(
+    "server_command_usage",
+    """
+    SELECT command, SUM(uses)::BIGINT
+    FROM hourlycommands
+    WHERE server_id = $1
+    GROUP BY command;
+    """,
+    pool="analytics",
+)
+
+user_command_usage = register(
+    "user_command_usage",
+    """
+    SELECT command, SUM(uses)::BIGINT
+    FROM hourlycommands
+    WHERE server_id = $1
+    AND author_id = $2
+    GROUP BY command;
+    """,
+)
+
+bot_usage = register(
+    "bot_usage",
+    """
+    SELECT SUM(uses)::BIGINT as c, author_id
+    FROM hourlycommands
+    WHERE server_id = $1
+    AND hour > (NOW() AT TIME ZONE 'UTC') - $2::INTERVAL
+    GROUP BY author_id
+    ORDER BY c DESC LIMIT 25;
+    """,
+    pool="analytics",
+)
+
+# Emojis
+
+server_emoji_usage = register(
+    "server_emoji_usage",
+    """
+    SELECT (emoji_id, total)
+    FROM emojistats
+    WHERE server_id = $1
+    ORDER BY total DESC;
+    """,
+)
+
+user_emoji_messages = register(
+    "user_emoji_messages",
+    """
+    SELECT (content)
+    FROM messages
+    WHERE content ~ '<a?:.+?:([0-9]{15,21})>'
+    AND author_id = $1
+    AND server_id = $2;
+    """,
+)
+
+emoji_usage = register(
+    "emoji_usage",
+    """
+    SELECT author_id, string_agg(content, '') as content
+    FROM messages
+    WHERE content ~ ('<a?:.+?:' || $1::TEXT || '>')
+    GROUP BY author_id;
+    """,
+    pool="analytics",
+)
+
+# Timezones
+
+user_timezones = register(
+    "user_timezones",
+    """
+    SELECT *
+    FROM usertime;
+    """,
+)
+
+user_timezone = register(
+    "user_timezone",
+    """
+    SELECT timezone
+    FROM usertime
+    WHERE user_id = $1;
+    """,
+    "fetchval",
+)
+
+set_timezone = register(
+    "set_timezone",
+    """
+    INSERT INTO usertime
+    VALUES ($1, $2)
+    ON CONFLICT (user_id)
+    DO UPDATE SET timezone = $2
+    WHERE usertime.user_id = $1;
+    """,
+    "execute",
+)
+
+delete_timezone = register(
+    "delete_timezone",
+    """
+    DELETE FROM usertime
+    WHERE user_id = $1;
+    """,
+    "execute",
+)
+
+# Days user $1 sent messages on in the last $2 seconds.
+active_days = register(
+    "active_days",
+    """
+    SELECT DISTINCT (
+        SELECT EXTRACT(
+            DAY FROM (
+                TO_TIMESTAMP(unix)
+            )
+        ) WHERE author_id = $1
+        AND unix > ((SELECT EXTRACT(EPOCH FROM NOW()) - $2))
+    ) FROM messages;
+    """,
+    pool="analytics",
+)
+
+active_users = register(
+    "active_users",
+    """
+    SELECT DISTINCT author_id, (SELECT EXTRACT(DAY FROM (TO_TIMESTAMP(unix))))
+    FROM messages
+    WHERE server_id = $1
+    AND unix > (SELECT EXTRACT(EPOCH FROM NOW()) - $2);
+    """,
+    pool="analytics",
+)
+
+# Tracking
+
+inviter = register(
+    "inviter",
+    """
+    SELECT (inviter)
+    FROM invites
+    WHERE invitee = $1
+    AND server_id = $2;
+    """,
+    "fetchval",
+)
+
+invite_count = register(
+    "invite_count",
+    """
+    SELECT COUNT(*)
+    FROM invites
+    WHERE inviter = $1
+    AND server_id = $2;
+    """,
+    "fetchval",
+)
+
+user_status = register(
+    "user_status",
+    """
+    SELECT * FROM userstatus
+    WHERE user_id = $1;
+    """,
+)
+
+# Commands
+
+global_command_count = register(
+    "global_command_count",
+    """
+    SELECT COUNT(*)
+    FROM commands;
+    """,
+    "fetchval",
+)
+
+command_stats = register(
+    "command_stats",
+    """
+    SELECT (COUNT(*), MAX(timestamp))
+    FROM commands
+    WHERE command = $1;
+    """,
+    "fetchval",
+)
+
+# Command history
+
+command_history = register(
+    "command_history",
+    """
+    SELECT
+    CASE failed
+        WHEN TRUE THEN command || ' [!]'
+        ELSE command
+    END AS "command",
+    to_char(timestamp, 'Mon DD HH12:MI:SS AM') AS "invoked",
+    author_id,
+    server_id
+    FROM commands
+    ORDER BY timestamp DESC
+    LIMIT 15;
+    """,
+    pool="analytics",
+)
+
+command_history_for = register(
+    "command_history_for",
+    """
+    SELECT *, t.success + t.failed AS "total"
+    FROM (
+        SELECT server_id,
+        SUM(CASE WHEN failed THEN 0 ELSE uses END) AS "success",
+        SUM(CASE WHEN failed THEN uses ELSE 0 END) AS "failed"
+        FROM hourlycommands
+        WHERE command = $1
+        AND hour > ((NOW() AT TIME ZONE 'UTC') - $2::interval)
+        GROUP BY server_id
+    ) AS t
+    ORDER BY "total" DESC
+    LIMIT 30;
+    """,
+    pool="analytics",
+)
+
+command_history_guild = register(
+    "command_history_guild",
+    """
+    SELECT
+    CASE failed
+        WHEN TRUE THEN command || ' [!]'
+        ELSE command
+    END AS "command",
+    channel_id,
+    author_id,
+    timestamp
+    FROM commands
+    WHERE server_id = $1
+    ORDER BY timestamp DESC
+    LIMIT 15;
+    """,
+    pool="analytics",
+)
+
+command_history_user = register(
+    "command_history_user",
+    """
+    SELECT
+    CASE failed
+        WHEN TRUE THEN command || ' [!]'
+        ELSE command
+    END AS "command",
+    server_id,
+    timestamp
+    FROM commands
+    WHERE author_id = $1
+    ORDER BY timestamp DESC
+    LIMIT 20;
+    """,
+    pool="analytics",
+)
+
+command_history_log = register(
+    "command_history_log",
+    """
+    SELECT command, SUM(uses)
+    FROM hourlycommands
+    WHERE hour > ((NOW() AT TIME ZONE 'UTC') - $1::interval)
+    GROUP BY command
+    ORDER BY 2 DESC;
+    """,
+    pool="analytics",
+)
+
+command_history_cog = register(
+    "command_history_cog",
+    """
+    SELECT *, t.success + t.failed AS "total"
+    FROM (
+        SELECT command,
+        SUM(CASE WHEN failed THEN 0 ELSE uses END) AS "success",
+        SUM(CASE WHEN failed THEN uses ELSE 0 END) AS "failed"
+        FROM hourlycommands
+        WHERE command = any($1::text[])
+        AND hour > ((NOW() AT TIME ZONE 'UTC') - $2::interval)
+        GROUP BY command
+    ) AS t
+    ORDER BY "total" DESC
+    LIMIT 30;
+    """,
+    pool="analytics",
+)
+
+# Commands are grouped by the cog they belong to, passed as the
+# parallel arrays $1 of command names and $2 of their cogs.
+command_history_cogs = register(
+    "command_history_cogs",
+    """
+    SELECT *, t.success + t.failed AS "total"
+    FROM (
+        SELECT COALESCE(cogs.cog, 'No Cog') AS "cog",
+        SUM(CASE WHEN failed THEN 0 ELSE uses END) AS "success",
+        SUM(CASE WHEN failed THEN uses ELSE 0 END) AS "failed"
+        FROM hourlycommands
+        LEFT JOIN UNNEST($1::text[], $2::text[]) AS cogs(command, cog)
+        USING (command)
+        WHERE hour > ((NOW() AT TIME ZONE 'UTC') - $3::interval)
+        GROUP BY 1
+    ) AS t
+    ORDER BY "total" DESC;
+    """,
+    pool="analytics",
+)
@@ -0,0 +1,227 @@
+# Module for the message and command rollups behind the stats commands
+import logging
+import datetime
+
+from collections import Counter
+
+from . import database
+
+log = logging.getLogger("INFO_LOGGER")
+
+conn = database.ingest
+
+# Longer tokens are links and spam, not words.
+MAX_WORD_LENGTH = 64
+
+
+def day(unix):
+    return datetime.datetime.utcfromtimestamp(unix).date()
+
+
+def tokenize(content):
+    return [word for word in (content or "").split() if len(word) <= MAX_WORD_LENGTH]
+
+
+def aggregate(records):
+    """Sum message records into {(server_id, author_id, day): [messages, chars]}."""
+    totals = {}
+    for record in records:
+        key = (record["server_id"], record["author_id"], day(record["unix"]))
+        counts = totals.setdefault(key, [0, 0])
+        counts[0] += 1
+        counts[1] += len(record["content"] or "")
+    return totals
+
+
+def count_words(records):
+    """Count message records into {(server_id, author_id, word): count}."""
+    counts = Counter()
+    for record in records:
+        server_id, author_id = record["server_id"], record["author_id"]
+        for word in tokenize(record["content"]):
+            counts[(server_id, author_id, word)] += 1
+    return counts
+
+
+def count_commands(records):
+    """Count command records into {(server_id, author_id, command, failed, hour): uses}."""
+    counts = Counter()
+    for record in records:
+        hour = record["timestamp"].replace(minute=0, second=0, microsecond=0)
+        key = (
+            record["server_id"] or 0,
+            record["author_id"],
+            record["command"],
+            bool(record["failed"]),
+            hour,
+        )
+        counts[key] += 1
+    return counts
+
+
+async def record(con, records):
+    """
+    Add a batch of messages to the rollups.
+    Called on the connection that inserts the messages,
+    inside the same transaction.
+    """
+    totals = aggregate(records)
+    if totals:
+        # Rows are locked in key order so the backfill can't deadlock us.
+        keys = sorted(totals)
+        server_ids, author_ids, days = zip(*keys)
+        messages, characters = zip(*(totals[key] for key in keys))
+        query = """
+                INSERT INTO dailymessages (server_id, author_id, day, messages, characters)
+                SELECT * FROM UNNEST(
+                    $1::BIGINT[], $2::BIGINT[], $3::DATE[], $4::BIGINT[], $5::BIGINT[]
+                )
+                ON CONFLICT (server_id, author_id, day) DO UPDATE SET
+                messages = dailymessages.messages + EXCLUDED.messages,
+                characters = dailymessages.characters + EXCLUDED.characters;
+                """
+        await con.execute(
+            query, list(server_ids), list(author_ids), list(days), messages, characters
+        )
+
+    await record_words(con, count_words(records))
+
+
+async def record_words(con, words):
+    """Add counts from count_words to the word rollup."""
+    if words:
+        keys = sorted(words)
+        server_ids, author_ids, tokens = zip(*keys)
+        query = """
+                INSERT INTO word_counts (server_id, author_id, word, count)
+                SELECT * FROM UNNEST(
+                    $1::BIGINT[], $2::BIGINT[], $3::TEXT[], $4::BIGINT[]
+                )
+                ON CONFLICT (server_id, author_id, word) DO UPDATE SET
+                count = word_counts.count + EXCLUDED.count;
+                """
+        await con.execute(
+            query,
+            list(server_ids),
+            list(author_ids),
+            list(tokens),
+            [words[key] for key in keys],
+        )
+
+
+async def record_commands(con, records):
+    """Add a batch of commands to the hourly rollups."""
+    counts = count_commands(records)
+    if not counts:
+        return
+    keys = sorted(counts)
+    server_ids, author_ids, names, failed, hours = zip(*keys)
+    query = """
+            INSERT INTO hourlycommands (server_id, author_id, command, failed, hour, uses)
+            SELECT * FROM UNNEST(
+                $1::BIGINT[], $2::BIGINT[], $3::TEXT[],
+                $4::BOOLEAN[], $5::TIMESTAMP[], $6::BIGINT[]
+            )
+            ON CONFLICT (server_id, author_id, command, failed, hour) DO UPDATE SET
+            uses = hourlycommands.uses + EXCLUDED.uses;
+            """
+    await con.execute(
+        query,
+        list(server_ids),
+        list(author_ids),
+        list(names),
+        list(failed),
+        list(hours),
+        [counts[key] for key in keys],
+    )
+
+
+async def backfill_words(con, floor, cursor):
+    """
+    Count the words of messages with floor < index <= cursor.
+    Split in Python with tokenize, so history is counted by
+    the same rule as the messages the batch writer records.
+    """
+    query = """
+            SELECT server_id, author_id, content
+            FROM messages
+            WHERE index > $1
+            AND index <= $2
+            AND server_id IS NOT NULL
+            AND author_id IS NOT NULL;
+            """
+    records = await con.fetch(query, floor, cursor)
+    await record_words(con, count_words(records))
+
+
+# name: query counting the rows of its table with $1 < index <= $2,
+# or a coroutine called with (con, $1, $2) that counts them.
+BACKFILLS = {
+    "messages": """
+        INSERT INTO dailymessages (server_id, author_id, day, messages, characters)
+        SELECT server_id, author_id,
+        (TO_TIMESTAMP(unix) AT TIME ZONE 'UTC')::DATE,
+        COUNT(*), COALESCE(SUM(LENGTH(content)), 0)
+        FROM messages
+        WHERE index > $1
+        AND index <= $2
+        AND server_id IS NOT NULL
+        AND author_id IS NOT NULL
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3
+        ON CONFLICT (server_id, author_id, day) DO UPDATE SET
+        messages = dailymessages.messages + EXCLUDED.messages,
+        characters = dailymessages.characters + EXCLUDED.characters;
+        """,
+    "words": backfill_words,
+    "commands": """
+        INSERT INTO hourlycommands (server_id, author_id, command, failed, hour, uses)
+        SELECT COALESCE(server_id, 0), author_id, command, COALESCE(failed, False),
+        DATE_TRUNC('hour', timestamp), COUNT(*)
+        FROM commands
+        WHERE index > $1
+        AND index <= $2
+        AND author_id IS NOT NULL
+        AND command IS NOT NULL
+        AND timestamp IS NOT NULL
+        GROUP BY 1, 2, 3, 4, 5
+        ORDER BY 1, 2, 3, 4, 5
+        ON CONFLICT (server_id, author_id, command, failed, hour) DO UPDATE SET
+        uses = hourlycommands.uses + EXCLUDED.uses;
+        """,
+}
+
+
+async def backfill(name, chunk=20000):
+    """
+    Count one chunk of the rows stored before a rollup
+    existed, walking the index down so the newest days are
+    complete first. Returns the number of rows counted, 0 once
+    history is done.
+    """
+    async with conn.acquire() as con:
+        async with con.transaction():
+            query = """
+                    SELECT cursor
+                    FROM rollup_backfill
+                    WHERE name = $1
+                    FOR UPDATE;
+                    """
+            cursor = await con.fetchval(query, name)
+            if not cursor:
+                return 0
+            floor = max(cursor - chunk, 0)
+            count = BACKFILLS[name]
+            if isinstance(count, str):
+                await con.execute(count, floor, cursor)
+            else:
+                await count(con, floor, cursor)
+            query = """
+                    UPDATE rollup_backfill
+                    SET cursor = $2
+                    WHERE name = $1;
+                    """
+            await con.execute(query, name, floor)
+    if floor == 0:
+        log.info(f"Finished counting history into the {name} rollup.")
+    return cursor - floor
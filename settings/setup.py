@@ -67,14 +67,18 @@ def start():
 
     config["admins"] = []
     config["avchan"] = None
+    config["batch_sink"] = "copy"
     config["bitly"] = None
     config["botlog"] = None
     config["embed"] = int(embed, 16)
+    config["flush_policies"] = {}
     config["github"] = "https://github.com/Hecate946/Snowbot"
     config["gtoken"] = None
+    config["message_retention"] = None
     config["owners"] = [int(owners)]
     config["postgres"] = postgres
     config["prefix"] = prefix
+    config["retention_action"] = "detach"
     config["support"] = "https://discord.gg/947ramn"
     config["tester"] = token
     config["timezonedb"] = None
@@ -0,0 +1,191 @@
+# Module for writing batched rows into postgres
+import json
+import contextlib
+
+from operator import itemgetter
+
+
+class Table:
+    """
+    Describes a table that the batch cog writes to.
+    Records are dicts keyed by column name, any extra
+    keys on a record are ignored by both sinks.
+    """
+
+    def __init__(self, name, columns, *, conflict=None, update=None):
+        self.name = name
+        self.columns = tuple(column for column, _ in columns)
+        self.definition = ", ".join(f"{column} {kind}" for column, kind in columns)
+        self.conflict = conflict
+        self.update = update
+        self.getter = itemgetter(*self.columns)
+
+    @property
+    def column_list(self):
+        return ", ".join(self.columns)
+
+    @property
+    def on_conflict(self):
+        if not self.conflict:
+            return ""
+        return f"ON CONFLICT ({self.conflict}) DO UPDATE SET {self.update}"
+
+    def rows(self, records):
+        return [self.getter(record) for record in records]
+
+
+MESSAGES = Table(
+    "messages",
+    [
+        ("unix", "DOUBLE PRECISION"),
+        ("timestamp", "TIMESTAMP"),
+        ("content", "TEXT"),
+        ("message_id", "BIGINT"),
+        ("author_id", "BIGINT"),
+        ("channel_id", "BIGINT"),
+        ("server_id", "BIGINT"),
+    ],
+)
+
+COMMANDS = Table(
+    "commands",
+    [
+        ("server_id", "BIGINT"),
+        ("channel_id", "BIGINT"),
+        ("author_id", "BIGINT"),
+        ("timestamp", "TIMESTAMP"),
+        ("prefix", "TEXT"),
+        ("command", "TEXT"),
+        ("failed", "BOOLEAN"),
+    ],
+)
+
+USERNAMES = Table("usernames", [("user_id", "BIGINT"), ("username", "TEXT")])
+
+USERNICKS = Table(
+    "usernicks",
+    [("user_id", "BIGINT"), ("server_id", "BIGINT"), ("nickname", "TEXT")],
+)
+
+USERAVATARS = Table(
+    "useravatars",
+    [("user_id", "BIGINT"), ("avatar_id", "BIGINT"), ("avatar_hash", "TEXT")],
+)
+
+INVITES = Table(
+    "invites",
+    [("invitee", "BIGINT"), ("inviter", "BIGINT"), ("server_id", "BIGINT")],
+)
+
+EMOJISTATS = Table(
+    "emojistats",
+    [("server_id", "BIGINT"), ("emoji_id", "BIGINT"), ("total", "BIGINT")],
+    conflict="server_id, emoji_id",
+    update="total = emojistats.total + EXCLUDED.total",
+)
+
+USERROLES = Table(
+    "userroles",
+    [("user_id", "BIGINT"), ("server_id", "BIGINT"), ("roles", "TEXT")],
+    conflict="user_id, server_id",
+    update="roles = EXCLUDED.roles",
+)
+
+TRACKER = Table(
+    "tracker",
+    [("user_id", "BIGINT"), ("unix", "DOUBLE PRECISION"), ("action", "TEXT")],
+    conflict="user_id",
+    update="unix = EXCLUDED.unix, action = EXCLUDED.action",
+)
+
+
+@contextlib.asynccontextmanager
+async def connection(pool, con=None):
+    """Use the caller's connection, or acquire one from the pool."""
+    if con is not None:
+        yield con
+    else:
+        async with pool.acquire() as con:
+            yield con
+
+
+class CopySink:
+    """
+    Writes batches with the binary COPY protocol.
+    Plain inserts are copied straight into the table.
+    Upserts are copied into a temporary table first
+    and merged with INSERT ... ON CONFLICT.
+    Pass con to write inside the caller's transaction.
+    """
+
+    mode = "copy"
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def insert(self, table, records, con=None):
+        rows = table.rows(records)
+        async with connection(self.pool, con) as conn:
+            await conn.copy_records_to_table(
+                table.name, records=rows, columns=table.columns
+            )
+        return len(rows)
+
+    async def upsert(self, table, records, con=None):
+        rows = table.rows(records)
+        temp = f"_batch_{table.name}"
+        async with connection(self.pool, con) as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    f"CREATE TEMP TABLE {temp} ({table.definition}) ON COMMIT DROP;"
+                )
+                await conn.copy_records_to_table(
+                    temp, records=rows, columns=table.columns
+                )
+                await conn.execute(f"""
+                    INSERT INTO {table.name} ({table.column_list})
+                    SELECT {table.column_list} FROM {temp}
+                    {table.on_conflict};
+                    """)
+        return len(rows)
+
+
+class JsonSink:
+    """
+    The original JSONB_TO_RECORDSET writer.
+    Kept as a fallback for when COPY is unavailable,
+    for example behind a statement pooling proxy.
+    """
+
+    mode = "json"
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.queries = {}
+
+    def query(self, table):
+        key = (table.name, table.update)
+        if key not in self.queries:
+            selection = ", ".join(f"x.{column}" for column in table.columns)
+            self.queries[key] = f"""
+                    INSERT INTO {table.name} ({table.column_list})
+                    SELECT {selection}
+                    FROM JSONB_TO_RECORDSET($1::JSONB)
+                    AS x({table.definition})
+                    {table.on_conflict};
+                    """
+        return self.queries[key]
+
+    async def insert(self, table, records, con=None):
+        data = json.dumps(records, default=str)
+        await (con or self.pool).execute(self.query(table), data)
+        return len(records)
+
+    upsert = insert
+
+
+SINKS = {sink.mode: sink for sink in (CopySink, JsonSink)}
+
+
+def get_sink(pool, mode="copy"):
+    return SINKS.get(mode, CopySink)(pool)
@@ -0,0 +1,278 @@
+import io
+import os
+import mmap
+import time
+import asyncio
+import discord
+import hashlib
+import tempfile
+import contextlib
+
+from collections import OrderedDict
+from PIL import Image
+
+# Webhook uploads are capped at 8MiB per message, leave
+# some room for the multipart overhead of each file.
+UPLOAD_LIMIT = 8 * 1024 * 1024 - 64 * 1024
+MAX_FILES = 10  # Attachments allowed on one message
+
+STORE_FOLDER = "./data/avatars"
+THUMBNAIL_SIZES = (256,)
+
+
+def digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class AvatarStore:
+    """
+    Content addressed avatar files on local disk.
+    Every image is stored once under its hash, sharded by
+    the first two byte pairs, next to pre-rendered thumbnails:
+    ./data/avatars/ab/cd/abcd....png and abcd...._256.png
+    """
+
+    def __init__(self, root=STORE_FOLDER, sizes=THUMBNAIL_SIZES):
+        self.root = root
+        self.sizes = sizes
+        self.writes = 0
+        self.dedupe_hits = 0
+
+    def path(self, key, size=None):
+        suffix = f"_{size}" if size else ""
+        return os.path.join(self.root, key[:2], key[2:4], f"{key}{suffix}.png")
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def put(self, data):
+        """Store an image and its thumbnails, returning its hash."""
+        key = digest(data)
+        if key in self:
+            self.dedupe_hits += 1
+            return key
+        os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+        with Image.open(io.BytesIO(data)) as image:
+            image = image.convert("RGBA")
+            for size in self.sizes:
+                buffer = io.BytesIO()
+                image.resize((size, size), Image.LANCZOS).save(buffer, "png")
+                self.write(self.path(key, size), buffer.getvalue())
+        # The original goes last, its presence marks the entry complete.
+        self.write(self.path(key), data)
+        self.writes += 1
+        return key
+
+    @staticmethod
+    def write(path, data):
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(data)
+            os.replace(temp, path)
+        except BaseException:
+            os.remove(temp)
+            raise
+
+    @contextlib.contextmanager
+    def open(self, key, size=None):
+        """Memory map a stored image, raises FileNotFoundError if missing."""
+        with open(self.path(key, size), "rb") as fp:
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    def collage(self, keys, size=256, columns=4):
+        """Paste up to columns² thumbnails into a png grid."""
+        parent = Image.new("RGBA", (size * columns, size * columns), (0, 0, 0, 0))
+        for index, key in enumerate(keys[: columns * columns]):
+            with self.open(key, size) as thumbnail:
+                with Image.open(thumbnail) as image:
+                    row, column = divmod(index, columns)
+                    parent.paste(image, (column * size, row * size))
+        buffer = io.BytesIO()
+        parent.save(buffer, "png")
+        buffer.seek(0)
+        return buffer
+
+
+class Avatar:
+    __slots__ = ("user_id", "data", "digest")
+
+    def __init__(self, user_id, data):
+        self.user_id = user_id
+        self.data = data
+        self.digest = digest(data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def file(self):
+        return discord.File(io.BytesIO(self.data), filename=f"{self.user_id}.png")
+
+
+class Bin(list):
+    """A list of avatars along with their total size."""
+
+    size = 0
+
+
+def pack(avatars, limit=UPLOAD_LIMIT, max_files=MAX_FILES):
+    """
+    First fit decreasing bin packing.
+    Returns lists of avatars that each fit in one message.
+    """
+    bins = []
+    for avatar in sorted(avatars, key=len, reverse=True):
+        for upload in bins:
+            if len(upload) < max_files and upload.size + len(avatar) <= limit:
+                upload.append(avatar)
+                upload.size += len(avatar)
+                break
+        else:
+            upload = Bin([avatar])
+            upload.size = len(avatar)
+            bins.append(upload)
+    return bins
+
+
+class UploadStats:
+    __slots__ = (
+        "queued",
+        "uploads",
+        "files",
+        "bytes",
+        "dedupe_hits",
+        "splits",
+        "failures",
+        "dropped",
+    )
+
+    def __init__(self):
+        for slot in self.__slots__:
+            setattr(self, slot, 0)
+
+
+class AvatarUploader:
+    """
+    Uploads avatars to the avatar webhook channel.
+    Queued avatars are collected until a message worth of
+    files has piled up for every upload slot or the oldest
+    one has waited deadline seconds. The batch is then packed
+    by byte size and sent with at most concurrency uploads
+    in flight. Avatars a user already had uploaded are not
+    sent again, their previous attachment is reused.
+    """
+
+    def __init__(
+        self,
+        send,
+        on_upload,
+        *,
+        on_error=None,
+        deadline=30.0,
+        concurrency=2,
+        limit=UPLOAD_LIMIT,
+        max_queue=1000,
+        cache_size=10000,
+    ):
+        self.send = send
+        self.on_upload = on_upload
+        self.on_error = on_error
+        self.deadline = deadline
+        self.concurrency = concurrency
+        self.limit = limit
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.slots = asyncio.Semaphore(concurrency)
+        self.uploaded = OrderedDict()  # (user_id, digest): attachment_id
+        self.cache_size = cache_size
+        self.tasks = set()
+        self.stats = UploadStats()
+
+    def submit(self, user_id, data):
+        avatar = Avatar(user_id, data)
+        attachment_id = self.uploaded.get((user_id, avatar.digest))
+        if attachment_id is not None:
+            self.uploaded.move_to_end((user_id, avatar.digest))
+            self.stats.dedupe_hits += 1
+            return self.on_upload(user_id, attachment_id, avatar.digest)
+        if len(avatar) > self.limit:
+            self.stats.dropped += 1
+            return
+        try:
+            self.queue.put_nowait(avatar)
+        except asyncio.QueueFull:
+            self.stats.dropped += 1
+        else:
+            self.stats.queued += 1
+
+    def remember(self, avatar, attachment_id):
+        self.uploaded[(avatar.user_id, avatar.digest)] = attachment_id
+        if len(self.uploaded) > self.cache_size:
+            self.uploaded.popitem(last=False)
+
+    async def collect(self):
+        """Wait for the first avatar, then fill up until full or due."""
+        avatars = [await self.queue.get()]
+        size = len(avatars[0])
+        deadline = time.monotonic() + self.deadline
+        capacity = MAX_FILES * self.concurrency
+        while len(avatars) < capacity and size < self.limit * self.concurrency:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                avatar = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            avatars.append(avatar)
+            size += len(avatar)
+        return avatars
+
+    async def dispatch(self):
+        """Collect one batch and start uploading it."""
+        avatars = await self.collect()
+        unique = {}
+        for avatar in avatars:  # Repeats inside one batch are sent once
+            key = (avatar.user_id, avatar.digest)
+            if key in unique:
+                self.stats.dedupe_hits += 1
+            unique[key] = avatar
+        for upload in pack(unique.values(), self.limit):
+            await self.slots.acquire()  # Backpressure on the collector
+            task = asyncio.ensure_future(self.upload(upload))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def upload(self, avatars):
+        try:
+            await self.send_bin(avatars)
+        except Exception as e:
+            self.stats.failures += len(avatars)
+            if self.on_error is not None:
+                self.on_error(e)
+        finally:
+            self.slots.release()
+
+    async def send_bin(self, avatars):
+        try:
+            message = await self.send([avatar.file() for avatar in avatars])
+        except discord.HTTPException:
+            if len(avatars) == 1:
+                self.stats.failures += 1
+                return
+            # Rejected as too large, try each half on its own.
+            self.stats.splits += 1
+            middle = len(avatars) // 2
+            await self.send_bin(avatars[:middle])
+            await self.send_bin(avatars[middle:])
+            return
+        self.stats.uploads += 1
+        for avatar, attachment in zip(avatars, message.attachments):
+            self.stats.files += 1
+            self.stats.bytes += len(avatar)
+            self.remember(avatar, attachment.id)
+            self.on_upload(avatar.user_id, attachment.id, avatar.digest)
+
+    def cancel(self):
+        for task in self.tasks:
+            task.cancel()
@@ -0,0 +1,392 @@
+import time
+import asyncio
+import contextlib
+
+from collections import Counter, deque
+
+from utilities.spool import TRANSIENT_ERRORS
+
+
+def append(container, record):
+    container.append(record)
+
+
+def collect(container, record):
+    container.add(record)
+
+
+def assign(container, record):
+    key, value = record
+    container[key] = value
+
+
+def increment(container, record):
+    key, value = record
+    container[key] += value
+
+
+# How each kind of buffer stores the records added to it.
+KINDS = {
+    "list": (list, append),
+    "set": (set, collect),
+    "dict": (dict, assign),
+    "counter": (Counter, increment),
+}
+
+
+class FlushPolicy:
+    """
+    When a buffer is flushed and what happens once it is full.
+    A flush is triggered by whichever comes first: max_rows
+    records, max_bytes of spooled data or the oldest record
+    being max_latency seconds old. Past capacity pending rows
+    new records are either spilled to the spool only or dropped.
+    """
+
+    __slots__ = ("max_rows", "max_bytes", "max_latency", "capacity", "overflow")
+
+    def __init__(
+        self,
+        max_rows=5000,
+        max_bytes=4 * 1024 * 1024,
+        max_latency=2.0,
+        capacity=100000,
+        overflow="spill",  # spill|drop
+    ):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_latency = max_latency
+        self.capacity = capacity
+        self.overflow = overflow
+
+    def replace(self, **options):
+        values = {option: getattr(self, option) for option in self.__slots__}
+        values.update(
+            (option, value) for option, value in options.items() if option in values
+        )
+        return FlushPolicy(**values)
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class BufferStats:
+    """
+    Counters for a single buffer.
+    Latencies are stored in seconds.
+    The most recent flushes are kept for percentiles.
+    """
+
+    __slots__ = (
+        "swaps",
+        "rows",
+        "peak_depth",
+        "swap_time",
+        "swap_max",
+        "lock_wait",
+        "lock_wait_max",
+        "dropped",
+        "spilled",
+        "latencies",
+        "batch_sizes",
+    )
+
+    def __init__(self, samples=1024):
+        self.swaps = 0
+        self.rows = 0
+        self.peak_depth = 0
+        self.swap_time = 0.0
+        self.swap_max = 0.0
+        self.lock_wait = 0.0
+        self.lock_wait_max = 0.0
+        self.dropped = 0
+        self.spilled = 0
+        self.latencies = deque(maxlen=samples)
+        self.batch_sizes = deque(maxlen=samples)
+
+    def record(self, waited, swapped, rows):
+        self.swaps += 1
+        self.rows += rows
+        self.peak_depth = max(self.peak_depth, rows)
+        self.swap_time += swapped
+        self.swap_max = max(self.swap_max, swapped)
+        self.lock_wait += waited
+        self.lock_wait_max = max(self.lock_wait_max, waited)
+
+    def flushed(self, elapsed, rows):
+        self.latencies.append(elapsed)
+        self.batch_sizes.append(rows)
+
+    @property
+    def swap_avg(self):
+        return self.swap_time / self.swaps if self.swaps else 0.0
+
+    @property
+    def p50(self):
+        return percentile(self.latencies, 0.50)
+
+    @property
+    def p99(self):
+        return percentile(self.latencies, 0.99)
+
+    @property
+    def rows_per_flush(self):
+        if not self.batch_sizes:
+            return 0.0
+        return sum(self.batch_sizes) / len(self.batch_sizes)
+
+
+class DoubleBuffer:
+    """
+    A swap-and-flush batch buffer.
+    Listeners add records to the active container without
+    taking a lock. The flush loop swaps in an empty container
+    and writes the old one while new records keep arriving.
+    When a spool is passed, every record is written to it
+    before it is buffered and the spool is only truncated
+    once the batch holding the record has been committed.
+    """
+
+    def __init__(self, name, kind="list", spool=None, policy=None):
+        self.name = name
+        self.factory, self.apply = KINDS[kind]
+        self.active = self.factory()
+        self.lock = asyncio.Lock()
+        self.spool = spool
+        self.policy = policy or FlushPolicy()
+        self.stats = BufferStats()
+
+        self.bytes = 0  # Spooled size of the active container
+        self.first_at = None  # When the active container got its first record
+        self.inflight = 0  # Rows currently being written
+        self.spilled = False  # Records were spooled without being buffered
+        self.wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self.active)
+
+    def __bool__(self):
+        return bool(self.active)
+
+    @property
+    def backlog(self):
+        return len(self.spool.backlog) if self.spool else 0
+
+    @property
+    def pending(self):
+        return len(self.active) + self.inflight
+
+    @property
+    def full(self):
+        return (
+            len(self.active) >= self.policy.max_rows
+            or self.bytes >= self.policy.max_bytes
+        )
+
+    def add(self, record):
+        if self.pending >= self.policy.capacity:
+            return self.overflow(record)
+        if self.spool:
+            self.bytes += self.spool.append(record)
+        self.apply(self.active, record)
+        if self.first_at is None:
+            self.first_at = time.monotonic()
+            self.wakeup.set()
+        elif self.full:
+            self.wakeup.set()
+
+    def overflow(self, record):
+        """
+        Backpressure for when postgres falls behind.
+        Spilled records only live in the spool and are
+        replayed from disk, dropped records are lost.
+        """
+        if self.policy.overflow == "spill" and self.spool:
+            self.spool.append(record)
+            self.spilled = True
+            self.stats.spilled += 1
+            self.wakeup.set()
+        else:
+            self.stats.dropped += 1
+
+    async def due(self):
+        """
+        Wait until the active container is full, its oldest
+        record has waited max_latency or a spool retry is due.
+        """
+        while True:
+            if self.full or self.spilled:
+                return
+            now = time.monotonic()
+            deadlines = []
+            if self.active:
+                deadlines.append(self.first_at + self.policy.max_latency - now)
+            if self.backlog:
+                deadlines.append(self.spool.retry_at - now)
+            timeout = min(deadlines, default=None)
+            if timeout is not None and timeout <= 0:
+                return
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return
+
+    @contextlib.asynccontextmanager
+    async def drain(self):
+        """
+        Swap out the active container and yield it
+        along with the spool segments that back it.
+        The lock is held until the caller has written the
+        batch so two flushes of one buffer never overlap.
+        """
+        start = time.perf_counter()
+        async with self.lock:
+            acquired = time.perf_counter()
+            batch, self.active = self.active, self.factory()
+            self.bytes, self.first_at = 0, None
+            segments = self.spool.seal() if self.spool else []
+            if self.spilled:  # Memory only holds part of what was spooled.
+                self.spool.defer(segments)
+                batch, segments, self.spilled = self.factory(), [], False
+            self.stats.record(
+                acquired - start, time.perf_counter() - acquired, len(batch)
+            )
+            self.inflight = len(batch)
+            try:
+                yield batch, segments
+            finally:
+                self.inflight = 0
+
+    async def flush(self, write):
+        """
+        Write the active batch with the passed coroutine.
+        Any spooled backlog is replayed first so that newer
+        records are never overwritten by older ones. While
+        postgres is unreachable the batch is dropped from
+        memory and left on disk to be retried with backoff.
+        write is awaited with the batch and the segments that
+        back it. Segments are deleted after postgres commits,
+        so a crash in between replays them: write must record
+        the segments in the transaction that writes the batch
+        and skip any already recorded, or it sees them twice.
+        Returns whether anything reached postgres.
+        """
+        if not self.active and not self.backlog and not self.spilled:
+            return False
+        async with self.drain() as (batch, segments):
+            if self.backlog:
+                self.spool.defer(segments)
+                if self.spool.ready():
+                    return await self.replay(write)
+                return False
+            if not batch:
+                if self.spool:
+                    await self.spool.commit(segments)
+                return False
+            try:
+                await self.write(write, batch, segments)
+            except TRANSIENT_ERRORS:
+                if not self.spool:
+                    raise
+                self.spool.defer(segments)
+                self.spool.failed()
+                return False
+            except Exception:
+                if self.spool:
+                    for segment in segments:
+                        self.spool.quarantine(segment)
+                raise
+            if self.spool:
+                await self.spool.commit(segments)
+            return True
+
+    async def write(self, write, batch, segments):
+        start = time.perf_counter()
+        await write(batch, segments)
+        self.stats.flushed(time.perf_counter() - start, len(batch))
+
+    async def replay(self, write):
+        """Write spooled segments back into postgres, oldest first."""
+        replayed = False
+        while self.spool.backlog:
+            segment = self.spool.backlog[0]
+            batch = self.factory()
+            for record in await self.spool.read(segment):
+                self.apply(batch, record)
+            self.inflight = len(batch)
+            try:
+                if batch:
+                    await self.write(write, batch, [segment])
+            except TRANSIENT_ERRORS:
+                self.spool.failed()
+                return replayed
+            except Exception:
+                self.spool.backlog.popleft()
+                self.spool.quarantine(segment)
+                raise
+            self.spool.backlog.popleft()
+            await self.spool.commit([segment])
+            replayed = True
+        self.spool.recovered()
+        return replayed
+
+
+class FlushScheduler:
+    """
+    Runs one flush task per buffer, replacing fixed
+    interval loops. Each task sleeps until its buffer
+    is due and then flushes it. A buffer registered
+    with after= flushes that buffer first, so updates
+    never reach postgres before the rows they touch.
+    """
+
+    def __init__(self, on_flush=None, on_error=None):
+        self.on_flush = on_flush
+        self.on_error = on_error
+        self.writers = {}
+        self.order = {}
+        self.tasks = []
+        self.flushing = set()  # Shielded flushes still writing
+
+    def register(self, buffer, write, *, after=None):
+        self.writers[buffer] = write
+        self.order[buffer] = after
+
+    async def flush(self, buffer):
+        after = self.order[buffer]
+        if after is not None and (after or after.backlog):
+            await self.flush(after)
+        try:
+            flushed = await buffer.flush(self.writers[buffer])
+        except Exception as e:
+            if self.on_error is None:
+                raise
+            self.on_error(buffer, e)
+        else:
+            if flushed and self.on_flush is not None:
+                self.on_flush(buffer)
+
+    async def run(self, buffer):
+        while True:
+            await buffer.due()
+            # Shielded so stopping never interrupts a write halfway.
+            flush = asyncio.ensure_future(self.flush(buffer))
+            self.flushing.add(flush)
+            flush.add_done_callback(self.flushing.discard)
+            await asyncio.shield(flush)
+
+    def start(self, loop=None):
+        loop = loop or asyncio.get_event_loop()
+        self.tasks = [loop.create_task(self.run(buffer)) for buffer in self.writers]
+
+    async def stop(self):
+        """Stop flushing and wait for the writes already under way."""
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        await asyncio.gather(*self.flushing, return_exceptions=True)
@@ -0,0 +1,195 @@
+import time
+import asyncio
+import discord
+
+from collections import deque
+
+
+def index(invites):
+    """Key a list of invites by their code."""
+    return {invite.code: invite for invite in invites}
+
+
+class RateBudget:
+    """
+    Global budget for invite fetches.
+    At most concurrency requests run at once and
+    requests are started at most rate per second.
+    """
+
+    def __init__(self, concurrency=2, rate=1.0):
+        self.slots = asyncio.Semaphore(concurrency)
+        self.interval = 1.0 / rate
+        self.next_at = 0.0
+
+    async def __aenter__(self):
+        await self.slots.acquire()
+        now = time.monotonic()
+        wait = self.next_at - now
+        self.next_at = max(now, self.next_at) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def __aexit__(self, *exc):
+        self.slots.release()
+
+
+class InviteStats:
+    __slots__ = ("fetches", "joins", "attributed", "ambiguous", "reconciled")
+
+    def __init__(self):
+        for slot in self.__slots__:
+            setattr(self, slot, 0)
+
+
+class InviteTracker:
+    """
+    Incremental invite use tracking.
+    State is a dict per guild keyed by invite code, kept up
+    to date by invite create and delete events. A member join
+    only refetches that guild, after a debounce so a wave of
+    joins costs one request. Every fetch goes through a global
+    budget and a slow sweep reconciles a few guilds at a time.
+    """
+
+    def __init__(
+        self,
+        bot,
+        on_used,
+        *,
+        debounce=2.0,
+        vanish_window=10.0,
+        budget=None,
+    ):
+        self.bot = bot
+        self.on_used = on_used
+        self.debounce = debounce
+        self.vanish_window = vanish_window
+        self.budget = budget or RateBudget()
+        self.pending = {}  # guild_id: [member_id, ...] awaiting a refetch
+        self.vanished = {}  # guild_id: {code: (invite, deleted_at)}
+        self.locks = {}
+        self.cursor = deque()
+        self.tasks = set()
+        self.stats = InviteStats()
+
+    @property
+    def state(self):
+        return self.bot.invites
+
+    @staticmethod
+    def trackable(guild):
+        try:
+            return guild.me.guild_permissions.manage_guild
+        except AttributeError:  # Sometimes if we're getting kicked as they join...
+            return False
+
+    def created(self, invite):
+        self.state.setdefault(invite.guild.id, {})[invite.code] = invite
+
+    def deleted(self, invite):
+        old = self.state.get(invite.guild.id, {}).pop(invite.code, None)
+        if old is None:
+            return
+        # Might have been used up by a joining member.
+        now = time.monotonic()
+        vanished = self.vanished.setdefault(invite.guild.id, {})
+        for code, (_, deleted_at) in list(vanished.items()):
+            if now - deleted_at > self.vanish_window:
+                del vanished[code]
+        vanished[invite.code] = (old, now)
+
+    def removed(self, guild_id):
+        self.state.pop(guild_id, None)
+        self.pending.pop(guild_id, None)
+        self.vanished.pop(guild_id, None)
+        self.locks.pop(guild_id, None)
+
+    def joined(self, member):
+        """Queue a debounced refetch of the member's guild."""
+        if not self.trackable(member.guild):
+            return
+        self.stats.joins += 1
+        guild_id = member.guild.id
+        if guild_id in self.pending:
+            self.pending[guild_id].append(member.id)
+            return
+        self.pending[guild_id] = [member.id]
+        task = asyncio.ensure_future(self.settle(member.guild))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def cancel(self):
+        for task in self.tasks:
+            task.cancel()
+
+    async def fetch(self, guild):
+        async with self.budget:
+            self.stats.fetches += 1
+            return index(await guild.invites())
+
+    async def settle(self, guild):
+        await asyncio.sleep(self.debounce)
+        async with self.locks.setdefault(guild.id, asyncio.Lock()):
+            members = self.pending.pop(guild.id, [])
+            old = self.state.get(guild.id)
+            try:
+                new = await self.fetch(guild)
+            except discord.HTTPException:
+                return
+            self.state[guild.id] = new
+            if old is None:  # No baseline to compare against yet
+                return
+            self.attribute(guild, members, self.used(guild.id, old, new))
+
+    def used(self, guild_id, old, new):
+        """Return the invites whose uses went up since the last fetch."""
+        used = [
+            invite
+            for code, invite in new.items()
+            if code in old and invite.uses > old[code].uses
+        ]
+        if used:
+            return used
+        # Single use invites are deleted by the join that uses them up.
+        now = time.monotonic()
+        vanished = self.vanished.pop(guild_id, {})
+        return [
+            invite
+            for invite, deleted_at in vanished.values()
+            if now - deleted_at <= self.vanish_window
+            and invite.max_uses
+            and invite.uses + 1 >= invite.max_uses
+        ]
+
+    def attribute(self, guild, members, used):
+        # Joins can only be pinned on an inviter when one invite was used.
+        if len(used) != 1:
+            if members:
+                self.stats.ambiguous += len(members)
+            return
+        inviter = used[0].inviter
+        if inviter is None:  # Vanity or widget invites
+            return
+        for member_id in members:
+            self.stats.attributed += 1
+            self.on_used(member_id, inviter.id, guild.id)
+
+    async def reconcile(self, count):
+        """Refetch the next count guilds in a slow round robin."""
+        if not self.cursor:
+            # Guilds without a baseline go first.
+            guilds = sorted(self.bot.guilds, key=lambda g: g.id in self.state)
+            self.cursor.extend(guild.id for guild in guilds)
+        for _ in range(min(count, len(self.cursor))):
+            guild = self.bot.get_guild(self.cursor.popleft())
+            if guild is None or not self.trackable(guild):
+                continue
+            if guild.id in self.pending:  # Its join refetch is on the way
+                continue
+            async with self.locks.setdefault(guild.id, asyncio.Lock()):
+                try:
+                    self.state[guild.id] = await self.fetch(guild)
+                except discord.HTTPException:
+                    continue
+            self.stats.reconciled += 1
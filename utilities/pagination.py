@@ -243,6 +243,69 @@ class SimplePages(MainMenu):
         self.embed = discord.Embed(color=kwargs.get("color", constants.embed))
 
 
+class KeysetPageSource(menus.PageSource):
+    """
+    Pages fetched on demand with keyset pagination.
+    fetch(after, limit) returns up to limit rows following the
+    key of the last row shown, after is None for the first page.
+    Pages are kept once fetched so going back is free, the page
+    count is only known once the last page was reached.
+    """
+
+    def __init__(self, fetch, key, formatter, *, per_page=10):
+        self.fetch = fetch
+        self.key = key
+        self.formatter = formatter
+        self.per_page = per_page
+        self.pages = []
+        self.exhausted = False
+        self.lock = asyncio.Lock()
+
+    async def prepare(self):
+        if not self.pages and not self.exhausted:
+            await self.load()
+
+    async def load(self):
+        after = self.key(self.pages[-1][-1]) if self.pages else None
+        rows = await self.fetch(after, self.per_page + 1)
+        self.exhausted = len(rows) <= self.per_page
+        if rows:
+            self.pages.append(rows[: self.per_page])
+
+    def is_paginating(self):
+        return len(self.pages) > 1 or not self.exhausted
+
+    def get_max_pages(self):
+        return len(self.pages) + (0 if self.exhausted else 1)
+
+    async def get_page(self, page_number):
+        async with self.lock:
+            while page_number >= len(self.pages) and not self.exhausted:
+                await self.load()
+        return self.pages[page_number]
+
+    async def format_page(self, menu, rows):
+        menu.embed.description = "\n".join(self.formatter(row) for row in rows)
+        more = "" if self.exhausted else "+"
+        menu.embed.set_footer(
+            text=f"Page {menu.current_page + 1}/{len(self.pages)}{more}"
+        )
+        return menu.embed
+
+
+class KeysetPages(MainMenu):
+    def __init__(self, fetch, key, formatter, **kwargs):
+        super().__init__(
+            KeysetPageSource(
+                fetch, key, formatter, per_page=kwargs.get("per_page", 10)
+            )
+        )
+        self.embed = discord.Embed(
+            title=kwargs.get("title", discord.Embed.Empty),
+            color=kwargs.get("color", constants.embed),
+        )
+
+
 class Confirmation(menus.Menu):
     def __init__(self, msg):
         super().__init__(timeout=30.0, delete_message_after=True)
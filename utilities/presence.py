@@ -0,0 +1,127 @@
+# Module for tracking member presence across shared guilds
+
+# Statuses whose durations are stored in userstatus.
+TRACKED = ("online", "idle", "dnd")
+
+
+class UserPresence:
+    """
+    The last known presence of a single user.
+    since is None until the first transition we witness,
+    the time before that is credited from the stored
+    userstatus.last_changed instead.
+    """
+
+    __slots__ = (
+        "status",
+        "activity",
+        "since",
+        "online",
+        "idle",
+        "dnd",
+        "resumed",
+        "resumed_until",
+    )
+
+    def __init__(self, status, activity):
+        self.status = status
+        self.activity = activity
+        self.since = None
+        self.reset()
+
+    def reset(self):
+        self.online = 0.0
+        self.idle = 0.0
+        self.dnd = 0.0
+        self.resumed = None
+        self.resumed_until = None
+
+    def leave(self, when):
+        if self.since is None:
+            self.resumed, self.resumed_until = self.status, when
+        elif self.status in TRACKED:
+            elapsed = max(when - self.since, 0.0)
+            setattr(self, self.status, getattr(self, self.status) + elapsed)
+
+    def row(self, user_id):
+        return (
+            user_id,
+            self.online,
+            self.idle,
+            self.dnd,
+            self.since,
+            self.resumed,
+            self.resumed_until,
+        )
+
+
+class PresenceTracker:
+    """
+    Per-user presence state machine.
+    discord.py fires on_member_update once per shared guild,
+    only the first copy of a transition changes the state
+    and the rest are ignored. Durations are accumulated here
+    and drained as one row per user, so postgres only adds.
+    Offline users without an update between two drains are
+    evicted, they have no duration to credit and are read back
+    from their next update like any user seen for the first time.
+    """
+
+    def __init__(self):
+        self.users = {}
+        self.dirty = set()
+        self.touched = set()  # Users updated since the last drain
+        self.duplicates = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.users)
+
+    def update(self, user_id, before, after, when):
+        """
+        Apply a (status, activity) change for a user.
+        Returns whether the status or activity changed.
+        """
+        state = self.users.get(user_id)
+        if state is None:
+            state = self.users[user_id] = UserPresence(*before)
+        self.touched.add(user_id)
+
+        status, activity = after
+        status_changed = state.status != status
+        if status_changed:
+            state.leave(when)
+            state.status, state.since = status, when
+            self.dirty.add(user_id)
+
+        try:
+            activity_changed = state.activity != activity
+        except KeyError:  # Some activity types fail to compare
+            activity_changed = False
+        state.activity = activity
+
+        if not status_changed and not activity_changed:
+            self.duplicates += 1
+        return status_changed or activity_changed
+
+    def drain(self):
+        """
+        Return the accumulated rows for userstatus and reset them,
+        then evict the offline users idle since the last drain.
+        """
+        rows = []
+        for user_id in self.dirty:
+            state = self.users[user_id]
+            rows.append(state.row(user_id))
+            state.reset()
+        self.dirty.clear()
+        idle = [
+            user_id
+            for user_id in self.users.keys() - self.touched
+            if self.users[user_id].status not in TRACKED
+        ]
+        for user_id in idle:
+            del self.users[user_id]
+        self.evicted += len(idle)
+        self.touched = set()
+        return rows
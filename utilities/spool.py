@@ -0,0 +1,218 @@
+import os
+import time
+import uuid
+import zlib
+import pickle
+import struct
+import asyncio
+import asyncpg
+
+from collections import deque
+
+# Every record is framed by its payload length and crc32.
+HEADER = struct.Struct(">II")
+
+# Errors that mean postgres is unreachable rather than
+# that the data itself is bad. These are retried forever.
+TRANSIENT_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.InterfaceError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.TooManyConnectionsError,
+)
+
+
+def fsync(fds):
+    for fd in fds:
+        os.fsync(fd)
+
+
+def load(filename):
+    """Return the records in a segment file, stopping at a torn write."""
+    try:
+        with open(filename, "rb") as fp:
+            data = fp.read()
+    except FileNotFoundError:  # Committed by a previous cog instance.
+        return []
+    records = []
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        length, checksum = HEADER.unpack_from(data, offset)
+        offset += HEADER.size
+        payload = data[offset : offset + length]
+        if len(payload) != length or zlib.crc32(payload) != checksum:
+            break
+        offset += length
+        records.append(pickle.loads(payload))
+    return records
+
+
+def remove(filenames):
+    for filename in filenames:
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+
+
+class Spool:
+    """
+    Append-only, segmented write-ahead log for one batch buffer.
+    Records are appended before they reach the in-memory buffer.
+    Every flush seals the open segment, and the sealed segments
+    are deleted once postgres has committed their records.
+    Segments left over from a crash or a failed flush form
+    the backlog, which is replayed oldest first. Appends only
+    reach the file buffer, while fsyncs, replay reads and unlinks
+    run on a worker thread. Segment numbers start from the clock
+    in microseconds, so they never repeat for a spool folder and
+    key identifies it to the spool_commits table.
+    """
+
+    def __init__(
+        self,
+        path,
+        *,
+        segment_size=4 * 1024 * 1024,
+        min_delay=1.0,
+        max_delay=300.0,
+    ):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.segment_size = segment_size
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+        self.key = self.identify()
+        self.backlog = deque(self.segments())
+        self.sequence = max(
+            max(self.segments("seg", "bad"), default=-1) + 1,
+            time.time_ns() // 1000,
+        )
+        self.file = None
+        self.size = 0
+        self.unsealed = []
+        self.unsynced = []  # Closed segment files waiting for their fsync
+        self.syncing = False
+        self.last_sync = time.monotonic()
+
+        self.delay = 0.0
+        self.retry_at = 0.0
+        self.failures = 0
+        self.bytes_written = 0
+
+    def identify(self):
+        """The id of the spool folder, created the first time it is used."""
+        filename = os.path.join(self.path, "spool.id")
+        try:
+            with open(filename, "r") as fp:
+                return fp.read().strip()
+        except FileNotFoundError:
+            key = uuid.uuid4().hex
+            with open(filename, "w") as fp:
+                fp.write(key)
+            return key
+
+    def segments(self, *extensions):
+        extensions = tuple(f".{extension}" for extension in extensions or ("seg",))
+        return sorted(
+            int(filename[:-4])
+            for filename in os.listdir(self.path)
+            if filename.endswith(extensions)
+        )
+
+    def filename(self, segment, extension="seg"):
+        return os.path.join(self.path, f"{segment:020d}.{extension}")
+
+    def open(self):
+        self.file = open(self.filename(self.sequence), "ab")
+        self.unsealed.append(self.sequence)
+        self.sequence += 1
+        self.size = 0
+
+    def append(self, record):
+        """Write a record to the open segment and return its size."""
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        frame = HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        if self.file is None:
+            self.open()
+        self.file.write(frame)
+        self.size += len(frame)
+        self.bytes_written += len(frame)
+        if self.size >= self.segment_size:
+            self.close()
+        return len(frame)
+
+    async def sync(self):
+        """
+        Hand the buffered records to the OS and fsync every
+        segment written since the last sync on a worker thread,
+        so the event loop never waits on the disk.
+        """
+        if self.syncing:
+            return
+        self.syncing = True
+        files, self.unsynced = self.unsynced, []
+        if self.file is not None:
+            self.file.flush()
+        fds = [fp.fileno() for fp in files]
+        if self.file is not None:
+            fds.append(self.file.fileno())
+        try:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, fsync, fds)
+        finally:
+            for fp in files:  # Kept open so their fds stay valid until now
+                fp.close()
+            self.syncing = False
+            self.last_sync = time.monotonic()
+
+    def close(self):
+        """Close the open segment, its fsync is left to the next sync()."""
+        if self.file is not None:
+            self.file.flush()
+            self.unsynced.append(self.file)
+            self.file = None
+
+    def seal(self):
+        """Close the open segment and claim every unsealed segment."""
+        self.close()
+        segments, self.unsealed = self.unsealed, []
+        return segments
+
+    async def read(self, segment):
+        """Return the records in a segment, read on a worker thread."""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, load, self.filename(segment))
+
+    async def commit(self, segments):
+        """Delete segments postgres has committed, on a worker thread."""
+        if not segments:
+            return
+        filenames = [self.filename(segment) for segment in segments]
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, remove, filenames)
+
+    def defer(self, segments):
+        self.backlog.extend(segments)
+
+    def quarantine(self, segment):
+        """Set aside a segment postgres refuses so it stops blocking the spool."""
+        try:
+            os.replace(self.filename(segment), self.filename(segment, "bad"))
+        except FileNotFoundError:
+            pass
+
+    def ready(self):
+        return time.monotonic() >= self.retry_at
+
+    def failed(self):
+        self.failures += 1
+        self.delay = min(max(self.delay * 2, self.min_delay), self.max_delay)
+        self.retry_at = time.monotonic() + self.delay
+
+    def recovered(self):
+        self.delay = 0.0
+        self.retry_at = 0.0